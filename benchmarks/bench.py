@@ -0,0 +1,225 @@
+"""
+Upload and download benchmarks against the local mock DocuPanda server (benchmarks/mock_server.py).
+
+    python benchmarks/bench.py upload --docs 1000 --file-size 50000
+    python benchmarks/bench.py download --docs 10000 --payload-size 200000 --latency 0.02
+    python benchmarks/bench.py suite --scales 1000,10000,100000
+
+Each run starts its own mock server in a subprocess, points the app at it through
+DOCUPANDA_API_URL and reports docs/s, MB/s, peak RSS of the benchmark process and the
+requests the server received, as a summary line and (with --json) one JSON line. `suite`
+runs upload and download at every scale, each in a fresh process so peak RSS is per run,
+and prints a table. Nothing is sent to production.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+MOCK_SERVER = BENCH_DIR / "mock_server.py"
+API_KEY = "benchmark"
+DATASET = "bench"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, or None where it cannot be measured."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class MockProcess(object):
+    """benchmarks/mock_server.py in a subprocess, so it does not compete with the client for the GIL."""
+
+    def __init__(self, args: List[str]):
+        self._process = subprocess.Popen([sys.executable, str(MOCK_SERVER)] + args,
+                                         stdout=subprocess.PIPE, text=True)
+        line = self._process.stdout.readline()
+        if not line:
+            raise RuntimeError("Mock server did not start")
+        urls = json.loads(line)
+        self.api_url, self.storage_url = urls["api_url"], urls["storage_url"]
+
+    def stats(self) -> dict:
+        with urllib.request.urlopen(f"{self.api_url}/_stats") as response:
+            return json.load(response)
+
+    def close(self):
+        self._process.terminate()
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _mock_args(args, seed_documents: int = 0) -> List[str]:
+    return [
+        "--latency", str(args.latency),
+        "--processing-delay", str(args.processing_delay),
+        "--throttle-rate", str(args.throttle_rate),
+        "--payload-size", str(args.payload_size),
+        "--seed-dataset", DATASET,
+        "--seed-documents", str(seed_documents),
+    ]
+
+
+def _use_mock(mock: MockProcess):
+    # Must run before dp_desktop is imported: the base URL is read once at import
+    from_env = os.environ.get("DOCUPANDA_API_URL")
+    if from_env and from_env != mock.api_url:
+        raise RuntimeError("DOCUPANDA_API_URL is already set; unset it to benchmark against the mock")
+    os.environ["DOCUPANDA_API_URL"] = mock.api_url
+    sys.path.insert(0, str(SRC_DIR))
+
+
+def _workers(args) -> Dict:
+    return {"max_workers": args.workers} if args.workers else {}
+
+
+def _make_files(folder: Path, count: int, size: int):
+    # Random contents, so deduplication finds nothing to skip
+    for i in range(count):
+        (folder / f"file{i:07d}.pdf").write_bytes(os.urandom(size))
+
+
+def run_upload(args) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="dp-bench-") as tmp, MockProcess(_mock_args(args)) as mock:
+        _use_mock(mock)
+        from dp_desktop.upload import upload_files
+
+        folder = Path(tmp) / "upload"
+        folder.mkdir()
+        _make_files(folder, args.docs, args.file_size)
+
+        completed, errors = [0], [0]  # mutable reference for closure
+        started = time.perf_counter()
+        upload_files(
+            folder, API_KEY, DATASET,
+            schema_id="schema0" if args.standardize else None,
+            progress_callback=lambda done, total: completed.__setitem__(0, done),
+            error_callback=lambda file_path, message: errors.__setitem__(0, errors[0] + 1),
+            journal_dir=Path(tmp) / "journals" if args.journal else None,
+            **_workers(args),
+        )
+        elapsed = time.perf_counter() - started
+        return _result("upload", args, elapsed, completed[0], errors[0],
+                       completed[0] * args.file_size, mock.stats())
+
+
+def run_download(args) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="dp-bench-") as tmp, \
+            MockProcess(_mock_args(args, seed_documents=args.docs)) as mock:
+        _use_mock(mock)
+        from dp_desktop.download import download_dataset
+
+        output_dir = Path(tmp) / "download"
+        completed, errors = [0], [0]  # mutable reference for closure
+        started = time.perf_counter()
+        download_dataset(
+            API_KEY, DATASET, output_dir,
+            progress_callback=lambda done, total: completed.__setitem__(0, done),
+            error_callback=lambda label, message: errors.__setitem__(0, errors[0] + 1),
+            **_workers(args),
+        )
+        elapsed = time.perf_counter() - started
+        written = sum(f.stat().st_size for f in output_dir.rglob("*") if f.is_file())
+        return _result("download", args, elapsed, completed[0], errors[0], written, mock.stats())
+
+
+def _result(kind: str, args, elapsed: float, completed: int, errors: int, transferred: int, stats: dict) -> Dict:
+    peak = peak_rss_mb()
+    return {
+        "benchmark": kind,
+        "docs": args.docs,
+        "completed": completed,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "docs_per_s": round(completed / elapsed, 1) if elapsed else None,
+        "mb_per_s": round(transferred / elapsed / 1e6, 2) if elapsed else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "requests": stats["total_requests"],
+        "throttled": stats["throttled"],
+        "requests_by_route": stats["requests"],
+    }
+
+
+def _summary(result: Dict) -> str:
+    return (f"{result['benchmark']:<8} docs={result['docs']:<7} completed={result['completed']:<7} "
+            f"errors={result['errors']:<4} {result['seconds']:>8.2f}s {result['docs_per_s']:>8} docs/s "
+            f"{result['mb_per_s']:>7} MB/s peak_rss={result['peak_rss_mb']} MB "
+            f"requests={result['requests']} throttled={result['throttled']}")
+
+
+def run_suite(args) -> int:
+    passthrough = [
+        "--latency", str(args.latency),
+        "--processing-delay", str(args.processing_delay),
+        "--throttle-rate", str(args.throttle_rate),
+        "--payload-size", str(args.payload_size),
+        "--file-size", str(args.file_size),
+        "--json",
+    ]
+    passthrough += ["--workers", str(args.workers)] if args.workers else []
+    passthrough += ["--standardize"] if args.standardize else []
+    passthrough += ["--journal"] if args.journal else []
+    failed = False
+    for scale in [int(s) for s in args.scales.split(",")]:
+        for kind in ("upload", "download"):
+            process = subprocess.run([sys.executable, __file__, kind, "--docs", str(scale)] + passthrough,
+                                     stdout=subprocess.PIPE, text=True)
+            lines = process.stdout.strip().splitlines()
+            failed = failed or process.returncode != 0
+            if not lines:
+                print(f"{kind:<8} docs={scale:<7} FAILED (exit code {process.returncode})", flush=True)
+                continue
+            print(_summary(json.loads(lines[-1])), flush=True)
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark uploads and downloads against a local mock server.")
+    parser.add_argument("benchmark", choices=["upload", "download", "suite"])
+    parser.add_argument("--docs", type=int, default=1000, help="Documents per run (default: %(default)s)")
+    parser.add_argument("--scales", default="1000,10000,100000",
+                        help="Comma separated document counts for 'suite' (default: %(default)s)")
+    parser.add_argument("--file-size", type=int, default=20_000, help="Bytes per uploaded file (default: %(default)s)")
+    parser.add_argument("--payload-size", type=int, default=100_000,
+                        help="Bytes per downloaded OCR PDF (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock adds to every request")
+    parser.add_argument("--processing-delay", type=float, default=1.0,
+                        help="Seconds until the mock finishes processing an upload (default: %(default)s)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Fraction of API requests the mock answers with 429")
+    parser.add_argument("--workers", type=int, help="max_workers for the transfer (default: the app's default)")
+    parser.add_argument("--standardize", action="store_true", help="Upload with a schema, so documents are standardized")
+    parser.add_argument("--journal", action="store_true", help="Upload with a resume journal")
+    parser.add_argument("--json", action="store_true", help="Print the result as one JSON line")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.benchmark == "suite":
+        return run_suite(args)
+    result = run_upload(args) if args.benchmark == "upload" else run_download(args)
+    print(json.dumps(result) if args.json else _summary(result))
+    return 0 if result["errors"] == 0 and result["completed"] == args.docs else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
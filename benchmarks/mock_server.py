@@ -0,0 +1,348 @@
+"""
+Local stand-in for the DocuPanda API, for benchmarking uploads and downloads without touching production.
+
+    python benchmarks/mock_server.py --latency 0.02 --processing-delay 2 --throttle-rate 0.01 \
+        --seed-dataset bench --seed-documents 10000 --payload-size 200000
+
+prints the API and storage base URLs as one JSON line, then serves until interrupted. Point
+the app at it with DOCUPANDA_API_URL=<api url>. Served endpoints:
+
+    POST /document                          GET /document/{id}          (processing, then completed)
+    POST /v2/standardize/batch              GET /standardization/{id}   (404 until processed)
+    GET  /documents?dataset=&limit=&offset= GET /document/{id}/download/ocr-url
+    GET  /standardizations?dataset=|document_id=&limit=&offset=&exclude_payload=   (newest first)
+    GET  /dataset-names                     GET /schemas
+    GET  /blob/{id}                         (storage server; supports HEAD and Range)
+    GET  /_stats, POST /_reset              (request counts and bytes, for the benchmark)
+
+Every request waits `latency` seconds; a `throttle_rate` fraction of API requests is answered
+with 429 and a Retry-After of `retry_after` seconds. Blobs are `payload_size` bytes. Documents of
+the seeded dataset exist from the start and are already processed and standardized. Listed
+standardizations that are still processing have no data. API and storage listen on
+different ports, so the client treats them as different hosts as it does in production.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+LISTEN_BACKLOG = 4096  # Pending connections per server; the client opens hundreds at once
+
+
+@dataclasses.dataclass
+class MockSettings:
+    latency: float = 0.0  # Seconds added to every request
+    processingDelay: float = 1.0  # Seconds before an uploaded document or standardization is done
+    throttleRate: float = 0.0  # Fraction of API requests answered with 429
+    retryAfter: float = 1.0  # Retry-After of those 429s, in seconds
+    payloadSize: int = 100_000  # Bytes of every OCR PDF blob
+    seedDataset: str = "bench"
+    seedDocuments: int = 0  # Documents in seedDataset when the server starts
+
+
+class MockState(object):
+    """Documents, standardizations and request counters, shared by the server threads."""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.payload = os.urandom(settings.payloadSize)
+        self._lock = threading.Lock()
+        # documentId -> (created at, dataset, filename)
+        self.documents: Dict[str, Tuple[float, str, str]] = {}
+        # standardizationId -> (created at, documentId)
+        self.standardizations: Dict[str, Tuple[float, str]] = {}
+        self.datasets: Dict[str, List[str]] = {}
+        # Standardization ids in the order they were created, per dataset and per document
+        self.dataset_standardizations: Dict[str, List[str]] = {}
+        self.document_standardizations: Dict[str, List[str]] = {}
+        self.requests: Counter = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        for i in range(settings.seedDocuments):
+            document_id = self.add_document(settings.seedDataset, f"doc{i:07d}.pdf", created=0.0)
+            self.add_standardization(document_id, created=0.0)
+
+    def add_document(self, dataset: str, filename: str, created: Optional[float] = None) -> str:
+        document_id = uuid.uuid4().hex
+        with self._lock:
+            self.documents[document_id] = (time.time() if created is None else created, dataset, filename)
+            self.datasets.setdefault(dataset, []).append(document_id)
+        return document_id
+
+    def add_standardization(self, document_id: str, created: Optional[float] = None) -> str:
+        std_id = uuid.uuid4().hex
+        with self._lock:
+            self.standardizations[std_id] = (time.time() if created is None else created, document_id)
+            dataset = self.documents[document_id][1] if document_id in self.documents else ""
+            self.dataset_standardizations.setdefault(dataset, []).append(std_id)
+            self.document_standardizations.setdefault(document_id, []).append(std_id)
+        return std_id
+
+    def list_standardizations(self, std_ids: List[str], offset: int, limit: int, payload: bool) -> List[dict]:
+        """A page of `std_ids` newest first, as the API lists them."""
+        with self._lock:
+            page = [(std_id, *self.standardizations[std_id]) for std_id in reversed(std_ids)][offset:offset + limit]
+        listed = []
+        for std_id, created, document_id in page:
+            std = _standardization_json(std_id, document_id)
+            if not payload or not self.is_processed(created):
+                std.pop("data")
+            listed.append(std)
+        return listed
+
+    def is_processed(self, created: float) -> bool:
+        return time.time() - created >= self.settings.processingDelay
+
+    def count(self, route: str, received: int = 0, sent: int = 0):
+        with self._lock:
+            self.requests[route] += 1
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "total_requests": sum(count for route, count in self.requests.items() if route != "429"),
+                "throttled": self.requests.get("429", 0),
+                "bytes_received": self.bytes_received,
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes_received = self.bytes_sent = 0
+
+
+def _standardization_json(std_id: str, document_id: str) -> dict:
+    return {"standardizationId": std_id, "documentId": document_id, "data": {"documentId": document_id}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code: int, body: bytes, content_type: str = "application/json",
+              headers: Optional[Dict[str, str]] = None, head: bool = False):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _json(self, route: str, obj, code: int = 200, received: int = 0):
+        body = json.dumps(obj).encode()
+        self.state.count(route, received=received, sent=len(body))
+        self._send(code, body)
+
+    def _throttled(self) -> bool:
+        settings = self.state.settings
+        if self.server.role != "api" or settings.throttleRate <= 0 or random.random() >= settings.throttleRate:
+            return False
+        self.state.count("429")
+        self._send(429, b"{}", headers={"Retry-After": f"{settings.retryAfter:g}"})
+        return True
+
+    def _begin(self) -> bool:
+        # Shared by every request: simulated latency, then maybe a 429
+        if self.state.settings.latency > 0:
+            time.sleep(self.state.settings.latency)
+        return not self._throttled()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b""
+        if url.path == "/_reset":
+            self.state.reset()
+            return self._send(200, b"{}")
+        if self.server.role != "api" or not self._begin():
+            return
+        body = json.loads(raw) if raw else {}
+        if url.path == "/document":
+            document_id = self.state.add_document(body["dataset"], body["document"]["file"]["filename"])
+            return self._json("POST /document", {"documentId": document_id}, received=length)
+        if url.path == "/v2/standardize/batch":
+            ids = [self.state.add_standardization(document_id) for document_id in body["documentIds"]]
+            return self._json("POST /v2/standardize/batch", {"standardizationIds": ids}, received=length)
+        self._json("404", {"detail": "Not found"}, code=404)
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head: bool = False):
+        url = urlsplit(self.path)
+        if url.path == "/_stats":
+            return self._send(200, json.dumps(self.state.stats()).encode())
+        if not self._begin():
+            return
+        if self.server.role == "storage":
+            return self._blob(url.path, head)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        limit, offset = int(query.get("limit", 1000)), int(query.get("offset", 0))
+
+        match = re.match(r"^/document/(\w+)/download/ocr-url$", url.path)
+        if match:
+            return self._json("GET /document/{id}/download/ocr-url",
+                              {"url": f"{self.server.storage_url}/blob/{match.group(1)}.pdf"})
+        match = re.match(r"^/document/(\w+)$", url.path)
+        if match:
+            document = self.state.documents.get(match.group(1))
+            if document is None:
+                return self._json("GET /document/{id}", {"detail": "Not found"}, code=404)
+            status = "completed" if self.state.is_processed(document[0]) else "processing"
+            return self._json("GET /document/{id}", {"documentId": match.group(1), "status": status})
+        match = re.match(r"^/standardization/(\w+)$", url.path)
+        if match:
+            standardization = self.state.standardizations.get(match.group(1))
+            if standardization is None or not self.state.is_processed(standardization[0]):
+                return self._json("GET /standardization/{id}", {"detail": "Not found"}, code=404)
+            return self._json("GET /standardization/{id}", _standardization_json(match.group(1), standardization[1]))
+        if url.path == "/documents":
+            document_ids = self.state.datasets.get(query.get("dataset", ""), [])[offset:offset + limit]
+            return self._json("GET /documents", [
+                {"documentId": document_id, "filename": self.state.documents[document_id][2], "fileExtension": "pdf"}
+                for document_id in document_ids
+            ])
+        if url.path == "/standardizations":
+            if "document_id" in query:
+                std_ids = self.state.document_standardizations.get(query["document_id"], [])
+            else:
+                std_ids = self.state.dataset_standardizations.get(query.get("dataset", ""), [])
+            payload = query.get("exclude_payload", "false") != "true"
+            return self._json("GET /standardizations",
+                              self.state.list_standardizations(std_ids, offset, limit, payload))
+        if url.path == "/dataset-names":
+            return self._json("GET /dataset-names", {"datasetNames": sorted(self.state.datasets)})
+        if url.path == "/schemas":
+            schemas = [{"schemaId": f"schema{i}", "schemaName": f"Schema {i}"} for i in range(3)]
+            return self._json("GET /schemas", schemas[offset:offset + limit])
+        self._json("404", {"detail": "Not found"}, code=404)
+
+    def _blob(self, path: str, head: bool):
+        if not path.startswith("/blob/"):
+            return self._send(404, b"{}", head=head)
+        payload = self.state.payload
+        start, end = 0, len(payload) - 1
+        code, headers = 200, {"Accept-Ranges": "bytes"}
+        match = re.match(r"^bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if start > end:
+                return self._send(416, b"", headers={"Content-Range": f"bytes */{len(payload)}"}, head=head)
+            code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(payload)}"
+        body = payload[start:end + 1]
+        self.state.count("HEAD /blob/{id}" if head else "GET /blob/{id}", sent=0 if head else len(body))
+        self._send(code, body, content_type="application/pdf", headers=headers, head=head)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+class MockDocuPanda(object):
+    """
+    The API and storage servers, each on its own port of `host`, serving from background threads.
+    Use as a context manager, or call `start` and `close`.
+    """
+
+    def __init__(self, settings: MockSettings, host: str = "127.0.0.1", api_port: int = 0, storage_port: int = 0):
+        self.state = MockState(settings)
+        self._servers = []
+        for role, port in (("api", api_port), ("storage", storage_port)):
+            server = _Server((host, port), MockHandler)
+            server.role = role
+            server.state = self.state
+            self._servers.append(server)
+        api, storage = self._servers
+        self.api_url = f"http://{host}:{api.server_port}"
+        self.storage_url = f"http://{host}:{storage.server_port}"
+        for server in self._servers:
+            server.storage_url = self.storage_url
+
+    def start(self):
+        for server in self._servers:
+            threading.Thread(target=server.serve_forever, name=f"mock-{server.role}", daemon=True).start()
+        return self
+
+    def close(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock DocuPanda API and blob storage for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=0, help="Default: any free port")
+    parser.add_argument("--storage-port", type=int, default=0, help="Default: any free port")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--processing-delay", type=float, default=1.0,
+                        help="Seconds until an upload or standardization is processed (default: %(default)s)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of API requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the 429s (default: %(default)s)")
+    parser.add_argument("--payload-size", type=int, default=100_000, help="Bytes per blob (default: %(default)s)")
+    parser.add_argument("--seed-dataset", default="bench", help="Dataset to pre-populate (default: %(default)s)")
+    parser.add_argument("--seed-documents", type=int, default=0, help="Documents in the seeded dataset")
+    return parser
+
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(
+        latency=args.latency,
+        processingDelay=args.processing_delay,
+        throttleRate=args.throttle_rate,
+        retryAfter=args.retry_after,
+        payloadSize=args.payload_size,
+        seedDataset=args.seed_dataset,
+        seedDocuments=args.seed_documents,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    mock = MockDocuPanda(settings_from_args(args), host=args.host, api_port=args.api_port,
+                         storage_port=args.storage_port).start()
+    sys.stdout.write(json.dumps({"api_url": mock.api_url, "storage_url": mock.storage_url}) + "\n")
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import concurrent.futures
+import errno
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+import requests
+
+from dp_desktop.concurrency import limiter_for
+from dp_desktop.utils import request_with_retries
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024  # Bytes held in memory per in-flight download
+DOWNLOAD_ATTEMPTS = 3  # Times a download is restarted when the body is cut off mid-stream
+REQUEST_TIMEOUT = 60  # Seconds without data before a blob download is abandoned
+RANGE_PART_SIZE = 16 * 1024 * 1024  # Bytes per range request; smaller objects arrive in a single request
+RANGE_STREAMS = 4  # Range requests in flight at once for one large object
+HASH_READ_SIZE = 1024 * 1024  # Bytes read per step when hashing a file downloaded in parts
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class IncompleteDownloadError(IOError):
+    """The body received does not match the Content-Length announced by the server."""
+
+
+def _fsync_dir(directory: Path):
+    # Makes the rename itself durable; directories cannot be opened this way on Windows
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_output(path: Path, mode: str = 'wb'):
+    """
+    Open a temporary file next to `path` and move it into place only on success.
+
+    The temp file lives in the same directory (so the final os.replace is an
+    atomic rename on the same filesystem) and is hidden with a leading dot.
+    Data is fsynced before the rename. If the block raises, the temp file is
+    removed and any existing `path` is left untouched, so a crash never leaves
+    a truncated file under the final name.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    _fsync_dir(path.parent)
+
+
+def _content_range(response: requests.Response) -> Optional[Tuple[int, int, int]]:
+    # (first byte, last byte, object size) from a 206 response's "Content-Range: bytes a-b/n"
+    match = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+def _expected_length(response: requests.Response) -> Optional[int]:
+    # With a Content-Encoding, iter_content yields decoded bytes that won't match the header
+    if 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers:
+        return int(response.headers['Content-Length'])
+    return None
+
+
+def _preallocate(f: BinaryIO, size: int):
+    # Reserve the whole file up front, so a full disk fails now instead of halfway through
+    f.truncate(size)
+    if not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):  # Filesystems without fallocate keep the sparse file
+            raise
+
+
+class _PartWriter(object):
+    # Writes byte ranges of a preallocated file from several threads, each at its own offset
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self._lock = threading.Lock()
+        self.failed = threading.Event()  # Set when a part failed, so the others stop early
+
+    def write_at(self, offset: int, data: bytes):
+        if hasattr(os, "pwrite"):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self._f.fileno(), view, offset)
+                view, offset = view[written:], offset + written
+            return
+        with self._lock:  # Windows has no pwrite
+            self._f.seek(offset)
+            self._f.write(data)
+
+
+def _write_part(response: requests.Response, writer: _PartWriter, start: int, end: int, label: str):
+    offset = start
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        if writer.failed.is_set():
+            raise IncompleteDownloadError(f"Another part of {label} failed")
+        if offset + len(chunk) > end + 1:
+            raise IncompleteDownloadError(f"Received more than bytes {start}-{end} of {label}")
+        writer.write_at(offset, chunk)
+        offset += len(chunk)
+    if offset != end + 1:
+        raise IncompleteDownloadError(f"Received {offset - start} of {end + 1 - start} bytes {start}-{end} of {label}")
+
+
+def _fetch_part(url: str, writer: _PartWriter, start: int, end: int, size: int, label: str,
+                log: logging.Logger):
+    """Download bytes start-end (inclusive) of `url` into the file, restarting the part if it is cut off."""
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            with limiter_for(url).slot() as limiter:
+                response = request_with_retries("GET", url, stream=True, headers={"Range": f"bytes={start}-{end}"},
+                                                request_timeout=REQUEST_TIMEOUT, log=log, held_limiter=limiter)
+                with response:
+                    if response.status_code != 206 or _content_range(response) != (start, end, size):
+                        raise IncompleteDownloadError(
+                            f"Server did not return bytes {start}-{end}/{size} of {label} "
+                            f"(status={response.status_code}, Content-Range={response.headers.get('Content-Range')})"
+                        )
+                    _write_part(response, writer, start, end, label)
+            return
+        except (IncompleteDownloadError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ConnectionError) as exc:
+            if attempt == DOWNLOAD_ATTEMPTS or writer.failed.is_set():
+                raise
+            log.warning(f"Bytes {start}-{end} of {label} interrupted (attempt={attempt}): {exc}. Restarting...")
+
+
+def _file_sha256(f: BinaryIO) -> str:
+    f.flush()
+    f.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(HASH_READ_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _first_part(response: requests.Response, label: str) -> Optional[Tuple[int, int]]:
+    # (last byte in `response`, object size) if it holds only the first part, None if it holds all of it
+    if response.status_code != 206:
+        return None  # Range ignored: the whole object follows
+    content_range = _content_range(response)
+    if content_range is None or content_range[0] != 0:
+        raise IncompleteDownloadError(f"Unusable Content-Range for {label}: {response.headers.get('Content-Range')}")
+    first_end, size = content_range[1], content_range[2]
+    return (first_end, size) if first_end + 1 < size else None
+
+
+def _write_stream(response: requests.Response, f: BinaryIO, label: str) -> Tuple[int, str]:
+    expected = _expected_length(response)
+    written = 0
+    digest = hashlib.sha256()
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        f.write(chunk)
+        digest.update(chunk)
+        written += len(chunk)
+    if expected is not None and written != expected:
+        raise IncompleteDownloadError(f"Received {written} of {expected} bytes for {label}")
+    return written, digest.hexdigest()
+
+
+def _download_once(url: str, f: BinaryIO, ranged: bool, label: str, log: logging.Logger) -> Tuple[int, str]:
+    with limiter_for(url).slot() as limiter:
+        headers = {"Range": f"bytes=0-{RANGE_PART_SIZE - 1}"} if ranged else None
+        response = request_with_retries("GET", url, stream=True, headers=headers, request_timeout=REQUEST_TIMEOUT,
+                                        log=log, held_limiter=limiter)
+        with response:
+            first_part = _first_part(response, label) if ranged else None
+            if first_part is None:
+                return _write_stream(response, f, label)
+            first_end, size = first_part
+
+            # The rest is fetched in parallel while this thread writes the first part
+            _preallocate(f, size)
+            writer = _PartWriter(f)
+            parts = concurrent.futures.ThreadPoolExecutor(max_workers=RANGE_STREAMS - 1, thread_name_prefix="dp-range")
+            futures = [
+                parts.submit(_fetch_part, url, writer, start, min(start + RANGE_PART_SIZE, size) - 1, size, label, log)
+                for start in range(first_end + 1, size, RANGE_PART_SIZE)
+            ]
+            try:
+                _write_part(response, writer, 0, first_end, label)
+            except BaseException:
+                writer.failed.set()
+                parts.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    # Waited for without holding a storage slot, which the parts need
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+    except BaseException:
+        writer.failed.set()
+        raise
+    finally:
+        parts.shutdown(wait=True, cancel_futures=True)
+    return size, _file_sha256(f)
+
+
+def download_to_file(url: str, output_path: Path, log: Optional[logging.Logger] = None,
+                     ranged: bool = True) -> Tuple[int, str]:
+    """
+    Download `url` into `output_path` and return (bytes written, SHA-256 hex digest).
+
+    The body is written in DOWNLOAD_CHUNK_SIZE pieces through `atomic_output`,
+    so memory stays flat regardless of file size and `output_path` only ever
+    appears complete. The byte count is checked against Content-Length; a
+    short or interrupted body is retried up to DOWNLOAD_ATTEMPTS times. A
+    storage concurrency slot is held until the body is fully written, so the
+    adaptive limit counts transfers, not just their first bytes.
+
+    With `ranged`, the first request asks for only the first RANGE_PART_SIZE
+    bytes; its Content-Range tells the object's size, so no separate HEAD is
+    needed (presigned URLs are only signed for GET). The rest of a larger
+    object is written into the preallocated file by up to RANGE_STREAMS
+    concurrent range requests, each in its own storage slot. A server that
+    ignores Range simply sends the whole object, which is streamed as usual,
+    and a ranged attempt that fails is retried as a single stream.
+    """
+    logger = log if log else logging.getLogger(__name__)
+
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            with atomic_output(output_path, 'w+b') as f:
+                written, sha256 = _download_once(url, f, ranged, output_path.name, logger)
+            return written, sha256
+
+        except requests.exceptions.HTTPError as exc:
+            # 416: an empty object has no first byte to ask for
+            if not (ranged and exc.response is not None and exc.response.status_code == 416):
+                raise
+            ranged = False
+        except (IncompleteDownloadError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ConnectionError) as exc:
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+            if ranged:
+                ranged = False
+                logger.warning(f"Ranged download of {output_path.name} failed (attempt={attempt}): {exc}. "
+                               f"Restarting as a single stream...")
+                continue
+            logger.warning(f"Download of {output_path.name} interrupted (attempt={attempt}): {exc}. Restarting...")
+
+    raise RuntimeError(f"Download of {output_path.name} failed after {DOWNLOAD_ATTEMPTS} attempts.")
@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+from dp_desktop.concurrency import host_class
+
+FAILURE_STATUSES = {408, 500, 502, 503, 504}  # Responses that mean the service is unhealthy (429 is throttling)
+OUTCOME_WINDOW = 30  # Seconds of recent outcomes the error rate is computed over
+MIN_OUTCOMES = 20  # Outcomes needed in the window before the breaker may open
+FAILURE_THRESHOLD = 0.5  # Error rate at which the breaker opens
+PROBE_INTERVAL = 10  # Seconds the breaker stays open before the first half-open probe
+MAX_PROBE_INTERVAL = 300  # Cap on the interval, which doubles after each failed probe
+MAX_OUTAGE = 1200  # Seconds of continuous outage after which waiting requests fail instead
+RETRY_BUDGET_RATIO = 0.2  # Retries earned per request sent
+RETRY_BUDGET_PER_SECOND = 1.0  # Retries earned per second regardless of traffic
+RETRY_BUDGET_MAX = 100  # Most retries that can be saved up
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class ServiceDegradedError(RuntimeError):
+    """The service has been failing for too long, or the shared retry budget is used up."""
+
+
+# Called as listener(host_class, degraded, message) whenever a breaker opens or closes
+_listeners: List[Callable[[str, bool, str], None]] = []
+
+
+def add_listener(listener: Callable[[str, bool, str], None]):
+    """Get one event when a service becomes degraded and one when it recovers, e.g. to show a banner."""
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[str, bool, str], None]):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _notify(name: str, degraded: bool, message: str):
+    for listener in list(_listeners):
+        try:
+            listener(name, degraded, message)
+        except Exception:
+            logging.exception("Circuit breaker listener failed")
+
+
+class CircuitBreaker(object):
+    """
+    Process-wide circuit breaker and retry budget for one class of hosts.
+
+    Every request attempt in the process reports whether it failed. When more
+    than FAILURE_THRESHOLD of the attempts in the last OUTCOME_WINDOW seconds
+    failed, the breaker opens: new requests wait instead of hitting the
+    service, and after PROBE_INTERVAL a single request is let through as a
+    probe. If it succeeds the breaker closes and everyone resumes; if it fails
+    the interval doubles. After MAX_OUTAGE seconds open, requests other than
+    the probes fail fast with ServiceDegradedError.
+
+    Retries draw from a shared budget that refills with traffic and time, so
+    a burst of failures cannot turn into a retry storm from every thread.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = STATE_CLOSED
+        self._cond = threading.Condition()
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self._probe_interval = PROBE_INTERVAL
+        self._probe_in_flight = False
+        self._budget = float(RETRY_BUDGET_MAX)
+        self._budget_updated = time.monotonic()
+
+    def before_request(self) -> bool:
+        """
+        Block while the breaker is open. Returns True if the caller was chosen as
+        the half-open probe and must report its outcome with `record(..., probe=True)`.
+        """
+        with self._cond:
+            while True:
+                if self.state == STATE_CLOSED:
+                    return False
+                now = time.monotonic()
+                if self.state == STATE_OPEN and now >= self._probe_at and not self._probe_in_flight:
+                    self.state = STATE_HALF_OPEN
+                    self._probe_in_flight = True
+                    return True
+                if now - self._opened_at > MAX_OUTAGE:
+                    # Probes keep running, so the breaker still closes once the service is back
+                    raise ServiceDegradedError(
+                        f"DocuPanda {self.name} has been unavailable for over {MAX_OUTAGE // 60} minutes"
+                    )
+                wait = self._probe_at - now if self.state == STATE_OPEN else PROBE_INTERVAL
+                self._cond.wait(timeout=max(wait, 0.1))
+
+    def record(self, failed: bool, probe: bool = False):
+        event = None
+        with self._cond:
+            now = time.monotonic()
+            if probe:
+                self._probe_in_flight = False
+                if failed:
+                    self.state = STATE_OPEN
+                    self._probe_interval = min(self._probe_interval * 2, MAX_PROBE_INTERVAL)
+                    self._probe_at = now + self._probe_interval
+                    logging.warning(f"[CIRCUIT BREAKER] {self.name} probe failed; "
+                                    f"next probe in {self._probe_interval}s")
+                else:
+                    self.state = STATE_CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                    self._probe_interval = PROBE_INTERVAL
+                    event = (False, f"DocuPanda {self.name} recovered after {now - self._opened_at:.0f}s")
+                self._cond.notify_all()
+            elif self.state == STATE_CLOSED:
+                self._budget = min(float(RETRY_BUDGET_MAX), self._budget + RETRY_BUDGET_RATIO)
+                self._outcomes.append((now, failed))
+                self._failures += failed
+                while self._outcomes and self._outcomes[0][0] < now - OUTCOME_WINDOW:
+                    self._failures -= self._outcomes.popleft()[1]
+                if len(self._outcomes) >= MIN_OUTCOMES and self._failures / len(self._outcomes) >= FAILURE_THRESHOLD:
+                    self.state = STATE_OPEN
+                    self._opened_at = now
+                    self._probe_at = now + self._probe_interval
+                    event = (True, f"DocuPanda {self.name} is failing ({self._failures} of "
+                                   f"{len(self._outcomes)} recent requests); pausing requests until it recovers")
+        if event:
+            degraded, message = event
+            if degraded:
+                logging.error(f"[CIRCUIT BREAKER] {message}")
+            else:
+                logging.info(f"[CIRCUIT BREAKER] {message}")
+            _notify(self.name, degraded, message)
+
+    def allow_retry(self) -> bool:
+        """Take one retry from the shared budget; False if it is used up."""
+        with self._cond:
+            if self.state != STATE_CLOSED:
+                # The retry will wait for the breaker anyway, so it costs nothing
+                return True
+            now = time.monotonic()
+            self._budget = min(float(RETRY_BUDGET_MAX),
+                               self._budget + (now - self._budget_updated) * RETRY_BUDGET_PER_SECOND)
+            self._budget_updated = now
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+
+_breakers: Dict[str, CircuitBreaker] = {
+    "api": CircuitBreaker("api"),
+    "storage": CircuitBreaker("storage"),
+}
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    """The shared breaker for the host class of `url`."""
+    return _breakers[host_class(url)]
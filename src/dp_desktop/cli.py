@@ -0,0 +1,294 @@
+"""
+Headless command line interface, for scheduled transfers on machines without a display.
+
+    python -m dp_desktop upload FOLDER --dataset NAME [--schema ID]
+    python -m dp_desktop download DATASET OUTPUT_DIR
+    python -m dp_desktop list-datasets
+    python -m dp_desktop list-schemas
+
+Every command writes JSON lines to stdout (one object per event or listed
+item; transfers end with a "metrics" summary) and logs to stderr or
+--log-file. --metrics-file and --metrics-port export live transfer metrics,
+and --rate-limits (or $DOCUPANDA_RATE_LIMITS) lowers or raises request rates.
+The API key comes from --api-key, the DOCUPANDA_API_KEY environment
+variable, or the key saved by the desktop app, in that order. Flet is never
+imported, and the transfer modules are only imported by the command that
+needs them, so startup stays fast.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+EXIT_OK = 0
+EXIT_FAILURES = 1  # The command ran, but some files or documents failed or were not processed
+EXIT_USAGE = 2  # Invalid arguments (also used by argparse)
+EXIT_NO_API_KEY = 3
+EXIT_ERROR = 4  # The command itself failed, e.g. the API could not be reached
+EXIT_INTERRUPTED = 130
+
+PROGRESS_INTERVAL = 1.0  # Seconds between progress lines
+
+_output_lock = threading.Lock()
+
+
+def emit(event: str, **fields):
+    """Write one JSON line to stdout."""
+    line = json.dumps({"event": event, "time": round(time.time(), 3), **fields})
+    with _output_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+class _RunReporter(object):
+    # Turns transfer callbacks into JSON lines: errors immediately, progress at a fixed rate
+
+    def __init__(self, progress_interval: float):
+        from dp_desktop import metrics
+        from dp_desktop.breaker import add_listener
+        from dp_desktop.progress import ProgressAggregator
+
+        self.errors = 0
+        self.service_degraded = False
+        self.completed = 0
+        self.total = 0
+        self._progress = ProgressAggregator(self._render, interval=progress_interval)
+        self._run_metrics = metrics.begin_run()
+        add_listener(self._on_service_state)
+
+    def _render(self, snapshot):
+        self.completed, self.total = snapshot.completed, snapshot.total
+        emit("progress", completed=snapshot.completed, total=snapshot.total)
+
+    def _on_service_state(self, host_class: str, degraded: bool, message: str):
+        self.service_degraded = self.service_degraded or degraded
+        emit("service", host=host_class, degraded=degraded, message=message)
+
+    def progress(self, completed: int, total: int):
+        self._progress.progress(completed, total)
+
+    def error(self, item: str, message: str):
+        self.errors += 1
+        emit("error", item=item, message=message)
+
+    def close(self) -> int:
+        from dp_desktop.breaker import remove_listener
+
+        self._progress.close()
+        remove_listener(self._on_service_state)
+        summary = self._run_metrics.summary()
+        # Items that failed during an outage are counted apart from other failures
+        degraded = int(sum(count for item, count in summary["items"].items() if item.endswith("/degraded")))
+        failed = self.errors > 0 or degraded > 0 or self.service_degraded or self.completed < self.total
+        emit("metrics", **summary)
+        emit("done", completed=self.completed, total=self.total, errors=self.errors, degraded=degraded,
+             service_degraded=self.service_degraded)
+        return EXIT_FAILURES if failed else EXIT_OK
+
+
+def _resolve_api_key(args) -> str:
+    from dp_desktop.config import API_KEY_ENV, load_api_key
+
+    key = args.api_key or os.getenv(API_KEY_ENV) or load_api_key()
+    return key.strip() if key else ""
+
+
+def cmd_upload(args, api_key: str) -> int:
+    from dp_desktop.config import HASH_CACHE_FILE, JOURNALS_DIR
+    from dp_desktop.transcode import TranscodeSettings
+    from dp_desktop.upload import upload_files
+
+    reporter = _RunReporter(args.progress_interval)
+    upload_files(
+        args.folder,
+        api_key,
+        args.dataset,
+        args.schema,
+        progress_callback=reporter.progress,
+        error_callback=lambda file_path, message: reporter.error(str(file_path), message),
+        max_workers=args.workers,
+        journal_dir=None if args.no_journal else JOURNALS_DIR,
+        deduplicate=not args.no_dedup,
+        hash_cache_path=None if args.no_dedup else HASH_CACHE_FILE,
+        dedup_callback=lambda stats: emit(
+            "dedup",
+            duplicates_in_folder=stats.duplicates_in_folder,
+            duplicates_uploaded=stats.duplicates_uploaded,
+            bytes_skipped=stats.bytes_skipped,
+        ),
+        transcode=TranscodeSettings(dpi=args.image_dpi, quality=args.image_quality) if args.optimize_images else None,
+        transcode_callback=lambda stats: emit(
+            "transcode",
+            files_transcoded=stats.files_transcoded,
+            bytes_before=stats.bytes_before,
+            bytes_after=stats.bytes_after,
+            bytes_saved=stats.bytes_saved,
+        ),
+    )
+    return reporter.close()
+
+
+def cmd_download(args, api_key: str) -> int:
+    from dp_desktop.download import download_dataset
+
+    reporter = _RunReporter(args.progress_interval)
+    download_dataset(
+        api_key,
+        args.dataset,
+        args.output_dir,
+        progress_callback=reporter.progress,
+        error_callback=reporter.error,
+        sync=not args.no_sync,
+        max_workers=args.workers,
+    )
+    return reporter.close()
+
+
+def cmd_list_datasets(args, api_key: str) -> int:
+    from dp_desktop.list_objects import list_dataset_names
+
+    for name in list_dataset_names(api_key):
+        emit("dataset", name=name)
+    return EXIT_OK
+
+
+def cmd_list_schemas(args, api_key: str) -> int:
+    from dp_desktop.list_objects import list_schemas
+
+    for schema in list_schemas(api_key):
+        emit("schema", schemaId=schema.schemaId, schemaName=schema.schemaName)
+    return EXIT_OK
+
+
+@contextmanager
+def _metrics_sinks(args) -> Iterator[None]:
+    if not (args.metrics_file or args.metrics_port):
+        yield
+        return
+    from dp_desktop.metrics import JsonSnapshotSink, PrometheusExporter
+
+    with ExitStack() as stack:
+        if args.metrics_file:
+            stack.enter_context(JsonSnapshotSink(args.metrics_file))
+        if args.metrics_port:
+            exporter = stack.enter_context(PrometheusExporter(args.metrics_port))
+            emit("metrics_endpoint", url=exporter.url)
+        yield
+
+
+def _existing_dir(value: str) -> Path:
+    path = Path(value).expanduser()
+    if not path.is_dir():
+        raise argparse.ArgumentTypeError(f"not a directory: {value}")
+    return path
+
+
+def _rate_limits(value: str):
+    from dp_desktop.ratelimit import parse_rate_limits
+
+    try:
+        return parse_rate_limits(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from dp_desktop.config import RATE_LIMITS_ENV
+
+    parser = argparse.ArgumentParser(
+        prog="python -m dp_desktop",
+        description="Upload and download DocuPanda datasets without the desktop UI. Output is JSON lines.",
+    )
+    parser.add_argument("--api-key", help="DocuPanda API key (default: $DOCUPANDA_API_KEY or the saved key)")
+    parser.add_argument("--log-file", type=Path, help="Write logs to this file instead of stderr")
+    parser.add_argument("--log-level", default="WARNING",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Default: WARNING")
+    parser.add_argument("--log-format", default="text", choices=["text", "json"],
+                        help="json writes one JSON object per log record (default: text)")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL,
+                        help="Seconds between progress lines (default: %(default)s)")
+    parser.add_argument("--metrics-file", type=Path,
+                        help="Keep a JSON snapshot of transfer metrics in this file while running")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve transfer metrics for Prometheus at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--rate-limits", type=_rate_limits, default=os.getenv(RATE_LIMITS_ENV),
+                        metavar="CLASS=RATE[:BURST],...",
+                        help="Requests per second (and burst) per endpoint class: listing, upload, poll, "
+                             "download_url (default: $DOCUPANDA_RATE_LIMITS)")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    upload = commands.add_parser("upload", help="Upload a folder of documents to a dataset")
+    upload.add_argument("folder", type=_existing_dir)
+    upload.add_argument("--dataset", required=True, help="Dataset to upload into")
+    upload.add_argument("--schema", help="Standardize every document with this schema ID")
+    upload.add_argument("--workers", type=int, default=64, help="Upload threads (default: %(default)s)")
+    upload.add_argument("--no-dedup", action="store_true", help="Upload identical files again")
+    upload.add_argument("--no-journal", action="store_true",
+                        help="Do not record progress for resuming an interrupted upload")
+    upload.add_argument("--optimize-images", action="store_true",
+                        help="Recompress and downscale large images before upload (needs Pillow)")
+    upload.add_argument("--image-dpi", type=int, default=200,
+                        help="With --optimize-images, downscale images above this resolution (default: %(default)s)")
+    upload.add_argument("--image-quality", type=int, default=80, choices=range(1, 96), metavar="1-95",
+                        help="With --optimize-images, JPEG/WebP quality (default: %(default)s)")
+    upload.set_defaults(func=cmd_upload)
+
+    download = commands.add_parser("download", help="Download a dataset's OCR PDFs and standardization JSON")
+    download.add_argument("dataset")
+    download.add_argument("output_dir", type=Path)
+    download.add_argument("--workers", type=int, default=128, help="Download threads (default: %(default)s)")
+    download.add_argument("--no-sync", action="store_true",
+                          help="Download every document again, even if it is already in output_dir")
+    download.set_defaults(func=cmd_download)
+
+    list_datasets = commands.add_parser("list-datasets", help="List dataset names")
+    list_datasets.set_defaults(func=cmd_list_datasets)
+
+    list_schemas = commands.add_parser("list-schemas", help="List schemas")
+    list_schemas.set_defaults(func=cmd_list_schemas)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    from dp_desktop.logs import QueueLogging, RotatingLogFileHandler
+
+    # Written by a background thread, so transfer threads never wait on the log
+    handler = RotatingLogFileHandler(args.log_file) if args.log_file else logging.StreamHandler()
+    QueueLogging([handler], level=args.log_level, json_lines=args.log_format == "json")
+
+    if args.rate_limits:
+        from dp_desktop.ratelimit import configure_rate_limits
+
+        configure_rate_limits(args.rate_limits)
+
+    api_key = _resolve_api_key(args)
+    if not api_key:
+        emit("fatal", message="No API key: pass --api-key, set DOCUPANDA_API_KEY or save one in the desktop app")
+        return EXIT_NO_API_KEY
+
+    try:
+        with _metrics_sinks(args):
+            return args.func(args, api_key)
+    except KeyboardInterrupt:
+        emit("fatal", message="Interrupted")
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        logging.exception(f"Command '{args.command}' failed")
+        emit("fatal", message=str(e))
+        return EXIT_ERROR
+    finally:
+        from dp_desktop.transport import close_sessions
+
+        close_sessions()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+from dp_desktop.config import API_URL, STANDARDIZE_URL
+
+# host:port of the API servers; everything else is presigned storage
+API_HOSTS = {urlsplit(API_URL).netloc.lower(), urlsplit(STANDARDIZE_URL).netloc.lower()}
+THROTTLE_STATUSES = {429, 503}  # Server asks us to slow down
+LATENCY_WINDOW = 100  # Recent latencies kept per request kind
+LATENCY_CHECK_EVERY = 20  # Successful requests between p95 checks
+LATENCY_TOLERANCE = 3.0  # p95 above this multiple of the baseline median counts as congestion
+BASELINE_DRIFT = 1.05  # Per check, the baseline may rise this much towards a slower median
+THROTTLE_DECREASE = 0.5  # Multiplicative decrease on 429/503
+CONGESTION_DECREASE = 0.8  # Multiplicative decrease on rising latency or connection errors
+DECREASE_COOLDOWN = 2.0  # Seconds between decreases, so one burst of 429s halves the limit only once
+HOLD_AFTER_SIGNAL = 2.0  # Seconds without throttling or congestion before the limit may grow again
+
+# (initial, minimum, maximum) concurrency per host class
+API_LIMITS = (16, 2, 64)
+STORAGE_LIMITS = (32, 4, 256)
+
+
+class _LatencyTracker(object):
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.baseline: Optional[float] = None
+        self.since_check = 0
+
+    def add(self, latency: float) -> bool:
+        """Record a sample; True if the window's p95 shows congestion."""
+        self.samples.append(latency)
+        self.since_check += 1
+        if self.since_check < LATENCY_CHECK_EVERY or len(self.samples) < LATENCY_CHECK_EVERY:
+            return False
+        self.since_check = 0
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2]
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        self.baseline = p50 if self.baseline is None else min(p50, self.baseline * BASELINE_DRIFT)
+        return p95 > self.baseline * LATENCY_TOLERANCE
+
+
+class AdaptiveLimiter(object):
+    """
+    AIMD concurrency limit for one class of hosts.
+
+    Every request holds a slot while it runs. Each successful request raises
+    the limit by 1/limit (about +1 per round of `limit` requests) once no
+    throttling has been seen for HOLD_AFTER_SIGNAL seconds. A 429/503 halves
+    it, and a connection error or a p95 latency well above the usual median
+    cuts it by CONGESTION_DECREASE. Latencies are tracked per request
+    kind (e.g. GET and POST separately), since an upload POST is naturally
+    much slower than a status poll. Safe to use from worker threads.
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int, maximum: int):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._latency: Dict[str, _LatencyTracker] = {}
+        self._last_decrease = 0.0
+        self._last_signal = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def observe(self, kind: str, latency: float, status_code: Optional[int] = None, error: bool = False):
+        """Feed back the outcome of one request attempt made while holding a slot."""
+        with self._cond:
+            if status_code in THROTTLE_STATUSES:
+                self._decrease(THROTTLE_DECREASE, f"status={status_code}")
+                return
+            if error:
+                self._decrease(CONGESTION_DECREASE, "connection error")
+                return
+            tracker = self._latency.setdefault(kind, _LatencyTracker())
+            if tracker.add(latency):
+                self._decrease(CONGESTION_DECREASE, f"p95 latency of {kind} rising")
+                return
+            if time.monotonic() - self._last_signal < HOLD_AFTER_SIGNAL:
+                return
+            previous = int(self._limit)
+            self._limit = min(float(self.maximum), self._limit + 1.0 / self._limit)
+            if int(self._limit) > previous:
+                self._cond.notify()
+
+    def _decrease(self, factor: float, reason: str):
+        now = time.monotonic()
+        self._last_signal = now
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        previous = int(self._limit)
+        self._limit = max(float(self.minimum), self._limit * factor)
+        for tracker in self._latency.values():
+            tracker.samples.clear()
+        if int(self._limit) != previous:
+            logging.info(f"[CONCURRENCY] {self.name} limit {previous} -> {int(self._limit)} ({reason})")
+
+
+_limiters = {
+    "api": AdaptiveLimiter("api", *API_LIMITS),
+    "storage": AdaptiveLimiter("storage", *STORAGE_LIMITS),
+}
+
+
+def host_class(url: str) -> str:
+    """The host class of `url`: "api" for the DocuPanda API, "storage" for presigned blob URLs."""
+    # Compared with the port, so a local mock API and mock storage can share a host name
+    return "api" if urlsplit(url).netloc.lower() in API_HOSTS else "storage"
+
+
+def limiter_for(url: str) -> AdaptiveLimiter:
+    """The shared limiter for the host class of `url`: the DocuPanda API or blob storage."""
+    return _limiters[host_class(url)]
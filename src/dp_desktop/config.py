@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import platform
+from pathlib import Path
+
+APP_NAME = "DocuPanda"
+API_KEY_ENV = "DOCUPANDA_API_KEY"  # Takes precedence over the saved key in headless use
+API_URL_ENV = "DOCUPANDA_API_URL"  # Points every request at another server, e.g. the benchmark mock
+STANDARDIZE_URL_ENV = "DOCUPANDA_STANDARDIZE_URL"  # Defaults to $DOCUPANDA_API_URL when that is set
+LOG_FORMAT_ENV = "DOCUPANDA_LOG_FORMAT"  # "json" for JSON-lines log files instead of plain text
+METRICS_PORT_ENV = "DOCUPANDA_METRICS_PORT"  # The desktop app serves Prometheus metrics on this port when set
+RATE_LIMITS_ENV = "DOCUPANDA_RATE_LIMITS"  # Overrides request rates per endpoint class, e.g. "upload=5:10,poll=20"
+DEFAULT_API_URL = "https://app.docupanda.io"
+DEFAULT_STANDARDIZE_URL = "https://app.docupipe.ai"  # Batch standardization is served from this host
+
+# Scheme and host (no trailing slash) of the DocuPanda API and of batch standardization
+API_URL = os.getenv(API_URL_ENV, DEFAULT_API_URL).rstrip("/")
+STANDARDIZE_URL = os.getenv(STANDARDIZE_URL_ENV, os.getenv(API_URL_ENV, DEFAULT_STANDARDIZE_URL)).rstrip("/")
+
+
+def get_config_dir(app_name: str):
+    system = platform.system()
+    if system == "Darwin":  # macOS
+        return Path.home() / "Library" / "Application Support" / app_name
+    elif system == "Windows":
+        return Path(os.getenv("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / app_name
+    else:  # Linux or others
+        return Path.home() / f".{app_name.lower()}"
+
+
+CONFIG_DIR = get_config_dir(APP_NAME)
+CONFIG_FILE = CONFIG_DIR / "config.json"
+# Per-upload journals used to resume uploads interrupted by a crash or restart
+JOURNALS_DIR = CONFIG_DIR / "upload_journals"
+# Content hashes of uploaded files, so identical files are not uploaded to a dataset twice
+HASH_CACHE_FILE = CONFIG_DIR / "upload_hashes.sqlite3"
+# Cached dataset and schema listings, one file per API key
+LISTINGS_DIR = CONFIG_DIR / "listings"
+# One log file per run of the desktop app, rotated by size and age and pruned after a while
+LOGS_DIR = CONFIG_DIR / "logs"
+
+
+def load_api_key():
+    """Load the API key from our standard config file."""
+    if CONFIG_FILE.exists():
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                config = json.load(f)
+                return config.get("api_key", "")
+        except Exception as e:
+            logging.error(f"Error loading config: {e}")
+    return ""
+
+
+def save_api_key(api_key):
+    """Save the API key to our standard config file."""
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    config = {"api_key": api_key}
+    with open(CONFIG_FILE, "w") as f:
+        json.dump(config, f)
@@ -0,0 +1,144 @@
+import dataclasses
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from dp_desktop.encoding import iter_file_chunks
+
+HASH_CHUNK_SIZE = 1024 * 1024  # Bytes hashed per step; large enough that hashlib releases the GIL
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    BLAKE2b-256 hex digest of the file contents.
+
+    Reads through the same mmap-backed chunking as uploads, so memory stays
+    bounded. hashlib releases the GIL on large buffers, so several files can
+    be hashed in parallel threads.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    for chunk in iter_file_chunks(file_path, HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclasses.dataclass
+class DedupStats:
+    files_hashed: int = 0
+    bytes_hashed: int = 0
+    duplicates_in_folder: int = 0  # Identical to another file in this upload
+    duplicates_uploaded: int = 0  # Identical to a file uploaded to the same dataset before
+    bytes_skipped: int = 0
+
+
+class HashCache(object):
+    """
+    Persistent map of (dataset, schema, content hash) -> documentId for files uploaded earlier.
+
+    A file is only recorded once its document finished processing (and, when
+    uploaded with a schema, standardization), so a hit means the same bytes
+    are already available in that dataset. Safe to use from worker threads.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # schema_id is '' for files uploaded without standardization
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "dataset TEXT NOT NULL, schema_id TEXT NOT NULL, content_hash TEXT NOT NULL, document_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (dataset, content_hash, schema_id))"
+        )
+        if self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'hashes'").fetchone():
+            # Caches written before the schema was recorded: their documents exist, standardized or not
+            self._conn.execute(
+                "INSERT OR IGNORE INTO uploads (dataset, schema_id, content_hash, document_id, created_at) "
+                "SELECT dataset, '', content_hash, document_id, created_at FROM hashes"
+            )
+            self._conn.execute("DROP TABLE hashes")
+        self._conn.commit()
+
+    def get(self, dataset_name: str, content_hash: str, schema_id: Optional[str] = None) -> Optional[str]:
+        """
+        The document with these contents in the dataset. With schema_id, only a document
+        that was standardized with that schema counts.
+        """
+        with self._lock:
+            if schema_id:
+                row = self._conn.execute(
+                    "SELECT document_id FROM uploads WHERE dataset = ? AND content_hash = ? AND schema_id = ?",
+                    (dataset_name, content_hash, schema_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT document_id FROM uploads WHERE dataset = ? AND content_hash = ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (dataset_name, content_hash)
+                ).fetchone()
+        return row[0] if row else None
+
+    def put(self, dataset_name: str, content_hash: str, document_id: str, schema_id: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (dataset, schema_id, content_hash, document_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (dataset_name, schema_id or "", content_hash, document_id, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DuplicateTracker(object):
+    """
+    Groups files with identical content within one upload run.
+
+    The first file seen with a hash becomes the primary and is uploaded; later
+    files with the same hash are attached to it and share its outcome. If the
+    primary already succeeded, a late duplicate is done immediately; if it
+    failed, the next duplicate becomes a new primary and is tried again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # hash -> (followers waiting on the primary, or None once resolved; documentId if it succeeded)
+        self._groups: Dict[str, Tuple[Optional[List[Any]], Optional[str]]] = {}
+
+    def claim(self, content_hash: str, item: Any) -> Tuple[bool, Optional[str]]:
+        """
+        Register `item`. Returns (is_primary, document_id):
+        (True, None) upload it; (False, None) it was attached to a pending primary;
+        (False, document_id) an identical file already succeeded as `document_id`.
+        """
+        with self._lock:
+            group = self._groups.get(content_hash)
+            if group is None or (group[0] is None and group[1] is None):
+                self._groups[content_hash] = ([], None)
+                return True, None
+            followers, document_id = group
+            if followers is None:
+                return False, document_id
+            followers.append(item)
+            return False, None
+
+    def resolve(self, content_hash: str, document_id: Optional[str]) -> List[Any]:
+        """Record the primary's outcome (documentId on success, None on failure); returns its followers."""
+        with self._lock:
+            followers, _ = self._groups.get(content_hash, ([], None))
+            self._groups[content_hash] = (None, document_id)
+            return followers or []
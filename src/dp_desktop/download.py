@@ -1,11 +1,22 @@
 import concurrent.futures
 import dataclasses
+import hashlib
 import json
 import logging
+import shutil
+import tempfile
 import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
+from dp_desktop import metrics
+from dp_desktop.blob import atomic_output, download_to_file
+from dp_desktop.breaker import ServiceDegradedError
+from dp_desktop.config import API_URL
+from dp_desktop.logs import log_fields
+from dp_desktop.manifest import ManifestEntry, open_manifest
+from dp_desktop.transport import configure_transport
 # Import the retry logic from utils.py
 from dp_desktop.utils import request_with_retries
 
@@ -17,150 +28,510 @@ class Document:
     fileExtension: str
 
 
+DOCUMENT_PAGE_SIZE = 1000  # Documents per listing request; small enough that the first page arrives quickly
+MAX_LISTING_PAGES = 10000  # Safety stop for runaway pagination
+DOWNLOAD_WINDOW_PER_WORKER = 4  # Documents queued ahead of each download worker
+STANDARDIZATION_PAGE_SIZE = 100  # Standardizations per request when building the bulk index; payloads included, so kept small
+
+
 def download_dataset(
         api_key: str,
         dataset_name: str,
         output_dir: Path,
         progress_callback: Optional[Callable[[int, int], None]] = None,
-        error_callback: Optional[Callable[[str, str], None]] = None
+        error_callback: Optional[Callable[[str, str], None]] = None,
+        sync: bool = True,
+        bulk_standardizations: bool = True,
+        max_workers: int = 128
 ):
     """
     Download a dataset with progress/error callbacks.
 
-    - Uses list_documents() to retrieve the list of documents.
+    - Streams the document list page by page with iter_document_pages() and
+      starts downloading as soon as the first page arrives. Only a bounded
+      window of documents is queued for the workers at a time, so memory
+      depends on the window, not on the size of the dataset.
     - For each document, downloads its OCR URL, then its PDF, and
       finally any available standardization JSON data.
-    - Progress and errors are reported via the provided callbacks.
+    - With bulk_standardizations=True, a StandardizationIndex pages through the
+      dataset's standardizations, payloads included, in the background; the JSON
+      comes from there instead of a request per document. Workers never wait for
+      it: a document the index has not listed yet gets its JSON once the index is
+      complete. A standardization still processing counts as no JSON yet. If the
+      index cannot be built, each document's standardization is requested separately.
+    - Every downloaded document is recorded in a manifest in output_dir. With
+      sync=True, documents the manifest says are already on disk are skipped
+      without any API calls, so re-running only fetches new documents. When the
+      index has a newer standardization for a synced document, only its JSON is
+      rewritten.
+    - Up to `max_workers` documents are downloaded by worker threads; how many API
+      calls and blob transfers run at once is decided by the shared adaptive
+      concurrency limiters (see dp_desktop.concurrency). PDFs larger than
+      dp_desktop.blob.RANGE_PART_SIZE are fetched as several byte ranges at once.
+    - Documents that fail because the service is down (ServiceDegradedError) are
+      reported through error_callback like any other failure, and counted apart
+      in the metrics; the outage itself is also reported through dp_desktop.breaker.
+    - Progress and errors are reported via the provided callbacks. The total
+      passed to progress_callback grows while the listing is still running.
+    - Time spent per stage (OCR URL, PDF, standardization), bytes received
+      and outcomes are recorded in dp_desktop.metrics and summarized in the log at the end.
     """
     logging.info(f"Starting download of dataset='{dataset_name}' to: {output_dir}")
+    run_metrics = metrics.begin_run()
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    all_documents = list_documents(api_key, dataset_name)
-    total_docs = len(all_documents)
-    logging.info(f"Total docs to download: {total_docs}")
+    configure_transport(max_workers + 2)  # +2 for the listing prefetch and the standardization index
 
-    if total_docs == 0:
-        logging.info("No documents found for this dataset. Returning.")
-        return
+    manifest = open_manifest(output_dir)
+    known = manifest.load() if (manifest and sync) else {}
 
     progress_lock = threading.Lock()
-    docs_completed = [0]  # mutable reference for closure
+    docs_listed = [0]  # mutable reference for closure
+    docs_completed = [0]
+    docs_skipped = [0]
+    docs_degraded = [0]
+    window = threading.BoundedSemaphore(max_workers * DOWNLOAD_WINDOW_PER_WORKER)
+
+    # The standardization index is built in the background while PDFs download. Workers never wait
+    # for it: documents it has not listed yet get their JSON once it is complete.
+    def needs_payload(document_id: str, std_id: str) -> bool:
+        """Called by the index for each document's newest standardization; payloads already on disk are dropped."""
+        entry = known.get(document_id)
+        return not (entry and manifest.is_current(entry, output_dir, entry.filename, standardization_id=std_id))
 
-    # Call initial progress callback
-    if progress_callback:
-        progress_callback(0, total_docs)
+    std_index = StandardizationIndex(
+        api_key, dataset_name, spool_parent=output_dir, wanted=needs_payload
+    ) if bulk_standardizations else None
+    # (document, (pdfSize, pdfSha256) if the PDF was downloaded in this run) for documents
+    # the index had not listed yet; their JSON is written once it is complete.
+    deferred: List[Tuple[Document, Optional[Tuple[int, str]]]] = []
 
-    def download_single(doc: Document):
-        """Download the PDF and standardization data for a single document."""
+    def report_progress():
+        if progress_callback:
+            progress_callback(docs_completed[0], docs_listed[0])
+
+    def skip():
+        with progress_lock:
+            docs_skipped[0] += 1
+            docs_completed[0] += 1
+            report_progress()
+        metrics.inc("dp_items_total", operation="download", outcome="skipped")
+
+    def standardization_pending(doc: Document) -> bool:
+        """True while the index is still being built and has not listed `doc` yet."""
+        if std_index is None:
+            return False
+        found, _ = std_index.lookup(doc.documentId)
+        return not found and not std_index.done
+
+    def standardization_changed(doc: Document, entry: ManifestEntry) -> bool:
+        """True if the index knows a newer completed standardization than the one on disk."""
+        if std_index is None:
+            return False
+        found, std_id = std_index.lookup(doc.documentId)
+        return found and not manifest.is_current(entry, output_dir, doc.filename, standardization_id=std_id)
+
+    def latest_standardization(doc: Document, headers: dict) -> Optional[dict]:
+        """
+        Newest completed standardization of `doc`: taken from the index, or requested for this
+        document if there is no index or it did not keep the payload (the JSON on disk was current).
+        """
+        if std_index is not None:
+            found, std_id = std_index.lookup(doc.documentId)
+            if found and std_id is None:
+                return None
+            std = std_index.take(doc.documentId) if found else None
+            if std is not None:
+                return std
+        stds_url = (
+            f"{API_URL}/standardizations"
+            f"?document_id={doc.documentId}&limit=20&offset=0&exclude_payload=false"
+        )
+        stds_resp = request_with_retries("GET", stds_url, headers=headers)
+        # Newest first; one still processing has no data yet, so the newest completed one is used
+        return next((std for std in stds_resp.json() if std.get('data')), None)
+
+    def record(doc: Document, pdf_size: int, pdf_sha256: str, std_id: Optional[str], json_sha256: Optional[str]):
+        if manifest:
+            manifest.record(ManifestEntry(
+                documentId=doc.documentId,
+                filename=doc.filename,
+                pdfSize=pdf_size,
+                pdfSha256=pdf_sha256,
+                standardizationId=std_id,
+                jsonSha256=json_sha256
+            ))
+
+    @contextmanager
+    def stage(name: str):
+        with metrics.tracking("dp_stage_in_flight", operation="download", stage=name), \
+                metrics.timer("dp_stage_seconds", operation="download", stage=name):
+            yield
+
+    def download_single(doc: Document, pdf: Optional[Tuple[int, str]] = None):
+        """
+        Download the PDF and standardization data for a single document. `pdf` is the
+        (size, sha256) of a PDF this run already downloaded, when only the JSON is left to write.
+        """
         doc_label = f"{doc.filename} ({doc.documentId})"
-        logging.info(f"Starting download for: {doc_label}")
+        entry = known.get(doc.documentId)
+        pdf_current = pdf is None and bool(entry and manifest.is_current(entry, output_dir, doc.filename))
+        if pdf_current and not standardization_pending(doc) and not standardization_changed(doc, entry):
+            skip()
+            return
 
         headers = {
             "accept": "application/json",
             "X-API-Key": api_key
         }
+        deferring = False
         try:
-            # 1) Obtain a short-lived OCR download URL using retry logic.
-            url = f"https://app.docupanda.io/document/{doc.documentId}/download/ocr-url?hours=6"
-            response = request_with_retries("GET", url, headers=headers)
-            result = response.json()
-            download_url = result.get('url')
-            if not download_url:
-                raise RuntimeError("No download URL found in response.")
-
-            # 2) Download the PDF file using the retry logic.
-            file_response = request_with_retries("GET", download_url)
-            output_path = output_dir / (doc.filename + '.pdf')
-            with open(output_path, 'wb') as f:
-                f.write(file_response.content)
-            logging.info(f"Downloaded PDF for: {doc_label}")
-
-            # 3) Download standardization data (if present) using the retry logic.
-            stds_url = (
-                f"https://app.docupanda.io/standardizations"
-                f"?document_id={doc.documentId}&limit=20&offset=0&exclude_payload=false"
-            )
-            stds_resp = request_with_retries("GET", stds_url, headers=headers)
-            stds = stds_resp.json()
-            if stds:
-                std = stds[0]
+            if pdf is not None:
+                pdf_size, pdf_sha256 = pdf
+            elif pdf_current:
+                pdf_size, pdf_sha256 = entry.pdfSize, entry.pdfSha256
+            else:
+                logging.info(f"Starting download for: {doc_label}", **log_fields(doc.filename, doc.documentId))
+                # 1) Obtain a short-lived OCR download URL using retry logic.
+                url = f"{API_URL}/document/{doc.documentId}/download/ocr-url?hours=6"
+                with stage("ocr_url"):
+                    response = request_with_retries("GET", url, headers=headers)
+                result = response.json()
+                download_url = result.get('url')
+                if not download_url:
+                    raise RuntimeError("No download URL found in response.")
+
+                # 2) Stream the PDF file to disk; it only appears under its final name once complete.
+                output_path = output_dir / (doc.filename + '.pdf')
+                with stage("pdf"):
+                    pdf_size, pdf_sha256 = download_to_file(download_url, output_path)
+                metrics.inc("dp_bytes_total", pdf_size, operation="download", direction="received")
+                logging.info(f"Downloaded PDF for: {doc_label}", **log_fields(doc.filename, doc.documentId))
+
+            if standardization_pending(doc):
+                # The index has not reached this document yet; rather than waiting, the worker moves
+                # on and the JSON is written once the index is complete. Recording the PDF now keeps
+                # it if the run is interrupted.
+                if not pdf_current:
+                    record(doc, pdf_size, pdf_sha256, None, None)
+                deferring = True
+                with progress_lock:
+                    deferred.append((doc, None if pdf_current else (pdf_size, pdf_sha256)))
+                return
+
+            if pdf_current:
+                logging.info(f"Standardization changed, refreshing JSON for: {doc_label}",
+                             **log_fields(doc.filename, doc.documentId))
+
+            # 3) Write standardization data (if present).
+            with stage("standardization"):
+                std = latest_standardization(doc, headers)
+            std_id = json_sha256 = None
+            if std:
                 standardization_dict = std.get('data')
                 if standardization_dict:
                     json_path = output_dir / f"{doc.filename}.json"
-                    with open(json_path, 'w') as f:
-                        json.dump(standardization_dict, f, indent=2)
-                    logging.info(f"Downloaded standardization JSON for: {doc_label}")
+                    json_text = json.dumps(standardization_dict, indent=2)
+                    with atomic_output(json_path, 'w') as f:
+                        f.write(json_text)
+                    std_id = std.get('standardizationId')
+                    json_sha256 = hashlib.sha256(json_text.encode()).hexdigest()
+                    logging.info(f"Downloaded standardization JSON for: {doc_label}",
+                                 **log_fields(doc.filename, doc.documentId))
 
-            logging.info(f"Finished download for: {doc_label}")
+            record(doc, pdf_size, pdf_sha256, std_id, json_sha256)
+
+            logging.info(f"Finished download for: {doc_label}", **log_fields(doc.filename, doc.documentId))
+            metrics.inc("dp_items_total", operation="download", outcome="done")
+
+        except ServiceDegradedError as e:
+            # No traceback: the outage itself is logged by dp_desktop.breaker
+            logging.error(f"Error downloading document {doc_label}: {e}", **log_fields(doc.filename, doc.documentId))
+            metrics.inc("dp_items_total", operation="download", outcome="degraded")
+            with progress_lock:
+                docs_degraded[0] += 1
+            if error_callback:
+                error_callback(doc_label, str(e))
 
         except Exception as e:
-            logging.error(f"Error downloading document {doc_label}: {e}", exc_info=True)
+            logging.error(f"Error downloading document {doc_label}: {e}", exc_info=True,
+                          **log_fields(doc.filename, doc.documentId))
+            metrics.inc("dp_items_total", operation="download", outcome="failed")
             if error_callback:
                 error_callback(doc_label, str(e))
 
         finally:
             # Update progress after each document completes (successfully or not)
-            with progress_lock:
-                docs_completed[0] += 1
-                if progress_callback:
-                    progress_callback(docs_completed[0], total_docs)
+            if not deferring:
+                with progress_lock:
+                    docs_completed[0] += 1
+                    report_progress()
+
+    def run_single(doc: Document, pdf: Optional[Tuple[int, str]] = None):
+        try:
+            download_single(doc, pdf)
+        finally:
+            window.release()
 
-    max_workers = 20
     logging.info(f"Creating ThreadPoolExecutor with max_workers={max_workers}")
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(download_single, all_documents)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if std_index:
+                std_index.start()
+            for page in iter_document_pages(api_key, dataset_name):
+                with progress_lock:
+                    docs_listed[0] += len(page)
+                    report_progress()
+                for doc in page:
+                    # Blocks while the window is full, which also pauses the listing
+                    window.acquire()
+                    executor.submit(run_single, doc)
+
+        if deferred:
+            # Every document has been looked at, so the index is all that is left to wait for
+            std_index.wait()
+            logging.info(f"Writing standardizations of {len(deferred)} documents listed after their download")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for doc, pdf in deferred:
+                    window.acquire()
+                    executor.submit(run_single, doc, pdf)
+    finally:
+        if std_index:
+            std_index.close()
+        if manifest:
+            manifest.close()
+
+    if docs_listed[0] == 0:
+        logging.info("No documents found for this dataset. Returning.")
+        return
+
+    if docs_degraded[0]:
+        logging.error(f"{docs_degraded[0]} documents failed because the service was unavailable; "
+                      f"download the dataset again to fetch them.")
+    logging.info(f"All downloads completed. Documents processed: {docs_completed[0]} / {docs_listed[0]}, "
+                 f"skipped as already synced: {docs_skipped[0]}")
+    for line in run_metrics.summary_lines():
+        logging.info(f"[METRICS] {line}")
 
-    logging.info(f"All downloads completed. Documents processed: {docs_completed[0]} / {total_docs}")
+
+def _fetch_document_page(api_key: str, dataset_name: str, limit: int, offset: int) -> List[Document]:
+    url = (
+        f"{API_URL}/documents"
+        f"?dataset={dataset_name}"
+        f"&limit={limit}"
+        f"&offset={offset}"
+        "&exclude_payload=true"
+    )
+    headers = {
+        "accept": "application/json",
+        "X-API-Key": api_key
+    }
+    response = request_with_retries("GET", url, headers=headers)
+    return [
+        Document(
+            documentId=doc['documentId'],
+            filename=doc['filename'],
+            fileExtension=doc['fileExtension']
+        )
+        for doc in response.json()
+    ]
 
 
-def list_documents(api_key: str, dataset_name: str):
+def iter_document_pages(
+        api_key: str,
+        dataset_name: str,
+        page_size: int = DOCUMENT_PAGE_SIZE,
+        prefetch: bool = True
+) -> Iterator[List[Document]]:
     """
-    List all documents for the specified dataset from DocuPanda (paginated).
-    Returns a list of Document objects.
+    Yield the documents of the specified dataset one page at a time.
+
+    With prefetch=True the next page is requested in the background while the
+    caller works on the current one, so listing overlaps with downloading.
+    A failed page request is logged and ends the listing.
     """
-    logging.info(f"Listing all documents for dataset='{dataset_name}'")
-    limit = 20000
-    offset = 0
-    all_documents = []
+    logging.info(f"Listing documents for dataset='{dataset_name}' (page_size={page_size})")
+    listed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_page = prefetcher.submit(_fetch_document_page, api_key, dataset_name, page_size, 0)
+        for page_i in range(MAX_LISTING_PAGES):
+            try:
+                page = next_page.result()
+            except Exception as e:
+                logging.error(f"Error fetching documents for dataset='{dataset_name}': {e}", exc_info=True)
+                break
+            if not page:
+                break
+
+            is_last = len(page) < page_size
+            if prefetch and not is_last:
+                next_page = prefetcher.submit(
+                    _fetch_document_page, api_key, dataset_name, page_size, (page_i + 1) * page_size
+                )
+            listed += len(page)
+            logging.info(f"Fetched page {page_i + 1} of documents ({listed} so far)")
+            yield page
+
+            if is_last:
+                break
+            if not prefetch:
+                next_page = prefetcher.submit(
+                    _fetch_document_page, api_key, dataset_name, page_size, (page_i + 1) * page_size
+                )
+
+    logging.info(f"Total documents fetched: {listed}")
 
-    max_iterations = 500
 
-    for iter_i in range(max_iterations):
-        logging.info(f"Iteration {iter_i + 1} to fetch documents...")
+def iter_standardization_pages(
+        api_key: str,
+        dataset_name: str,
+        page_size: int = STANDARDIZATION_PAGE_SIZE
+) -> Iterator[List[dict]]:
+    """
+    Yield the dataset's standardizations, payloads included, one page at a time.
+
+    The API lists a document's standardizations newest first (the same order
+    the per-document request relies on). Raises if a page cannot be fetched.
+    """
+    headers = {
+        "accept": "application/json",
+        "X-API-Key": api_key
+    }
+    offset = 0
+    for _ in range(MAX_LISTING_PAGES):
         url = (
-            "https://app.docupanda.io/documents"
+            f"{API_URL}/standardizations"
             f"?dataset={dataset_name}"
-            f"&limit={limit}"
+            f"&limit={page_size}"
             f"&offset={offset}"
-            "&exclude_payload=true"
+            "&exclude_payload=false"
         )
-        headers = {
-            "accept": "application/json",
-            "X-API-Key": api_key
-        }
+        response = request_with_retries("GET", url, headers=headers)
+        stds = response.json()
+        yield [std for std in stds if std.get('documentId')]
+        offset += page_size
+        if len(stds) < page_size:
+            break
 
-        try:
-            response = request_with_retries("GET", url, headers=headers)
-            new_documents = response.json()
-            if not new_documents:
-                break
 
-            for doc in new_documents:
-                all_documents.append(
-                    Document(
-                        documentId=doc['documentId'],
-                        filename=doc['filename'],
-                        fileExtension=doc['fileExtension']
-                    )
-                )
-            offset += limit
+class StandardizationIndex(object):
+    """
+    The newest completed standardization of every document in a dataset, paged through in a background thread.
 
-            if len(new_documents) < limit:
-                break
+    Usage:
+        index = StandardizationIndex(api_key, dataset_name, spool_parent, wanted=lambda doc_id, std_id: True)
+        index.start()
+        found, std_id = index.lookup(document_id)  # std_id None: the document has no standardization
+        std = index.take(document_id)  # The standardization with its data, if `wanted` kept it
+        index.close()
+
+    The listing includes payloads, so no request is made per document. Only one page is
+    held in memory: the index keeps each document's standardizationId, and writes the
+    payloads `wanted(documentId, standardizationId)` asks for to a private folder in
+    `spool_parent` until they are taken. Standardizations still processing have no data
+    and are passed over, so a document's JSON stays at its newest completed one.
+
+    lookup() never blocks: found is False while the document has not been listed yet, or
+    if the index failed. Once the index is complete, unlisted documents have no standardization.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            dataset_name: str,
+            spool_parent: Path,
+            wanted: Callable[[str, str], bool] = lambda document_id, std_id: True,
+            page_size: int = STANDARDIZATION_PAGE_SIZE
+    ):
+        self._api_key = api_key
+        self._dataset_name = dataset_name
+        self._spool_parent = spool_parent
+        self._wanted = wanted
+        self._page_size = page_size
+        self._spool_dir: Optional[Path] = None
+        self._ids: Dict[str, str] = {}
+        self._spooled: Set[str] = set()
+        self._done = False
+        self._failed = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._build, name="std-index", daemon=True)
 
+    def start(self):
+        self._spool_dir = Path(tempfile.mkdtemp(prefix=".docupanda-standardizations-", dir=self._spool_parent))
+        self._thread.start()
+
+    def _spool_path(self, document_id: str) -> Path:
+        return self._spool_dir / f"{document_id}.json"
+
+    def _build(self):
+        logging.info(f"Building standardization index for dataset='{self._dataset_name}'")
+        try:
+            for page in iter_standardization_pages(self._api_key, self._dataset_name, self._page_size):
+                with self._cond:
+                    if self._closed:
+                        return
+                # Only this thread adds ids, so the payloads can be written without holding the lock
+                listed = {}
+                kept = []
+                for std in page:
+                    document_id, std_id = std['documentId'], std['standardizationId']
+                    if not std.get('data') or document_id in self._ids or document_id in listed:
+                        continue
+                    listed[document_id] = std_id
+                    if self._wanted(document_id, std_id):
+                        self._spool_path(document_id).write_text(json.dumps(std))
+                        kept.append(document_id)
+                with self._cond:
+                    self._ids.update(listed)
+                    self._spooled.update(kept)
+                    self._cond.notify_all()
+            logging.info(f"Standardization index built: {len(self._ids)} documents")
         except Exception as e:
-            logging.error(f"Error fetching documents for dataset='{dataset_name}': {e}", exc_info=True)
-            break
+            logging.warning(f"Could not build standardization index for dataset='{self._dataset_name}': {e}. "
+                            f"Fetching standardizations per document.")
+            with self._cond:
+                self._failed = True
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    @property
+    def done(self) -> bool:
+        """True once the index is complete or has failed."""
+        with self._cond:
+            return self._done
+
+    def wait(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._done)
+
+    def lookup(self, document_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        (found, standardizationId) of a document, without waiting. found is False if the
+        index failed or is still being built and has not listed the document yet.
+        """
+        with self._cond:
+            if document_id in self._ids:
+                return True, self._ids[document_id]
+            return self._done and not self._failed, None
+
+    def take(self, document_id: str) -> Optional[dict]:
+        """The document's listed standardization, if its payload was kept; it is only handed out once."""
+        with self._cond:
+            if document_id not in self._spooled:
+                return None
+            self._spooled.discard(document_id)
+        path = self._spool_path(document_id)
+        std = json.loads(path.read_text())
+        path.unlink()
+        return std
 
-    logging.info(f"Total documents fetched: {len(all_documents)}")
-    return all_documents
+    def close(self):
+        with self._cond:
+            self._closed = True
+        if self._thread.ident is not None:
+            self._thread.join()
+        if self._spool_dir is not None:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
@@ -0,0 +1,128 @@
+import base64
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Raw bytes read per step. Must be a multiple of 3 so that every chunk encodes
+# to base64 without padding and the pieces can simply be concatenated.
+READ_CHUNK_SIZE = 3 * 256 * 1024
+
+
+def _base64_length(n_bytes: int) -> int:
+    return 4 * ((n_bytes + 2) // 3)
+
+
+def iter_file_chunks(file_path: Path, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield the raw contents of `file_path` in `chunk_size` pieces.
+
+    The file is memory-mapped when possible so the OS pages it in on demand
+    instead of copying it into the Python heap. Empty files and filesystems
+    that refuse mmap fall back to plain buffered reads.
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            mapped = None
+
+        if mapped is None:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+        with mapped:
+            for start in range(0, len(mapped), chunk_size):
+                yield mapped[start:start + chunk_size]
+
+
+def prefetch_file(file_path: Path):
+    """
+    Ask the OS to start reading `file_path` into the page cache in the background.
+
+    Only a hint: it returns immediately, and is a no-op on platforms without
+    posix_fadvise (Windows, macOS).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+class Base64JsonBody(object):
+    """
+    Re-iterable request body for `POST /document` that base64-encodes the file on the fly.
+
+    Produces exactly the JSON that
+    `{"dataset": ..., "document": {"file": {"filename": ..., "contents": <base64>}}}`
+    would serialize to, but only ever holds one chunk of the file in memory.
+    `requests` streams any object with `__iter__`, and `__len__` lets it send a
+    Content-Length header instead of falling back to chunked encoding. Each
+    iteration reopens the file, so the body can be re-sent by
+    `request_with_retries`. `filename` overrides the name sent, e.g. when
+    uploading an optimized copy of a file under the original's name.
+    """
+
+    def __init__(self, file_path: Path, dataset_name: str, chunk_size: int = READ_CHUNK_SIZE,
+                 filename: Optional[str] = None):
+        if chunk_size % 3:
+            raise ValueError("chunk_size must be a multiple of 3")
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self._prefix = (
+            '{"dataset": ' + json.dumps(dataset_name) +
+            ', "document": {"file": {"filename": ' + json.dumps(filename or file_path.name) +
+            ', "contents": "'
+        ).encode()
+        self._suffix = b'"}}}'
+
+    def __len__(self):
+        file_size = os.stat(self.file_path).st_size
+        return len(self._prefix) + _base64_length(file_size) + len(self._suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._prefix
+        for chunk in iter_file_chunks(self.file_path, self.chunk_size):
+            yield base64.b64encode(chunk)
+        yield self._suffix
+
+
+def encode_body(body: Base64JsonBody) -> bytes:
+    """The whole request body in memory, e.g. to encode a small file before its POST slot comes up."""
+    return b"".join(body)
+
+
+class BufferBudget(object):
+    """
+    Caps the bytes of request bodies encoded ahead of time and waiting to be sent.
+
+    `reserve` blocks while the budget is used up and `release` gives the bytes
+    back once the body has been sent. A body larger than the whole budget can
+    never be reserved; callers keep such files lazy instead.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def reserve(self, n_bytes: int):
+        if n_bytes > self.max_bytes:
+            raise ValueError(f"{n_bytes} bytes exceed the budget of {self.max_bytes}")
+        with self._cond:
+            while self._used + n_bytes > self.max_bytes:
+                self._cond.wait()
+            self._used += n_bytes
+
+    def release(self, n_bytes: int):
+        with self._cond:
+            self._used -= n_bytes
+            self._cond.notify_all()
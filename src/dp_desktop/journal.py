@@ -0,0 +1,151 @@
+import dataclasses
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Per-file states, in the order a file moves through them
+STATUS_UPLOADED = "uploaded"  # POST succeeded, document is processing server-side
+STATUS_PROCESSED = "processed"  # Document completed; standardization not requested yet
+STATUS_STANDARDIZING = "standardizing"  # Standardization requested, waiting for it to complete
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    status TEXT NOT NULL,
+    document_id TEXT,
+    standardization_id TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+@dataclasses.dataclass
+class JournalEntry:
+    path: str
+    size: int
+    mtime: float
+    status: str
+    documentId: Optional[str] = None
+    standardizationId: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclasses.dataclass
+class UnfinishedUpload:
+    journal_path: Path
+    folder_path: Path
+    dataset_name: str
+    schema_id: Optional[str]
+
+
+class UploadJournal(object):
+    """
+    Crash-safe record of an upload run, one SQLite file per (folder, dataset, schema).
+
+    `upload_files` records every state transition of every file (see the
+    STATUS_* constants) together with its size, mtime, documentId and
+    standardizationId, committing each one immediately. When the same folder
+    is uploaded to the same dataset again, e.g. after the app was killed, the
+    journal tells the uploader which files are finished, which documentIds only
+    need polling and which files must be sent again. Safe to use from worker threads.
+    """
+
+    def __init__(self, path: Path, folder_path: Path, dataset_name: str, schema_id: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._set_meta(folder=str(folder_path), dataset=dataset_name, schema=schema_id or "", finished="0")
+
+    def _set_meta(self, **values: str):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(values.items())
+            )
+            self._conn.commit()
+
+    def load(self) -> Dict[str, JournalEntry]:
+        """All recorded files, keyed by their path as a string."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime, status, document_id, standardization_id, error FROM files"
+            ).fetchall()
+        return {row[0]: JournalEntry(*row) for row in rows}
+
+    def record(
+            self,
+            file_path: Path,
+            status: str,
+            size: int,
+            mtime: float,
+            document_id: Optional[str] = None,
+            standardization_id: Optional[str] = None,
+            error: Optional[str] = None
+    ):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files "
+                "(path, size, mtime, status, document_id, standardization_id, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(file_path), size, mtime, status, document_id, standardization_id, error, time.time())
+            )
+            self._conn.commit()
+
+    def mark_finished(self):
+        """Record that the run ended normally, so it is no longer offered for resuming."""
+        self._set_meta(finished="1")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def journal_path_for(journal_dir: Path, folder_path: Path, dataset_name: str, schema_id: Optional[str]) -> Path:
+    """Journal file used for uploading `folder_path` to `dataset_name` with `schema_id`."""
+    key = f"{folder_path.resolve()}\n{dataset_name}\n{schema_id or ''}"
+    return journal_dir / f"upload_{hashlib.sha1(key.encode()).hexdigest()[:16]}.sqlite3"
+
+
+def find_unfinished_uploads(journal_dir: Path) -> List[UnfinishedUpload]:
+    """Upload runs in `journal_dir` that were interrupted before they finished."""
+    unfinished = []
+    for journal_path in sorted(journal_dir.glob("upload_*.sqlite3")):
+        try:
+            conn = sqlite3.connect(str(journal_path))
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Ignoring unreadable upload journal {journal_path}: {e}")
+            continue
+        if meta.get("finished") == "0":
+            unfinished.append(UnfinishedUpload(
+                journal_path=journal_path,
+                folder_path=Path(meta["folder"]),
+                dataset_name=meta["dataset"],
+                schema_id=meta["schema"] or None
+            ))
+    return unfinished
@@ -1,7 +1,13 @@
 import dataclasses
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
-import requests
+from dp_desktop.config import API_URL
+from dp_desktop.utils import request_with_retries
+
+SCHEMA_PAGE_SIZE = 1000  # Schemas per request
+PAGINATION_WORKERS = 4  # Pages requested concurrently once the first page turns out to be full
+MAX_SCHEMA_PAGES = 1000  # Safety stop for runaway pagination
 
 
 @dataclasses.dataclass
@@ -10,31 +16,49 @@ class Schema:
     schemaId: str
 
 
-def list_schemas(api_key: str) -> List[Schema]:
-    url = "https://app.docupanda.io/schemas?limit=1000&offset=0&exclude_payload=true"
+def _fetch_schema_page(api_key: str, offset: int, limit: int) -> List[Schema]:
+    url = f"{API_URL}/schemas?limit={limit}&offset={offset}&exclude_payload=true"
 
     headers = {
         "accept": "application/json",
         "X-API-Key": api_key
     }
-    response = requests.get(url, headers=headers)
-
-    if response.status_code != 200:
-        raise Exception(f"Error: {response.status_code} - {response.text}")
+    response = request_with_retries("GET", url, headers=headers)
     schemas = response.json()
     return [Schema(schemaName=schema['schemaName'], schemaId=schema['schemaId']) for schema in schemas]
 
 
+def list_schemas(api_key: str, page_size: int = SCHEMA_PAGE_SIZE) -> List[Schema]:
+    """
+    All schemas of the account, paging through /schemas until a short page.
+
+    The first page is fetched alone, since most accounts fit in it. If it is
+    full, the following pages are requested PAGINATION_WORKERS at a time.
+    """
+    schemas = _fetch_schema_page(api_key, 0, page_size)
+    if len(schemas) < page_size:
+        return schemas
+
+    offset = page_size
+    with ThreadPoolExecutor(max_workers=PAGINATION_WORKERS) as executor:
+        while offset < MAX_SCHEMA_PAGES * page_size:
+            offsets = [offset + i * page_size for i in range(PAGINATION_WORKERS)]
+            pages = list(executor.map(lambda o: _fetch_schema_page(api_key, o, page_size), offsets))
+            for page in pages:
+                schemas.extend(page)
+            if any(len(page) < page_size for page in pages):
+                break
+            offset += PAGINATION_WORKERS * page_size
+    return schemas
+
+
 def list_dataset_names(api_key: str) -> List[str]:
-    url = "https://app.docupanda.io/dataset-names"
+    url = f"{API_URL}/dataset-names"
 
     headers = {
         "accept": "application/json",
         "X-API-Key": api_key
     }
-    response = requests.get(url, headers=headers)
-
-    if response.status_code != 200:
-        raise Exception(f"Error: {response.status_code} - {response.text}")
+    response = request_with_retries("GET", url, headers=headers)
     datasets = response.json()['datasetNames']
     return datasets
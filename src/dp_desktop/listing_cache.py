@@ -0,0 +1,125 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from dp_desktop.blob import atomic_output
+from dp_desktop.list_objects import Schema, list_dataset_names, list_schemas
+
+LISTING_TTL = 300  # Seconds a cached listing is served without revalidating
+MAX_STALE = 7 * 24 * 3600  # Seconds after which a cached listing is too old to show at all
+
+_caches: Dict[Tuple[str, str], "ListingCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class ListingCache(object):
+    """
+    On-disk cache of an account's dataset names and schemas, with stale-while-revalidate.
+
+    One JSON file per API key (named by a hash of the key, never the key
+    itself) in `cache_dir`. A listing younger than LISTING_TTL is returned
+    as is. An older one is still returned immediately, and a background
+    thread refreshes it for next time; only one refresh per listing runs at
+    a time. Without a usable cached copy, the listing is fetched in the
+    calling thread. A failed refresh keeps the cached copy. Safe to use from
+    several threads; get one through `get_listing_cache`.
+    """
+
+    def __init__(self, cache_dir: Path, api_key: str, ttl: float = LISTING_TTL):
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        self.path = cache_dir / f"listings_{key_hash}.json"
+        self.ttl = ttl
+        self._api_key = api_key
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._entries: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable listing cache {self.path}: {e}")
+            return {}
+
+    def _write(self):
+        # Called with self._lock held
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_output(self.path, 'w') as f:
+                json.dump(self._entries, f)
+        except OSError as e:
+            logging.warning(f"Could not write listing cache {self.path}: {e}")
+
+    def _store(self, name: str, items: List[Any]):
+        with self._lock:
+            self._entries[name] = {"fetched_at": time.time(), "items": items}
+            self._write()
+
+    def _refresh(self, name: str, fetch: Callable[[str], List[Any]]):
+        try:
+            self._store(name, fetch(self._api_key))
+            logging.info(f"Refreshed cached {name} listing")
+        except Exception as e:
+            logging.warning(f"Refreshing cached {name} listing failed, keeping the cached copy: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(name)
+
+    def _get(self, name: str, fetch: Callable[[str], List[Any]]) -> List[Any]:
+        with self._lock:
+            entry = self._entries.get(name)
+            age = time.time() - entry["fetched_at"] if entry else None
+            if entry is not None and age <= MAX_STALE:
+                if age > self.ttl and name not in self._refreshing:
+                    self._refreshing.add(name)
+                    threading.Thread(target=self._refresh, args=(name, fetch), daemon=True).start()
+                return entry["items"]
+        items = fetch(self._api_key)
+        self._store(name, items)
+        return items
+
+    def is_cached(self, name: str) -> bool:
+        """True if `name` ("datasets" or "schemas") can be returned without waiting for the network."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry is not None and time.time() - entry["fetched_at"] <= MAX_STALE
+
+    def dataset_names(self) -> List[str]:
+        return self._get("datasets", _fetch_dataset_names)
+
+    def schemas(self) -> List[Schema]:
+        return [Schema(**item) for item in self._get("schemas", _fetch_schemas)]
+
+    def refresh(self, name: str):
+        """Fetch `name` ("datasets" or "schemas") now, e.g. after an upload created a dataset."""
+        self._store(name, _FETCHERS[name](self._api_key))
+
+
+def _fetch_dataset_names(api_key: str) -> List[str]:
+    return list_dataset_names(api_key)
+
+
+def _fetch_schemas(api_key: str) -> List[Dict[str, str]]:
+    # Stored as plain dicts so the cache file stays JSON
+    return [dataclasses.asdict(schema) for schema in list_schemas(api_key)]
+
+
+_FETCHERS = {"datasets": _fetch_dataset_names, "schemas": _fetch_schemas}
+
+
+def get_listing_cache(cache_dir: Path, api_key: str) -> ListingCache:
+    """The shared ListingCache for `api_key`, so concurrent callers share one refresh."""
+    with _caches_lock:
+        cache = _caches.get((str(cache_dir), api_key))
+        if cache is None:
+            cache = ListingCache(cache_dir, api_key)
+            _caches[(str(cache_dir), api_key)] = cache
+        return cache
@@ -0,0 +1,198 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+MAX_LOG_BYTES = 20 * 1024 * 1024  # A log file is rotated once it reaches this size...
+ROTATE_INTERVAL = 24 * 3600  # ...or after this many seconds, whichever comes first
+BACKUP_COUNT = 10  # Rotated files kept per run
+LOG_RETENTION_DAYS = 14  # Log files older than this are deleted at startup
+MAX_LOG_FILES = 100  # Newest log files kept in the logs folder, counting rotated ones
+
+# Record attributes copied into JSON lines when a log call passes them in `extra`, see log_fields()
+STRUCTURED_FIELDS = ("documentId", "file", "dataset", "standardizationId")
+
+
+def log_fields(file: Optional[Union[str, Path]] = None, document_id: Optional[str] = None, **fields) -> Dict[str, Dict]:
+    """
+    Keyword arguments that attach structured fields to one log call, e.g.
+    log.info("[UPLOAD SUCCESS] ...", **log_fields(file_path, document_id)). They appear
+    as their own keys in the JSON-lines format and are ignored by the text format.
+    """
+    extra = {name: value for name, value in fields.items() if value is not None}
+    if file is not None:
+        extra["file"] = str(file)
+    if document_id is not None:
+        extra["documentId"] = document_id
+    return {"extra": extra}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, with the fields from log_fields() as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "source": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def make_formatter(json_lines: bool = False) -> logging.Formatter:
+    return JsonLinesFormatter() if json_lines else logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+
+
+class RotatingLogFileHandler(logging.handlers.RotatingFileHandler):
+    """A RotatingFileHandler that also rolls over after `interval` seconds, so long sessions stay splittable."""
+
+    def __init__(self, filename: Path, max_bytes: int = MAX_LOG_BYTES, backup_count: int = BACKUP_COUNT,
+                 interval: float = ROTATE_INTERVAL):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler renders the traceback into the message; keep it in exc_text
+    # instead, so the JSON-lines format can report it as its own field
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class QueueLogging(object):
+    """
+    Root logging through a queue: log calls only enqueue the record, and one
+    background thread formats it and writes it to `handlers`. Worker threads
+    never wait on disk or console I/O, however much they log.
+    """
+
+    def __init__(self, handlers: List[logging.Handler], level=logging.INFO, json_lines: bool = False):
+        formatter = make_formatter(json_lines)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        self._queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, *handlers, respect_handler_level=True)
+        self._handlers = handlers
+        self._stopped = False
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_QueueHandler(self._queue))
+        root.setLevel(level)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write out everything still queued and close the handlers."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._listener.stop()
+        for handler in self._handlers:
+            handler.close()
+
+
+def prune_logs(log_dir: Path, prefix: str, retention_days: float = LOG_RETENTION_DAYS,
+               max_files: int = MAX_LOG_FILES, keep: Optional[Path] = None):
+    """
+    Delete this app's log files (text or JSON lines, rotated or not) in `log_dir` that are older
+    than `retention_days`, or beyond the newest `max_files`. `keep` is never deleted.
+    """
+    cutoff = time.time() - retention_days * 24 * 3600
+    try:
+        candidates = list(log_dir.glob(f"{prefix}_*.log*")) + list(log_dir.glob(f"{prefix}_*.jsonl*"))
+        files = [(f.stat().st_mtime, f) for f in candidates if f.is_file() and f != keep]
+    except OSError as e:
+        logging.warning(f"Could not list old logs in {log_dir}: {e}")
+        return
+    files.sort(reverse=True)
+    removed = 0
+    for i, (mtime, f) in enumerate(files):
+        if mtime < cutoff or i >= max_files:
+            try:
+                f.unlink()
+                removed += 1
+            except OSError as e:
+                logging.warning(f"Could not delete old log {f}: {e}")
+    if removed:
+        logging.info(f"Deleted {removed} old log files from {log_dir}")
+
+
+class PrintToLogger(object):
+    """A stand-in for sys.stdout/sys.stderr that turns everything printed into log records."""
+
+    def __init__(self, level=logging.INFO):
+        self._level = level
+
+    def write(self, message):
+        if message.strip():
+            logging.log(self._level, message.strip())
+
+    def flush(self):
+        pass
+
+
+def setup_app_logging(log_dir: Path, app_name: str, level=logging.INFO, json_lines: bool = False,
+                      console: bool = True, capture_prints: bool = True) -> Path:
+    """
+    Logging for the desktop app: a new rotating log file per run in `log_dir` (and, with
+    `console`, the original stdout), written through QueueLogging. Old log files are pruned
+    in the background. With `capture_prints`, print() and stray stderr output are logged too.
+    Returns the path of this run's log file.
+    """
+    log_dir.mkdir(parents=True, exist_ok=True)
+    prefix = app_name.lower()
+    suffix = ".jsonl" if json_lines else ".log"
+    log_file = log_dir / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+
+    handlers: List[logging.Handler] = [RotatingLogFileHandler(log_file)]
+    if console and sys.__stdout__ is not None:
+        # The real stdout: sys.stdout itself is redirected into logging below
+        handlers.append(logging.StreamHandler(sys.__stdout__))
+    QueueLogging(handlers, level=level, json_lines=json_lines)
+
+    threading.Thread(target=prune_logs, args=(log_dir, prefix), kwargs={"keep": log_file},
+                     name="dp-prune-logs", daemon=True).start()
+
+    if capture_prints:
+        sys.stdout = PrintToLogger(logging.INFO)
+        sys.stderr = PrintToLogger(logging.ERROR)
+    return log_file
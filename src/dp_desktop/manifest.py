@@ -0,0 +1,111 @@
+import dataclasses
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_NAME = ".docupanda-manifest.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    pdf_size INTEGER NOT NULL,
+    pdf_sha256 TEXT NOT NULL,
+    standardization_id TEXT,
+    json_sha256 TEXT,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+@dataclasses.dataclass
+class ManifestEntry:
+    documentId: str
+    filename: str
+    pdfSize: int
+    pdfSha256: str
+    standardizationId: Optional[str] = None
+    jsonSha256: Optional[str] = None
+
+
+class DownloadManifest(object):
+    """
+    Local record of what a previous download wrote into an output directory.
+
+    Stored as SQLite next to the downloaded files (`MANIFEST_NAME`), keyed by
+    documentId. `download_dataset` consults it to skip documents whose PDF
+    and standardization JSON are already on disk. Safe to use from worker
+    threads; every write is committed immediately so an interrupted run keeps
+    everything finished so far.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.path = output_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def load(self) -> Dict[str, ManifestEntry]:
+        """All entries, keyed by documentId."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document_id, filename, pdf_size, pdf_sha256, standardization_id, json_sha256 "
+                "FROM documents"
+            ).fetchall()
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def record(self, entry: ManifestEntry):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(document_id, filename, pdf_size, pdf_sha256, standardization_id, json_sha256, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry.documentId, entry.filename, entry.pdfSize, entry.pdfSha256,
+                 entry.standardizationId, entry.jsonSha256, time.time())
+            )
+            self._conn.commit()
+
+    def is_current(self, entry: ManifestEntry, output_dir: Path, filename: str,
+                   standardization_id: Optional[str] = None) -> bool:
+        """
+        True if the files recorded in `entry` are still in `output_dir` under `filename`
+        and, when the newest `standardization_id` of the document is given, its JSON is that one.
+        """
+        if entry.filename != filename:
+            return False
+        if standardization_id is not None and entry.standardizationId != standardization_id:
+            return False
+        pdf_path = output_dir / f"{filename}.pdf"
+        try:
+            if pdf_path.stat().st_size != entry.pdfSize:
+                return False
+        except FileNotFoundError:
+            return False
+        if entry.jsonSha256 and not (output_dir / f"{filename}.json").exists():
+            return False
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_manifest(output_dir: Path) -> Optional[DownloadManifest]:
+    """Open the manifest in `output_dir`, or return None (sync disabled) if it cannot be used."""
+    try:
+        return DownloadManifest(output_dir)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not open download manifest in {output_dir}: {e}. Downloading everything.")
+        return None
@@ -0,0 +1,405 @@
+import json
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from dp_desktop.concurrency import host_class
+
+# Upper bounds of the latency histogram buckets, in seconds; one more bucket catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+SNAPSHOT_INTERVAL = 10  # Seconds between writes of a JSON snapshot sink
+
+# Every metric recorded by the app, with the help text shown by the Prometheus endpoint
+METRIC_HELP = {
+    "dp_http_request_seconds": "Latency of each HTTP attempt, by method, endpoint and status.",
+    "dp_http_in_flight": "HTTP requests currently being sent, by host class.",
+    "dp_http_retries_total": "HTTP attempts that failed and were retried, by endpoint and reason.",
+    "dp_stage_seconds": "Time a document spent in each stage of an upload or download.",
+    "dp_stage_in_flight": "Documents currently in each stage of an upload or download.",
+    "dp_bytes_total": "Bytes sent or received by uploads and downloads.",
+    "dp_items_total": "Files or documents finished by uploads and downloads, by outcome.",
+    "dp_transcode_saved_bytes_total": "Bytes not uploaded because images were optimized before upload.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+SeriesKey = Tuple[str, Labels]
+
+_ID_SEGMENT = re.compile(r"^(?!v\d+$)(?=.*\d)[\w.-]+$")  # Path segments with a digit, except versions like "v2"
+
+
+def endpoint_label(url: str) -> str:
+    """
+    A low-cardinality name for the endpoint of `url`: the API path with ids replaced
+    by {id}, e.g. "/document/{id}", or "storage" for presigned blob URLs.
+    """
+    if host_class(url) != "api":
+        return "storage"
+    segments = urlsplit(url).path.split("/")
+    return "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in segments) or "/"
+
+
+class Histogram(object):
+    """Counts of observations per LATENCY_BUCKETS bucket, plus their count and sum."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def copy(self) -> "Histogram":
+        other = Histogram(self.buckets)
+        other.counts, other.count, other.sum = list(self.counts), self.count, self.sum
+        return other
+
+    def minus(self, earlier: "Histogram") -> "Histogram":
+        """The observations made since `earlier`, a copy of this histogram taken before."""
+        delta = Histogram(self.buckets)
+        delta.counts = [now - then for now, then in zip(self.counts, earlier.counts)]
+        delta.count, delta.sum = self.count - earlier.count, self.sum - earlier.sum
+        return delta
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the q-quantile, interpolated within its bucket; None without observations."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # Slower than the last bucket; that bound is all we know
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.buckets[-1]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _number(value: float) -> str:
+    # Exact integers for counts and bytes, which "%g" would round
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _series(key: SeriesKey) -> Dict:
+    name, labels = key
+    return {"name": name, "labels": dict(labels)}
+
+
+class MetricsRegistry(object):
+    """
+    Process-wide counters, gauges and latency histograms.
+
+    A series is identified by a metric name and its labels, e.g.
+    inc("dp_items_total", operation="upload", outcome="done"). Recording is a
+    dict update under one lock, cheap enough for every request. Sinks read
+    the registry through `snapshot` and `prometheus_text`; `begin_run` gives a
+    view of only what was recorded since, for end-of-run summaries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[SeriesKey, float] = {}
+        self._gauges: Dict[SeriesKey, float] = {}
+        self._histograms: Dict[SeriesKey, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe how long the block took, whether or not it raised."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    @contextmanager
+    def tracking(self, name: str, **labels) -> Iterator[None]:
+        """Count the block in the gauge `name` while it runs."""
+        self.add_gauge(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.add_gauge(name, -1, **labels)
+
+    def _copy(self) -> Tuple[Dict[SeriesKey, float], Dict[SeriesKey, float], Dict[SeriesKey, Histogram]]:
+        with self._lock:
+            return (dict(self._counters), dict(self._gauges),
+                    {key: histogram.copy() for key, histogram in self._histograms.items()})
+
+    def snapshot(self) -> Dict:
+        """Every series as plain JSON-serializable data."""
+        counters, gauges, histograms = self._copy()
+        return {
+            "time": round(time.time(), 3),
+            "counters": [{**_series(key), "value": value} for key, value in sorted(counters.items())],
+            "gauges": [{**_series(key), "value": value} for key, value in sorted(gauges.items())],
+            "histograms": [
+                {**_series(key), "count": h.count, "sum": round(h.sum, 6),
+                 "buckets": {str(bound): n for bound, n in zip(h.buckets + ("+Inf",), h.counts)},
+                 "p50": h.quantile(0.5), "p95": h.quantile(0.95)}
+                for key, h in sorted(histograms.items())
+            ],
+        }
+
+    def prometheus_text(self) -> str:
+        """Every series in the Prometheus text exposition format."""
+        counters, gauges, histograms = self._copy()
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        def label_text(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, "counter")
+            lines.append(f"{name}{label_text(labels)} {_number(value)}")
+        for (name, labels), value in sorted(gauges.items()):
+            describe(name, "gauge")
+            lines.append(f"{name}{label_text(labels)} {_number(value)}")
+        for (name, labels), h in sorted(histograms.items()):
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{label_text(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {_number(h.sum)}")
+            lines.append(f"{name}_count{label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def begin_run(self) -> "RunMetrics":
+        """Start measuring one upload or download; see RunMetrics."""
+        counters, _, histograms = self._copy()
+        return RunMetrics(self, counters, histograms)
+
+
+class RunMetrics(object):
+    """What the registry recorded since `MetricsRegistry.begin_run`, for an end-of-run summary."""
+
+    def __init__(self, registry: MetricsRegistry, counters: Dict[SeriesKey, float],
+                 histograms: Dict[SeriesKey, Histogram]):
+        self._registry = registry
+        self._counters = counters
+        self._histograms = histograms
+
+    def _deltas(self) -> Tuple[Dict[SeriesKey, float], Dict[SeriesKey, Histogram]]:
+        counters, _, histograms = self._registry._copy()
+        counter_deltas = {key: value - self._counters.get(key, 0) for key, value in counters.items()}
+        histogram_deltas = {
+            key: h.minus(self._histograms[key]) if key in self._histograms else h
+            for key, h in histograms.items()
+        }
+        return ({key: value for key, value in counter_deltas.items() if value},
+                {key: h for key, h in histogram_deltas.items() if h.count})
+
+    def summary(self) -> Dict:
+        """Stage and endpoint latencies, bytes, items and retries of this run, as JSON-serializable data."""
+        counters, histograms = self._deltas()
+
+        def latency(name: str, separator: str, *label_names: str) -> Dict[str, Dict]:
+            result = {}
+            for (series, labels), h in sorted(histograms.items()):
+                if series == name:
+                    values = dict(labels)
+                    result[separator.join(values.get(n, "") for n in label_names)] = {
+                        "count": h.count,
+                        "total_seconds": round(h.sum, 3),
+                        "p50": round(h.quantile(0.5), 3),
+                        "p95": round(h.quantile(0.95), 3),
+                    }
+            return result
+
+        def totals(name: str, *label_names: str) -> Dict[str, float]:
+            result: Dict[str, float] = {}
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    values = dict(labels)
+                    label = "/".join(values.get(n, "") for n in label_names)
+                    result[label] = result.get(label, 0) + value
+            return result
+
+        return {
+            "stages": latency("dp_stage_seconds", "/", "operation", "stage"),
+            "endpoints": latency("dp_http_request_seconds", " ", "method", "endpoint"),
+            "bytes": totals("dp_bytes_total", "operation", "direction"),
+            "items": totals("dp_items_total", "operation", "outcome"),
+            "retries": totals("dp_http_retries_total", "endpoint", "reason"),
+        }
+
+    def summary_lines(self) -> List[str]:
+        """The summary as short human-readable lines, for the log."""
+        summary = self.summary()
+        lines = []
+        for title in ("stages", "endpoints"):
+            for name, stats in summary[title].items():
+                lines.append(f"{title[:-1]} {name}: n={stats['count']} p50={stats['p50']}s "
+                             f"p95={stats['p95']}s total={stats['total_seconds']}s")
+        for name, value in summary["bytes"].items():
+            lines.append(f"bytes {name}: {value / 1e6:.1f} MB")
+        for name, value in summary["items"].items():
+            lines.append(f"items {name}: {value:g}")
+        if summary["retries"]:
+            lines.append("retries: " + ", ".join(f"{name}={value:g}" for name, value in summary["retries"].items()))
+        return lines
+
+
+registry = MetricsRegistry()
+
+
+def inc(name: str, value: float = 1, **labels):
+    registry.inc(name, value, **labels)
+
+
+def add_gauge(name: str, delta: float, **labels):
+    registry.add_gauge(name, delta, **labels)
+
+
+def observe(name: str, seconds: float, **labels):
+    registry.observe(name, seconds, **labels)
+
+
+def timer(name: str, **labels):
+    return registry.timer(name, **labels)
+
+
+def tracking(name: str, **labels):
+    return registry.tracking(name, **labels)
+
+
+def begin_run() -> RunMetrics:
+    return registry.begin_run()
+
+
+class PeriodicSink(object):
+    """
+    Base for sinks that push a registry snapshot somewhere every `interval` seconds
+    and once more on close. Subclasses implement `publish(snapshot)`.
+    """
+
+    def __init__(self, interval: float = SNAPSHOT_INTERVAL, source: Optional[MetricsRegistry] = None):
+        self.interval = interval
+        self._registry = source or registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"dp-metrics-{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def publish(self, snapshot: Dict):
+        raise NotImplementedError
+
+    def _publish(self):
+        try:
+            self.publish(self._registry.snapshot())
+        except Exception as e:
+            logging.warning(f"Publishing metrics with {type(self).__name__} failed: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._publish()
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self._publish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonSnapshotSink(PeriodicSink):
+    """Replace `path` with a JSON snapshot of every metric every `interval` seconds."""
+
+    def __init__(self, path: Path, interval: float = SNAPSHOT_INTERVAL, source: Optional[MetricsRegistry] = None):
+        self.path = path
+        super().__init__(interval, source)
+
+    def publish(self, snapshot: Dict):
+        from dp_desktop.blob import atomic_output
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(self.path, 'w') as f:
+            json.dump(snapshot, f, indent=1)
+
+
+class PrometheusExporter(object):
+    """Serve every metric at http://host:port/metrics in the Prometheus text format, from a daemon thread."""
+
+    def __init__(self, port: int, host: str = "127.0.0.1", source: Optional[MetricsRegistry] = None):
+        metrics_source = source or registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_source.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_port}/metrics"
+        threading.Thread(target=self._server.serve_forever, name="dp-metrics-http", daemon=True).start()
+        logging.info(f"Serving Prometheus metrics at {self.url}")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
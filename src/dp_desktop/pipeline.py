@@ -0,0 +1,119 @@
+import dataclasses
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+@dataclasses.dataclass
+class Stage:
+    """
+    One step of a Pipeline.
+
+    `func` receives an item and returns the item to hand to the next stage
+    (or to the pipeline's `on_output` after the last stage). Returning None
+    drops the item. `workers` threads run `func`, fed from a queue holding at
+    most `queue_size` items, so a slow stage pushes back on the ones before it.
+    """
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 100
+
+
+class Pipeline(object):
+    """
+    Chain of thread-backed stages connected by bounded queues.
+
+    Usage:
+        pipeline = Pipeline([Stage("read", read), Stage("post", post, workers=20)],
+                            on_output=..., on_error=...)
+        for item in items:
+            pipeline.put(item)  # blocks while the first stage is full
+        pipeline.close()        # drains every stage in order
+
+    `on_error(item, exc)` is called for any item whose stage raised; the item
+    does not continue down the pipeline. Both callbacks run on stage threads.
+    """
+
+    def __init__(
+            self,
+            stages: List[Stage],
+            on_output: Optional[Callable[[Any], None]] = None,
+            on_error: Optional[Callable[[Any, Exception], None]] = None,
+            log: Optional[logging.Logger] = None
+    ):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage.")
+        self._stages = stages
+        self._on_output = on_output
+        self._on_error = on_error
+        self._log = log if log else logging.getLogger(__name__)
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._threads: List[List[threading.Thread]] = []
+        self._closed = False
+
+        for index, stage in enumerate(stages):
+            threads = [
+                threading.Thread(target=self._work, args=(index,), name=f"dp-{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            ]
+            for t in threads:
+                t.start()
+            self._threads.append(threads)
+
+    def put(self, item: Any):
+        """Feed an item to the first stage, blocking while its queue is full."""
+        if self._closed:
+            raise RuntimeError("Pipeline is closed.")
+        self._queues[0].put(item)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Items waiting in front of each stage, keyed by stage name."""
+        return {stage.name: q.qsize() for stage, q in zip(self._stages, self._queues)}
+
+    def close(self):
+        """Wait until every item has passed through all stages, then stop the worker threads."""
+        self._closed = True
+        for index, stage in enumerate(self._stages):
+            for _ in range(stage.workers):
+                self._queues[index].put(_STOP)
+            for t in self._threads[index]:
+                t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _work(self, index: int):
+        stage = self._stages[index]
+        is_last = index == len(self._stages) - 1
+        while True:
+            item = self._queues[index].get()
+            if item is _STOP:
+                return
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                self._report_error(item, e)
+                continue
+            if result is None:
+                continue
+            if not is_last:
+                self._queues[index + 1].put(result)
+                continue
+            if self._on_output:
+                try:
+                    self._on_output(result)
+                except Exception as e:
+                    self._report_error(result, e)
+
+    def _report_error(self, item: Any, exc: Exception):
+        if self._on_error:
+            self._on_error(item, exc)
+        else:
+            self._log.error(f"Pipeline item {item!r} failed: {exc}")
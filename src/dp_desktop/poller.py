@@ -0,0 +1,204 @@
+import dataclasses
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import requests
+
+from dp_desktop.config import API_URL
+from dp_desktop.utils import request_with_retries
+
+MIN_POLL_INTERVAL = 5  # Seconds before the first status check, and the shortest gap between checks
+MAX_POLL_INTERVAL = 60  # Longest gap between two checks of the same id
+POLL_BACKOFF_RATIO = 0.1  # Gap between checks as a fraction of how long the id has been pending
+DEFAULT_POLL_TIMEOUT = 900  # Total seconds an id may stay pending before its future fails
+REQUEST_TIMEOUT = 10  # Seconds each status GET can wait before timing out
+
+
+@dataclasses.dataclass
+class _Pending:
+    kind: str
+    item_id: str
+    url: str
+    future: Future
+    is_done: Callable[[Optional[requests.Response]], bool]
+    started_at: float
+
+
+def _document_done(response: Optional[requests.Response]) -> bool:
+    if response is None:
+        raise RuntimeError("Document not found.")
+    status = response.json().get('status')
+    if status == 'completed':
+        return True
+    if status == 'failed':
+        raise RuntimeError("Document failed during processing.")
+    return False
+
+
+def _standardization_done(response: Optional[requests.Response]) -> bool:
+    # A standardization that is still being produced is reported as 404
+    return response is not None
+
+
+class StatusPoller(object):
+    """
+    Single scheduler that polls every pending documentId and standardizationId.
+
+    Callers register ids with `watch_document` / `watch_standardization` and get
+    back a Future that resolves with the final status payload (or fails on
+    error/timeout). One scheduler thread keeps all ids in a heap ordered by
+    their next due time and hands due checks to a small pool of poll workers,
+    so upload threads never block in sleep loops.
+
+    The gap between checks grows with how long an id has been pending
+    (`POLL_BACKOFF_RATIO` of its age, clamped to [min_interval, max_interval]):
+    fresh uploads are checked often, stragglers are not hammered.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            poll_workers: int = 4,
+            min_interval: float = MIN_POLL_INTERVAL,
+            max_interval: float = MAX_POLL_INTERVAL,
+            timeout: float = DEFAULT_POLL_TIMEOUT,
+            log: Optional[logging.Logger] = None
+    ):
+        self._headers = {
+            "accept": "application/json",
+            "X-API-Key": api_key
+        }
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._timeout = timeout
+        self._log = log if log else logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._pending_count = 0
+        self._closed = False
+
+        self._workers = ThreadPoolExecutor(max_workers=poll_workers, thread_name_prefix="dp-poll")
+        self._thread = threading.Thread(target=self._run, name="dp-poller", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    #  Public API
+    # ------------------------------------------------------------------
+    def watch_document(self, document_id: str) -> Future:
+        """Resolve once the document reaches status 'completed'; fail if it reaches 'failed'."""
+        url = f"{API_URL}/document/{document_id}"
+        return self._watch("document", document_id, url, _document_done)
+
+    def watch_standardization(self, std_id: str) -> Future:
+        """Resolve once the standardization can be fetched."""
+        url = f"{API_URL}/standardization/{std_id}"
+        return self._watch("standardization", std_id, url, _standardization_done)
+
+    def pending(self) -> int:
+        """Number of ids that have been registered and not resolved yet."""
+        with self._cond:
+            return self._pending_count
+
+    def close(self):
+        """Stop the scheduler; futures of ids that are still pending fail with RuntimeError."""
+        with self._cond:
+            self._closed = True
+            leftovers = [entry[2] for entry in self._heap]
+            self._heap.clear()
+            self._cond.notify_all()
+        for item in leftovers:
+            self._resolve(item, exc=RuntimeError(f"Poller closed before {item.kind} {item.item_id} completed."))
+        self._thread.join()
+        self._workers.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ------------------------------------------------------------------
+    #  Scheduling
+    # ------------------------------------------------------------------
+    def _watch(self, kind: str, item_id: str, url: str, is_done) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        item = _Pending(kind=kind, item_id=item_id, url=url, future=future, is_done=is_done,
+                        started_at=time.monotonic())
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("StatusPoller is closed.")
+            self._pending_count += 1
+            self._schedule(item, time.monotonic() + self._min_interval)
+        return future
+
+    def _schedule(self, item: _Pending, due: float):
+        # Caller must hold self._cond
+        heapq.heappush(self._heap, (due, next(self._seq), item))
+        self._cond.notify()
+
+    def _next_interval(self, item: _Pending) -> float:
+        age = time.monotonic() - item.started_at
+        return min(self._max_interval, max(self._min_interval, age * POLL_BACKOFF_RATIO))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                due_items = []
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due_items.append(heapq.heappop(self._heap)[2])
+            for item in due_items:
+                self._workers.submit(self._check, item)
+
+    def _check(self, item: _Pending):
+        try:
+            if time.monotonic() - item.started_at > self._timeout:
+                raise RuntimeError(f"Timeout after {self._timeout}s: {item.kind} {item.item_id} never completed.")
+            try:
+                response = request_with_retries(
+                    "GET",
+                    item.url,
+                    headers=self._headers,
+                    request_timeout=REQUEST_TIMEOUT,
+                    log=self._log
+                )
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                response = None
+            done = item.is_done(response)
+        except Exception as e:
+            self._resolve(item, exc=e)
+            return
+
+        if done:
+            self._log.info(f"[POLL DONE] {item.kind} {item.item_id}")
+            self._resolve(item, result=response.json())
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._schedule(item, time.monotonic() + self._next_interval(item))
+                return
+        self._resolve(item, exc=RuntimeError(f"Poller closed before {item.kind} {item.item_id} completed."))
+
+    def _resolve(self, item: _Pending, result=None, exc: Optional[BaseException] = None):
+        with self._cond:
+            self._pending_count -= 1
+        if exc is not None:
+            item.future.set_exception(exc)
+        else:
+            item.future.set_result(result)
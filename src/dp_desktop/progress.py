@@ -0,0 +1,111 @@
+import dataclasses
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+FLUSH_INTERVAL = 0.1  # Seconds between renders (10 Hz)
+MAX_ERRORS = 200  # Most recent error messages kept; older ones are only counted
+
+
+@dataclasses.dataclass
+class ProgressSnapshot:
+    completed: int
+    total: int
+    error_count: int  # All errors so far, including ones no longer kept
+    new_errors: List[str]  # Errors since the previous render, at most MAX_ERRORS
+    note: str = ""
+
+
+class ProgressAggregator(object):
+    """
+    Coalesces progress and error events from worker threads into periodic renders.
+
+    `progress`, `error` and `note` only update counters under a lock, so they
+    are cheap to call from any thread for every file. A background thread calls
+    `render(snapshot)` at most every `interval` seconds, and only if something
+    changed, so the UI is updated at a fixed rate no matter how many files
+    complete. Errors are kept in a bounded ring buffer; each render gets just the
+    errors that are new since the last one, together with the total count.
+    `render` is only ever called from one thread at a time.
+    """
+
+    def __init__(
+            self,
+            render: Callable[[ProgressSnapshot], None],
+            interval: float = FLUSH_INTERVAL,
+            max_errors: int = MAX_ERRORS
+    ):
+        self._render = render
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._total = 0
+        self._error_count = 0
+        self._recent_errors: Deque[str] = deque(maxlen=max_errors)
+        self._new_errors: Deque[str] = deque(maxlen=max_errors)
+        self._note = ""
+        self._dirty = False
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress-flush", daemon=True)
+        self._thread.start()
+
+    def progress(self, completed: int, total: int):
+        with self._lock:
+            self._completed = completed
+            self._total = total
+            self._dirty = True
+
+    def error(self, message: str):
+        with self._lock:
+            self._error_count += 1
+            self._recent_errors.append(message)
+            self._new_errors.append(message)
+            self._dirty = True
+
+    def note(self, text: str):
+        """Replace the free-text note shown with the progress, e.g. a dedup summary."""
+        with self._lock:
+            self._note = text
+            self._dirty = True
+
+    def recent_errors(self) -> List[str]:
+        with self._lock:
+            return list(self._recent_errors)
+
+    @property
+    def error_count(self) -> int:
+        return self._error_count
+
+    def _take_snapshot(self) -> Optional[ProgressSnapshot]:
+        with self._lock:
+            if not self._dirty:
+                return None
+            self._dirty = False
+            new_errors = list(self._new_errors)
+            self._new_errors.clear()
+            return ProgressSnapshot(self._completed, self._total, self._error_count, new_errors, self._note)
+
+    def flush(self):
+        snapshot = self._take_snapshot()
+        if snapshot is not None:
+            self._render(snapshot)
+
+    def _run(self):
+        while not self._closed.wait(self._interval):
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Rendering progress failed")
+
+    def close(self):
+        """Stop the background thread and render whatever is still pending."""
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
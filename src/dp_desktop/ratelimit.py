@@ -0,0 +1,153 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from dp_desktop.concurrency import host_class
+
+# Requests per second and burst size per endpoint class of the DocuPanda API
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "listing": (20.0, 40),  # /documents, /standardizations, /schemas, /dataset-names
+    "upload": (50.0, 100),  # POST /document and standardization batches
+    "poll": (100.0, 200),  # GET /document/{id} and /standardization/{id}
+    "download_url": (100.0, 200),  # GET /document/{id}/download/ocr-url
+}
+MAX_RETRY_AFTER = 300  # Upper bound in seconds on a pause requested by the server
+WAKEUP_JITTER = 0.2  # Extra random fraction added to waits, so waiting threads don't wake in lockstep
+
+
+class TokenBucket(object):
+    """
+    Blocking token bucket: `rate` requests per second with bursts of up to `burst`.
+
+    `pause` stops handing out tokens until a deadline and empties the bucket,
+    so once the pause ends callers resume at `rate` instead of all at once.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._updated:
+                    self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    # Paused: _updated is the moment tokens start refilling again
+                    wait = self._updated - now
+            time.sleep(wait * (1 + random.uniform(0, WAKEUP_JITTER)))
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = max(self._updated, time.monotonic() + seconds)
+
+
+_buckets: Dict[str, TokenBucket] = {name: TokenBucket(*limits) for name, limits in RATE_LIMITS.items()}
+_buckets_lock = threading.Lock()
+
+
+def configure_rate_limits(limits: Dict[str, Tuple[float, int]]):
+    """Replace the (rate, burst) of the given endpoint classes, e.g. {"upload": (5, 10)}."""
+    with _buckets_lock:
+        for name, (rate, burst) in limits.items():
+            if name not in _buckets:
+                raise ValueError(f"Unknown endpoint class '{name}', expected one of {sorted(_buckets)}")
+            _buckets[name] = TokenBucket(rate, burst)
+
+
+def parse_rate_limits(text: str) -> Dict[str, Tuple[float, int]]:
+    """
+    Parse "CLASS=RATE[:BURST],..." (see $DOCUPANDA_RATE_LIMITS) into limits for configure_rate_limits.
+    Without a burst, a class may burst to two seconds' worth of requests, like the defaults.
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, sep, value = item.partition("=")
+        name = name.strip()
+        if not sep or name not in RATE_LIMITS:
+            raise ValueError(f"Expected CLASS=RATE[:BURST] with CLASS one of {sorted(RATE_LIMITS)}, got '{item}'")
+        rate_text, _, burst_text = value.partition(":")
+        try:
+            rate = float(rate_text)
+            burst = int(burst_text) if burst_text else max(1, int(rate * 2))
+        except ValueError:
+            raise ValueError(f"Invalid rate or burst in '{item}'") from None
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Rate and burst must be positive in '{item}'")
+        limits[name] = (rate, burst)
+    return limits
+
+
+def endpoint_class(method: str, url: str) -> Optional[str]:
+    """The rate-limited endpoint class of a request, or None for requests that are not rate limited."""
+    parts = urlsplit(url)
+    if host_class(url) != "api":
+        return None  # Presigned storage URLs
+    path = parts.path.rstrip("/")
+    if method.upper() == "POST":
+        return "upload"
+    if path.endswith("/download/ocr-url"):
+        return "download_url"
+    if path.startswith("/document/") or path.startswith("/standardization/"):
+        return "poll"
+    return "listing"
+
+
+def wait_for_slot(method: str, url: str):
+    """Block until the endpoint class of this request may send another request."""
+    name = endpoint_class(method, url)
+    if name is not None:
+        _buckets[name].acquire()
+
+
+def parse_retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds to wait according to the Retry-After header (delta-seconds or HTTP date), if any."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def pause_all(url: str, seconds: float):
+    """
+    Honor a Retry-After from the API: pause every endpoint class, not just the one
+    that was throttled, since the server's limit usually covers the whole account.
+    """
+    if host_class(url) != "api" or seconds <= 0:
+        return
+    logging.warning(f"[RATE LIMIT] Server asked to retry after {seconds:.1f}s; pausing all API requests")
+    for bucket in list(_buckets.values()):
+        bucket.pause(seconds)
+
+
+def backoff_delay(attempt: int, backoff_factor: float, max_backoff: float) -> float:
+    """
+    Exponential backoff with "equal jitter": half the delay is fixed, half is random,
+    so threads that failed together do not retry together.
+    """
+    delay = min(backoff_factor * (2 ** (attempt - 1)), max_backoff)
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,112 @@
+import dataclasses
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Set, Tuple
+
+from dp_desktop.const import Params
+
+
+@dataclasses.dataclass
+class ScannedFile:
+    path: Path
+    size: int
+    mtime: float
+
+
+def is_supported(path: Path) -> bool:
+    """True if DocuPanda accepts this file type (see Params.allowed_suffix)."""
+    return path.suffix.lower() in Params.allowed_suffix
+
+
+def walk_files(
+        folder_path: Path,
+        recursive: bool = True,
+        follow_symlinks: bool = False,
+        on_error: Optional[Callable[[Path, OSError], None]] = None
+) -> Iterator[ScannedFile]:
+    """
+    Yield every regular file under `folder_path` with its size and mtime, as it is found.
+
+    Built on os.scandir, so each directory is read once and file metadata
+    mostly comes from the directory listing itself. Only the directories
+    still to visit are held in memory, never the list of files, so this
+    scales to network shares with millions of files and the caller can
+    start working on the first file immediately.
+
+    Symlinks are skipped unless `follow_symlinks` is set; when following,
+    each directory is visited once, so symlink loops cannot recurse forever.
+    Unreadable directories and files are reported to `on_error` (or logged)
+    and skipped.
+    """
+    def report(path: Path, error: OSError):
+        if on_error:
+            on_error(path, error)
+        else:
+            logging.warning(f"Skipping {path} while scanning: {error}")
+
+    visited: Set[Tuple[int, int]] = set()
+    pending = [folder_path]
+    while pending:
+        directory = pending.pop()
+        if follow_symlinks:
+            try:
+                stat = directory.stat()
+            except OSError as e:
+                report(directory, e)
+                continue
+            if (stat.st_dev, stat.st_ino) in visited:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_symlink() and not follow_symlinks:
+                            continue
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            if recursive:
+                                subdirectories.append(Path(entry.path))
+                        elif entry.is_file(follow_symlinks=follow_symlinks):
+                            stat = entry.stat(follow_symlinks=follow_symlinks)
+                            yield ScannedFile(path=Path(entry.path), size=stat.st_size, mtime=stat.st_mtime)
+                    except OSError as e:
+                        report(Path(entry.path), e)
+        except OSError as e:
+            report(directory, e)
+            continue
+        # Visit subdirectories in name order, depth first
+        pending.extend(sorted(subdirectories, reverse=True))
+
+
+def scan_files(folder_path: Path, recursive: bool = True, follow_symlinks: bool = False) -> Iterator[ScannedFile]:
+    """`walk_files`, limited to the file types DocuPanda accepts."""
+    for scanned in walk_files(folder_path, recursive=recursive, follow_symlinks=follow_symlinks):
+        if is_supported(scanned.path):
+            yield scanned
+
+
+def count_files(
+        folder_path: Path,
+        recursive: bool = True,
+        follow_symlinks: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+        progress_every: int = 1000,
+        should_stop: Optional[Callable[[], bool]] = None
+) -> Tuple[int, int]:
+    """
+    Count (all files, supported files) the way `scan_files` sees them, so the numbers shown
+    before an upload match what is uploaded. `progress(all, supported)` is called every
+    `progress_every` files; `should_stop` lets a caller abandon a long scan.
+    """
+    total = supported = 0
+    for scanned in walk_files(folder_path, recursive=recursive, follow_symlinks=follow_symlinks):
+        total += 1
+        supported += is_supported(scanned.path)
+        if progress and total % progress_every == 0:
+            progress(total, supported)
+        if should_stop and should_stop():
+            break
+    return total, supported
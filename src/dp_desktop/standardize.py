@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from dp_desktop.config import STANDARDIZE_URL
+from dp_desktop.utils import request_with_retries
+
+MAX_BATCH_SIZE = 100  # documentIds per POST /v2/standardize/batch
+MAX_BATCH_WAIT = 2.0  # Seconds the oldest queued documentId may wait before a partial batch is sent
+REQUEST_TIMEOUT = 30  # Seconds each batch POST can wait before timing out
+
+
+class StandardizationBatcher(object):
+    """
+    Collects documents that finished processing and standardizes them in batches.
+
+    `submit(document_id)` returns a Future that resolves with the document's
+    standardizationId. A background thread flushes the queued ids to
+    `POST /v2/standardize/batch` whenever `max_batch_size` ids are waiting or
+    the oldest one has waited `max_wait` seconds, and maps the returned
+    `standardizationIds` back onto the submitted ids by position.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            schema_id: str,
+            max_batch_size: int = MAX_BATCH_SIZE,
+            max_wait: float = MAX_BATCH_WAIT,
+            log: Optional[logging.Logger] = None
+    ):
+        self._headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "X-API-Key": api_key
+        }
+        self._schema_id = schema_id
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._log = log if log else logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[str, Future]] = []
+        self._oldest_at: Optional[float] = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="dp-standardize", daemon=True)
+        self._thread.start()
+
+    def submit(self, document_id: str) -> Future:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("StandardizationBatcher is closed.")
+            if not self._queue:
+                self._oldest_at = time.monotonic()
+            self._queue.append((document_id, future))
+            # Wake the flusher to start the time window of a new batch, or to send a full one
+            if len(self._queue) == 1 or len(self._queue) >= self._max_batch_size:
+                self._cond.notify()
+        return future
+
+    def pending(self) -> int:
+        """Number of documentIds waiting for the next batch."""
+        with self._cond:
+            return len(self._queue)
+
+    def close(self):
+        """Flush whatever is still queued and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if len(self._queue) >= self._max_batch_size:
+                        break
+                    if self._queue and (self._closed or time.monotonic() - self._oldest_at >= self._max_wait):
+                        break
+                    if self._closed:
+                        return
+                    timeout = self._oldest_at + self._max_wait - time.monotonic() if self._queue else None
+                    self._cond.wait(timeout)
+                batch = self._queue[:self._max_batch_size]
+                del self._queue[:self._max_batch_size]
+                self._oldest_at = time.monotonic() if self._queue else None
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[str, Future]]):
+        document_ids = [document_id for document_id, _ in batch]
+        self._log.info(f"[STANDARDIZE BATCH] {len(document_ids)} docs, schema={self._schema_id}")
+        try:
+            std_resp = request_with_retries(
+                "POST",
+                f"{STANDARDIZE_URL}/v2/standardize/batch",
+                json={
+                    "documentIds": document_ids,
+                    "schemaId": self._schema_id
+                },
+                headers=self._headers,
+                request_timeout=REQUEST_TIMEOUT,
+                log=self._log
+            )
+            standardization_ids = std_resp.json().get('standardizationIds', [])
+            if len(standardization_ids) != len(document_ids):
+                raise RuntimeError(
+                    f"Expected {len(document_ids)} standardizationIds, got {len(standardization_ids)}."
+                )
+        except Exception as e:
+            self._log.error(f"[STANDARDIZE BATCH FAIL] {len(document_ids)} docs: {e}", exc_info=True)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), std_id in zip(batch, standardization_ids):
+            future.set_result(std_id)
@@ -0,0 +1,256 @@
+"""
+Optional client-side image optimization before upload.
+
+Scanners tend to produce uncompressed TIFFs and PNGs at 300-600 DPI, which
+are uploaded as base64 and so cost a third more again on the wire.
+ImageTranscoder recompresses such images, downscaled to a target DPI, in a
+process pool (Pillow's encoders hold the GIL) and hands back a smaller copy
+to upload in their place. The copy keeps its format, so the uploaded file
+name stays the original one and still matches its contents:
+
+- TIFF (also multi-page): every page is kept; bilevel pages are compressed
+  with CCITT Group 4, all others with JPEG.
+- JPEG and WebP: re-encoded at the configured quality.
+- PNG: re-encoded losslessly with optimization (the saving comes from
+  downscaling).
+
+The original is uploaded whenever the copy would not be meaningfully
+smaller, or the image cannot be read. Requires the optional `Pillow`
+dependency (`pip install "DocuPanda[images]"`).
+"""
+import dataclasses
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps, ImageSequence
+except ImportError:  # Optional dependency, only needed for image optimization
+    Image = ImageOps = ImageSequence = None
+
+from dp_desktop import metrics
+from dp_desktop.logs import log_fields
+
+TRANSCODE_SUFFIXES = {".tif", ".tiff", ".png", ".jpg", ".jpeg", ".webp"}
+MIN_TRANSCODE_BYTES = 256 * 1024  # Smaller images are uploaded as they are; there is little to save
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Transcoding processes; leaves a core for the upload
+MAX_PAGE_INCHES = 14  # Images without a DPI tag are scaled down to this many inches (legal paper) at the target DPI
+BILEVEL_THRESHOLD = 128  # Gray level below which a downscaled black-and-white page is black
+
+
+@dataclasses.dataclass
+class TranscodeSettings:
+    dpi: int = 200  # Images scanned at a higher resolution are downscaled to this
+    quality: int = 80  # JPEG/WebP quality, 1-95
+    min_savings: float = 0.1  # A copy less than this fraction smaller is discarded and the original uploaded
+
+
+@dataclasses.dataclass
+class TranscodeStats:
+    files_transcoded: int = 0  # Uploaded as a smaller copy
+    files_kept: int = 0  # Considered, but uploaded as they are
+    bytes_before: int = 0  # Original size of the transcoded files
+    bytes_after: int = 0  # Size of their copies
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def is_available() -> bool:
+    """Whether Pillow is installed, so images can be transcoded at all."""
+    return Image is not None
+
+
+def _scale_factor(image, dpi: int) -> float:
+    source_dpi = image.info.get("dpi")
+    if source_dpi and source_dpi[0] and source_dpi[1]:
+        return min(1.0, dpi / max(float(source_dpi[0]), float(source_dpi[1])))
+    return min(1.0, dpi * MAX_PAGE_INCHES / max(image.size))
+
+
+def _downscale(image, dpi: int):
+    factor = _scale_factor(image, dpi)
+    if factor >= 1.0:
+        return image
+    size = (max(1, round(image.width * factor)), max(1, round(image.height * factor)))
+    if image.mode == "1":
+        # Resampled in grayscale, so thin strokes survive better than with nearest-neighbour
+        gray = image.convert("L").resize(size, Image.LANCZOS)
+        return gray.point(lambda v: 255 if v >= BILEVEL_THRESHOLD else 0, mode="1")
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image.resize(size, Image.LANCZOS)
+
+
+def _opaque(image):
+    # JPEG has no alpha channel or palette: flatten onto white
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _check_mode(image):
+    # 16-bit and float images would lose their range in an 8-bit encoder
+    if image.mode in ("I", "F") or image.mode.startswith("I;"):
+        raise ValueError(f"unsupported image mode {image.mode}")
+
+
+def _dpi_option(resized: bool, dpi: int, source_dpi) -> dict:
+    # A downscaled image is tagged with its new resolution; otherwise the original tag is kept
+    if resized:
+        return {"dpi": (dpi, dpi)}
+    return {"dpi": source_dpi} if source_dpi else {}
+
+
+def transcode_image(source: str, output: str, dpi: int, quality: int) -> int:
+    """
+    Write a recompressed copy of the image `source` to `output`, in the same format and
+    downscaled to at most `dpi`, and return its size in bytes. Runs in a worker process,
+    so it only takes and returns picklable values. Raises if the image cannot be read.
+    """
+    with Image.open(source) as image:
+        image_format = image.format
+        source_dpi = image.info.get("dpi")
+        if image_format == "TIFF":
+            pages, resized = [], False
+            for page in ImageSequence.Iterator(image):
+                _check_mode(page)
+                scaled = _downscale(page.copy(), dpi)
+                resized = resized or scaled.size != page.size
+                pages.append(scaled)
+            options = _dpi_option(resized, dpi, source_dpi)
+            if all(page.mode == "1" for page in pages):
+                options["compression"] = "group4"
+            else:
+                pages = [_opaque(page) for page in pages]
+                options.update(compression="jpeg", quality=quality)
+            pages[0].save(output, format="TIFF", save_all=True, append_images=pages[1:], **options)
+            return os.path.getsize(output)
+
+        _check_mode(image)
+        oriented = ImageOps.exif_transpose(image)
+        page = _downscale(oriented, dpi)
+        options = _dpi_option(page.size != oriented.size, dpi, source_dpi)
+        if image_format == "JPEG":
+            _opaque(page).save(output, format="JPEG", quality=quality, optimize=True, **options)
+        elif image_format == "WEBP":
+            page.save(output, format="WEBP", quality=quality, method=4, **options)
+        elif image_format == "PNG":
+            page.save(output, format="PNG", optimize=True, **options)
+        else:
+            raise ValueError(f"unsupported image format {image_format}")
+    return os.path.getsize(output)
+
+
+class ImageTranscoder(object):
+    """
+    Makes smaller copies of large images for upload, in a pool of `workers` processes.
+
+    Usage:
+        with ImageTranscoder(TranscodeSettings(dpi=150)) as transcoder:
+            copy = transcoder.transcode(file_path)  # None: upload the original
+            ...upload copy or file_path...
+            transcoder.discard(copy)
+
+    Copies live in a private temporary folder that is deleted on close().
+    transcode() blocks its calling thread, so call it from as many threads as there are workers.
+    """
+
+    def __init__(self, settings: TranscodeSettings, workers: int = DEFAULT_WORKERS,
+                 log: Optional[logging.Logger] = None):
+        if not is_available():
+            raise RuntimeError("Image optimization needs Pillow: pip install Pillow")
+        self.settings = settings
+        self._workers = workers
+        self._log = log if log else logging.getLogger(__name__)
+        self._dir = Path(tempfile.mkdtemp(prefix="dp-transcode-"))
+        self._names = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = TranscodeStats()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: forking a process full of upload threads can deadlock the child
+        return ProcessPoolExecutor(max_workers=self._workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def wants(self, file_path: Path, size: int) -> bool:
+        """Whether `file_path` is an image worth transcoding."""
+        return file_path.suffix.lower() in TRANSCODE_SUFFIXES and size >= MIN_TRANSCODE_BYTES
+
+    def transcode(self, file_path: Path) -> Optional[Path]:
+        """
+        Path of a smaller copy of `file_path` to upload instead, or None to upload the
+        original (not an image worth transcoding, no real saving, or unreadable).
+        """
+        size = file_path.stat().st_size
+        if not self.wants(file_path, size):
+            return None
+        output = self._dir / f"{next(self._names)}{file_path.suffix.lower()}"
+        pool = self._pool
+        try:
+            new_size = pool.submit(transcode_image, str(file_path), str(output),
+                                   self.settings.dpi, self.settings.quality).result()
+        except BrokenProcessPool as e:
+            # A worker died, e.g. out of memory on a huge scan; start a fresh pool for the next files
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = self._new_pool()
+            return self._keep(file_path, output, f"transcoding process failed: {e}")
+        except Exception as e:
+            return self._keep(file_path, output, str(e))
+
+        if new_size > size * (1 - self.settings.min_savings):
+            return self._keep(file_path, output, f"copy not smaller ({new_size} of {size} bytes)")
+        with self._lock:
+            self._stats.files_transcoded += 1
+            self._stats.bytes_before += size
+            self._stats.bytes_after += new_size
+        metrics.inc("dp_transcode_saved_bytes_total", size - new_size)
+        self._log.info(f"[TRANSCODE] {file_path.name}: {size} -> {new_size} bytes", **log_fields(file_path))
+        return output
+
+    def _keep(self, file_path: Path, output: Path, reason: str) -> None:
+        self.discard(output)
+        with self._lock:
+            self._stats.files_kept += 1
+        self._log.info(f"[TRANSCODE SKIP] {file_path.name}: {reason}; uploading the original.",
+                       **log_fields(file_path))
+        return None
+
+    def discard(self, copy: Optional[Path]):
+        """Delete a copy made by transcode() once it is no longer needed."""
+        if copy is None:
+            return
+        try:
+            copy.unlink()
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> TranscodeStats:
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
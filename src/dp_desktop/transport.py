@@ -0,0 +1,75 @@
+import logging
+import threading
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 20
+
+_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+_sessions: Dict[str, requests.Session] = {}
+_retired: List[requests.Session] = []  # Replaced by configure_transport; closed by close_sessions
+
+
+def configure_transport(max_workers: int):
+    """
+    Size the per-host connection pools to the number of worker threads.
+
+    Pools are only ever grown, so concurrent uploads and downloads in the same
+    process never shrink each other's pools. Sessions created earlier with a
+    smaller pool are replaced for new requests but left open, so transfers
+    still running on them (e.g. another upload's threads) drain normally and
+    keep reusing their connections; they are closed by close_sessions().
+    """
+    global _pool_size
+    with _lock:
+        if max_workers <= _pool_size:
+            return
+        logging.info(f"Growing HTTP connection pools from {_pool_size} to {max_workers}")
+        _pool_size = max_workers
+        _retired.extend(_sessions.values())
+        _sessions.clear()
+
+
+def _new_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    # Retries are handled by request_with_retries, so the adapter never retries on its own.
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Return the shared keep-alive session for the host of `url`.
+
+    Every host (the DocuPanda API, each presigned storage endpoint) gets its own
+    session and connection pool, so slow blob transfers never starve API calls
+    of connections. Sessions are created lazily and are safe to share across
+    worker threads: connection checkout is handled by urllib3's thread-safe pool.
+    """
+    parts = urlsplit(url)
+    host_key = f"{parts.scheme}://{parts.netloc}".lower()
+    session = _sessions.get(host_key)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(host_key)
+        if session is None:
+            session = _new_session(_pool_size)
+            _sessions[host_key] = session
+        return session
+
+
+def close_sessions():
+    """Close every pooled session, including replaced ones, e.g. before the process exits."""
+    with _lock:
+        sessions = list(_sessions.values()) + _retired
+        _sessions.clear()
+        _retired.clear()
+    for session in sessions:
+        session.close()
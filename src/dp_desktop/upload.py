@@ -1,17 +1,81 @@
-import base64
+import dataclasses
 import logging
+import os
+import queue
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Callable, Optional
-
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from dp_desktop import metrics
+from dp_desktop.breaker import ServiceDegradedError
+from dp_desktop.config import API_URL
+from dp_desktop.dedup import DedupStats, DuplicateTracker, HashCache, hash_file
+from dp_desktop.encoding import Base64JsonBody, BufferBudget, encode_body, prefetch_file
+from dp_desktop.journal import (STATUS_DONE, STATUS_FAILED, STATUS_PROCESSED, STATUS_STANDARDIZING,
+                                STATUS_UPLOADED, JournalEntry, UploadJournal, journal_path_for)
+from dp_desktop.logs import log_fields
+from dp_desktop.pipeline import Pipeline, Stage
+from dp_desktop.poller import StatusPoller
+from dp_desktop.scan import scan_files
+from dp_desktop.standardize import StandardizationBatcher
+from dp_desktop.transcode import (DEFAULT_WORKERS as DEFAULT_TRANSCODE_WORKERS, ImageTranscoder, TranscodeSettings,
+                                  TranscodeStats, is_available)
+from dp_desktop.transport import configure_transport
 from dp_desktop.utils import request_with_retries
 
 # Constants for timeouts
 POST_REQUEST_TIMEOUT = 100  # Seconds each POST/GET can wait before timing out
 REQUEST_TIMEOUT = 10  # Seconds each POST/GET can wait before timing out
 POLL_TIMEOUT = 900  # Total seconds to wait for a doc to finish uploading/processing
-POLL_INTERVAL = 5  # Seconds between status checks
+POLL_INTERVAL = 5  # Minimum seconds between status checks of the same doc
+STAGE_QUEUE_SIZE = 100  # Files that may wait in front of each pipeline stage
+STATS_INTERVAL = 5  # Seconds between stage queue depth reports
+ENCODED_BUFFER_BYTES = 64 * 1024 * 1024  # Request bodies encoded by the read stage and waiting for a POST slot
+MAX_ENCODED_FILE = 8 * 1024 * 1024  # Larger files are read and encoded while they are sent instead
+
+
+@dataclasses.dataclass
+class _UploadTask:
+    file_path: Path
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+    body: Union[Base64JsonBody, bytes, None] = None
+    buffered: int = 0  # Bytes of body held in the encoded buffer budget until it is sent
+    upload_path: Optional[Path] = None  # Optimized copy uploaded instead of file_path, see dp_desktop.transcode
+    document_id: Optional[str] = None
+    standardization_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    is_dedup_primary: bool = False
+    phase_started: Optional[float] = None  # When the current server-side phase began, for metrics
+
+
+def _instrumented(stage: str, fn: Callable[[_UploadTask], Optional[_UploadTask]]):
+    # Time every call of a pipeline stage function and count the calls in flight
+    def run(task: _UploadTask) -> Optional[_UploadTask]:
+        with metrics.tracking("dp_stage_in_flight", operation="upload", stage=stage), \
+                metrics.timer("dp_stage_seconds", operation="upload", stage=stage):
+            return fn(task)
+    return run
+
+
+def _begin_phase(task: _UploadTask, stage: str):
+    # Server-side phases (processing, standardization) end in a callback, so they are timed by hand
+    task.phase_started = time.monotonic()
+    metrics.add_gauge("dp_stage_in_flight", 1, operation="upload", stage=stage)
+
+
+def _end_phase(task: _UploadTask, stage: str):
+    metrics.add_gauge("dp_stage_in_flight", -1, operation="upload", stage=stage)
+    metrics.observe("dp_stage_seconds", time.monotonic() - task.phase_started, operation="upload", stage=stage)
+
+
+def _file_error(error: Exception, msg: str) -> Exception:
+    # Outages stay ServiceDegradedError, so the file is counted as degraded rather than failed
+    if isinstance(error, ServiceDegradedError):
+        return ServiceDegradedError(msg)
+    return RuntimeError(msg)
 
 
 def upload_files(
@@ -21,82 +85,92 @@ def upload_files(
         schema_id: Optional[str] = None,
         progress_callback: Optional[Callable[[int, int], None]] = None,
         error_callback: Optional[Callable[[Path, str], None]] = None,
-        max_workers: int = 20
+        max_workers: int = 64,
+        read_workers: int = 4,
+        max_pending: int = 10000,
+        stats_callback: Optional[Callable[[Dict[str, int]], None]] = None,
+        journal_dir: Optional[Path] = None,
+        deduplicate: bool = True,
+        hash_workers: int = 4,
+        hash_cache_path: Optional[Path] = None,
+        dedup_callback: Optional[Callable[[DedupStats], None]] = None,
+        recursive: bool = True,
+        follow_symlinks: bool = False,
+        transcode: Optional[TranscodeSettings] = None,
+        transcode_workers: int = DEFAULT_TRANSCODE_WORKERS,
+        transcode_callback: Optional[Callable[[TranscodeStats], None]] = None
 ):
     """
     Production-grade uploader for large-scale doc ingestion and (optional) standardization.
 
     Features:
-    - Parallel uploads with ThreadPoolExecutor.
+    - Staged pipeline (read -> POST -> poll -> standardize) with bounded queues between stages:
+      `read_workers` threads read and base64-encode files (into a bounded buffer; very large files
+      are streamed during their POST instead), up to `max_workers` threads POST them, and at most
+      `max_pending` docs wait on server-side processing at once.
+    - How many of those requests actually run at once is decided by the shared adaptive
+      concurrency limiter for the API host, which grows while the server keeps up and
+      backs off on 429/503 or rising latency.
     - Each HTTP request has a hard 10-second timeout to prevent indefinite waiting.
-    - Polling each doc's status is capped at 900 seconds total.
-    - Standardization (if schema_id is provided) also has a 900-second cap.
+    - Status polling for all docs is done by one shared StatusPoller, capped at 900 seconds per doc.
+    - Standardization (if schema_id is provided) is requested in batches and also has a 900-second cap.
     - Detailed logging at each step; every failure is logged at ERROR level.
-    - progress_callback(files_completed, total_files) is called after each successful file.
-    - error_callback(file_path, error_message) is called on each failure if provided.
+    - Supported files under folder_path (and, with recursive=True, its subfolders) are streamed from
+      dp_desktop.scan.scan_files into the pipeline while the folder is still being scanned.
+    - progress_callback(files_completed, files_found) is called after each successful file; files_found
+      grows until the scan is complete.
+    - error_callback(file_path, error_message) is called on each failure if provided, including
+      files that failed because of a service outage (also reported through dp_desktop.breaker listeners).
+    - stats_callback({stage_name: queue_depth}) is called every few seconds to show which stage is the bottleneck.
+    - With deduplicate=True, files are hashed (BLAKE2b, `hash_workers` threads) before upload. Identical
+      files in the folder are uploaded once and share the outcome; with hash_cache_path, files already
+      uploaded to this dataset (and standardized with schema_id, if given) by an earlier run are skipped,
+      and ones uploaded without that schema are only standardized. dedup_callback(DedupStats) reports the savings.
+    - With transcode settings (and Pillow installed), large images are recompressed and downscaled in
+      `transcode_workers` processes before upload and sent under their original name; see dp_desktop.transcode.
+      transcode_callback(TranscodeStats) reports the bytes saved.
+    - With journal_dir, every file's progress is journaled there; uploading the same folder to the same
+      dataset again resumes where the last run stopped instead of re-uploading finished files.
+    - Time spent in each stage (hash, transcode, read, post, server processing, standardization), bytes sent and
+      outcomes are recorded in dp_desktop.metrics and summarized in the log when the upload ends.
     """
 
-    # For demonstration only – replace with your actual file-discovery logic
-    def get_files(path: Path):
-        all_files = list(path.glob("*"))
-        # Example: we’ll just filter by extension here
-        allowed_extensions = {'.pdf', '.jpg', '.jpeg', '.png', '.txt', '.tiff', '.tif', '.webp'}
-        allowed_files = [f for f in all_files if f.suffix.lower() in allowed_extensions]
-        return all_files, allowed_files
-
     log = logging.getLogger(__name__)
-
-    # 1) Discover valid files
-    log.info(f"Scanning folder: {folder_path}")
-
-    allowed_set = {'.pdf', '.jpg', '.jpeg', '.png', '.txt', '.tiff', '.tif', '.webp'}
-
-    all_files, allowed_files = get_files(folder_path)
-    total_files = len(allowed_files)
-
-    log.info(f"Found {len(all_files)} total files; {len(allowed_files)} valid files "
-             f"(allowed extensions: {allowed_set}).")
-
-    if len(allowed_files) == 0:
-        log.info("No valid files to process; returning early.")
-        return
-
-    # Let the user/UI know we're at 0 of total_files
-    if progress_callback:
-        progress_callback(0, total_files)
-
-    # 2) Internal function for single-file upload + poll + (optional) standardize
-    def _upload_and_standardize_file(file_path: Path):
-        """Upload a single file, poll for completion, optionally standardize, with robust timeouts."""
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "X-API-Key": api_key
-        }
-
-        # --- (A) Upload step ---
+    run_metrics = metrics.begin_run()
+
+    # 1) Files are discovered as the upload runs (see dp_desktop.scan), so the first uploads start
+    #    right away and the total reported to progress_callback grows until the scan finishes.
+    log.info(f"Scanning folder: {folder_path} (recursive={recursive}, follow_symlinks={follow_symlinks})")
+
+    journal = None
+    journaled: Dict[str, JournalEntry] = {}
+    if journal_dir:
+        journal = UploadJournal(journal_path_for(journal_dir, folder_path, dataset_name, schema_id),
+                                folder_path, dataset_name, schema_id)
+        journaled = journal.load()
+        if journaled:
+            log.info(f"Resuming from upload journal {journal.path} ({len(journaled)} files recorded).")
+
+    # 2) Internal functions for the read and upload steps. Waiting on server-side processing is
+    #    delegated to a single StatusPoller, so upload threads return as soon as a POST succeeds.
+    headers = {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "X-API-Key": api_key
+    }
+
+    def _upload_file(file_path: Path, payload: Union[Base64JsonBody, bytes]) -> str:
+        """Upload a single file and return its documentId."""
         try:
-            log.info(f"[UPLOAD START] {file_path.name}")
-
-            with open(file_path, 'rb') as f:
-                file_contents = base64.b64encode(f.read()).decode()
-
-            upload_url = "https://app.docupanda.io/document"
-            payload = {
-                "dataset": dataset_name,
-                "document": {
-                    "file": {
-                        "contents": file_contents,
-                        "filename": file_path.name
-                    }
-                }
-            }
+            log.info(f"[UPLOAD START] {file_path.name}", **log_fields(file_path))
+
+            upload_url = f"{API_URL}/document"
 
             # Use our retry wrapper for POST
             response = request_with_retries(
                 "POST",
                 upload_url,
-                json=payload,
+                data=payload,
                 headers=headers,
                 request_timeout=POST_REQUEST_TIMEOUT,
                 log=log
@@ -105,127 +179,404 @@ def upload_files(
             if not document_id:
                 raise RuntimeError(f"No documentId returned for {file_path.name}")
 
-            log.info(f"[UPLOAD SUCCESS] {file_path.name}, docId={document_id}")
+            log.info(f"[UPLOAD SUCCESS] {file_path.name}, docId={document_id}", **log_fields(file_path, document_id))
+            return document_id
+
+        except ServiceDegradedError as e:
+            # Kept as it is, so the file counts as degraded instead of failed
+            log.error(f"[UPLOAD FAIL] {file_path.name}: {str(e)}", **log_fields(file_path))
+            raise
 
         except Exception as e:
             msg = f"[UPLOAD FAIL] {file_path.name}: {str(e)}"
-            log.error(msg, exc_info=True)
+            log.error(msg, exc_info=True, **log_fields(file_path))
             raise RuntimeError(msg) from e
 
-        # --- (B) Poll for doc to reach "completed" within 900 seconds ---
+    encoded_buffer = BufferBudget(ENCODED_BUFFER_BYTES)
+
+    def _read_file(task: _UploadTask) -> _UploadTask:
+        """
+        Stat the file and read and base64-encode its request body ahead of its POST slot, so
+        POST workers only send. Bodies wait in a buffer of ENCODED_BUFFER_BYTES (this stage
+        blocks while it is full); files over MAX_ENCODED_FILE are streamed from disk by the POST instead.
+        """
+        stat = task.file_path.stat()
+        task.size, task.mtime = stat.st_size, stat.st_mtime
+        source = task.upload_path or task.file_path
+        body = Base64JsonBody(source, dataset_name, filename=task.file_path.name)
+        if os.stat(source).st_size > MAX_ENCODED_FILE:
+            prefetch_file(source)
+            task.body = body
+            return task
+        n_bytes = len(body)
+        encoded_buffer.reserve(n_bytes)
         try:
-            doc_get_url = f"https://app.docupanda.io/document/{document_id}"
-            start_time = time.time()
-
-            for attempt_i in range(100):
-                if (time.time() - start_time) > POLL_TIMEOUT:
-                    raise RuntimeError(f"Timeout after {POLL_TIMEOUT}s: doc {document_id} never completed.")
-
-                time.sleep(POLL_INTERVAL)
-
-                # Use our retry wrapper for GET
-                get_resp = request_with_retries(
-                    "GET",
-                    doc_get_url,
-                    headers=headers,
-                    request_timeout=REQUEST_TIMEOUT,
-                    log=log
-                )
-                status = get_resp.json().get('status')
-
-                if status == 'completed':
-                    log.info(f"[DOC COMPLETED] {file_path.name}, docId={document_id}")
-                    break
-                elif status == 'failed':
-                    raise RuntimeError(f"Doc {document_id} failed during processing.")
-
-        except Exception as e:
-            msg = f"[DOC POLL FAIL] {file_path.name}: {str(e)}"
-            log.error(msg, exc_info=True)
-            raise RuntimeError(msg) from e
-
-        # --- (C) Optionally standardize if schema_id was provided ---
-        if schema_id:
+            task.body = encode_body(body)
+        except BaseException:
+            encoded_buffer.release(n_bytes)
+            raise
+        task.buffered = n_bytes
+        return task
+
+    def _post_file(task: _UploadTask) -> _UploadTask:
+        try:
+            task.document_id = _upload_file(task.file_path, task.body)
+            metrics.inc("dp_bytes_total", len(task.body), operation="upload", direction="sent")
+        finally:
+            task.body = None
+            if task.buffered:
+                encoded_buffer.release(task.buffered)
+                task.buffered = 0
+            discard_copy(task)
+        journal_record(task, STATUS_UPLOADED)
+        return task
+
+    def discard_copy(task: _UploadTask):
+        """Delete the optimized copy of a file once it is posted or has failed before that."""
+        if transcoder and task.upload_path is not None:
+            transcoder.discard(task.upload_path)
+            task.upload_path = None
+
+    def journal_record(task: _UploadTask, status: str, error: Optional[str] = None):
+        if journal and task.size is not None:
+            journal.record(task.file_path, status, task.size, task.mtime,
+                           document_id=task.document_id, standardization_id=task.standardization_id, error=error)
+
+    # 3) Run all files through the staged pipeline: read -> POST -> poll -> (standardize).
+    #    Each stage has its own concurrency and a bounded queue in front of it; the poll
+    #    and standardize stages are bounded by `max_pending` docs in server-side processing.
+    log.info(f"Beginning parallel processing. "
+             f"read_workers={read_workers}, max_workers={max_workers}, max_pending={max_pending}")
+    poll_workers = max(1, max_workers // 2)
+    configure_transport(max_workers + poll_workers)
+
+    outcomes: "queue.Queue[Tuple[Path, Optional[Exception]]]" = queue.Queue()
+    pending_slots = threading.BoundedSemaphore(max_pending)
+
+    with StatusPoller(api_key, poll_workers=poll_workers, timeout=POLL_TIMEOUT,
+                      min_interval=POLL_INTERVAL, log=log) as poller, \
+            ExitStack() as stack:
+        # Completed docs are standardized in batches of up to 100 ids per request
+        batcher = stack.enter_context(StandardizationBatcher(api_key, schema_id, log=log)) if schema_id else None
+
+        hash_cache = stack.enter_context(HashCache(hash_cache_path)) if (deduplicate and hash_cache_path) else None
+        transcoder = None
+        if transcode and is_available():
+            transcoder = stack.enter_context(ImageTranscoder(transcode, workers=transcode_workers, log=log))
+        elif transcode:
+            log.warning("Image optimization needs Pillow (pip install Pillow); uploading images as they are.")
+        duplicates = DuplicateTracker()
+        dedup_stats = DedupStats()
+        dedup_lock = threading.Lock()
+
+        def finish(task: _UploadTask, error: Optional[Exception]):
+            journal_record(task, STATUS_DONE if error is None else STATUS_FAILED,
+                           error=str(error) if error is not None else None)
+            outcomes.put((task.file_path, error))
+            if not task.is_dedup_primary:
+                return
+            if error is None and hash_cache:
+                hash_cache.put(dataset_name, task.content_hash, task.document_id, schema_id)
+            for follower in duplicates.resolve(task.content_hash, task.document_id if error is None else None):
+                follower.document_id = task.document_id
+                finish(follower, None if error is None else _file_error(
+                    error, f"Duplicate of {task.file_path.name}, which failed: {error}"
+                ))
+
+        def _hash_file(task: _UploadTask) -> Optional[_UploadTask]:
+            """Hash the file and drop it from the pipeline if identical content is already handled."""
+            stat = task.file_path.stat()
+            task.size, task.mtime = stat.st_size, stat.st_mtime
+            task.content_hash = hash_file(task.file_path)
+
+            document_id = hash_cache.get(dataset_name, task.content_hash, schema_id) if hash_cache else None
+            uploaded_before = document_id is not None
+            is_primary = False
+            if not uploaded_before:
+                is_primary, document_id = duplicates.claim(task.content_hash, task)
+            # Uploaded before, but not standardized with this schema: only the standardization is left to do
+            unstandardized_id = hash_cache.get(dataset_name, task.content_hash) if (
+                is_primary and schema_id and hash_cache) else None
+
+            with dedup_lock:
+                dedup_stats.files_hashed += 1
+                dedup_stats.bytes_hashed += task.size
+                if not is_primary or unstandardized_id:
+                    if uploaded_before or unstandardized_id:
+                        dedup_stats.duplicates_uploaded += 1
+                    else:
+                        dedup_stats.duplicates_in_folder += 1
+                    dedup_stats.bytes_skipped += task.size
+
+            if unstandardized_id:
+                log.info(f"[DUPLICATE] {task.file_path.name} is identical to docId={unstandardized_id}, "
+                         f"which is not standardized with this schema yet; standardizing it instead of uploading.",
+                         **log_fields(task.file_path, unstandardized_id))
+                task.is_dedup_primary = True
+                task.document_id = unstandardized_id
+                pending_slots.acquire()
+                journal_record(task, STATUS_PROCESSED)
+                request_standardization(task)
+                return None
+            if is_primary:
+                task.is_dedup_primary = True
+                return task
+            if document_id:
+                log.info(f"[DUPLICATE] {task.file_path.name} is identical to docId={document_id}; not uploading.",
+                         **log_fields(task.file_path, document_id))
+                task.document_id = document_id
+                finish(task, None)
+            else:
+                # Attached to the identical file being uploaded; finished together with it
+                log.info(f"[DUPLICATE] {task.file_path.name} is identical to a file being uploaded; not uploading.",
+                         **log_fields(task.file_path))
+            return None
+
+        def failed_in_pipeline(task: _UploadTask, error: Exception):
+            # E.g. reading failed after transcoding: the copy would otherwise stay until the run ends
+            discard_copy(task)
+            finish(task, error)
+
+        def finish_pending(task: _UploadTask, error: Optional[Exception]):
+            pending_slots.release()
+            finish(task, error)
+
+        def on_uploaded(task: _UploadTask):
+            # Blocks the POST workers while max_pending docs are still processing server-side
+            pending_slots.acquire()
+            watch_processing(task)
+
+        def watch_processing(task: _UploadTask):
+            _begin_phase(task, "processing")
             try:
-                log.info(f"[STANDARDIZE START] {file_path.name}, docId={document_id}, schema={schema_id}")
-
-                std_url = "https://app.docupipe.ai/v2/standardize/batch"
-                std_payload = {
-                    "documentIds": [document_id],
-                    "schemaId": schema_id
-                }
-                std_resp = request_with_retries(
-                    "POST",
-                    std_url,
-                    json=std_payload,
-                    headers=headers,
-                    request_timeout=REQUEST_TIMEOUT,
-                    log=log
-                )
-                standardization_ids = std_resp.json().get('standardizationIds', [])
-                if not standardization_ids:
-                    raise RuntimeError(f"No standardizationId returned for doc {document_id}.")
-                std_id = standardization_ids[0]
-
-                # (D) Poll for standardization to be "completed" within 900 seconds
-                std_get_url = f"https://app.docupanda.io/standardization/{std_id}"
-                start_time = time.time()
-
-                for attempt_i in range(100):
-                    if (time.time() - start_time) > POLL_TIMEOUT:
-                        raise RuntimeError(
-                            f"Timeout after {POLL_TIMEOUT}s: standardization {std_id} never completed."
-                        )
-
-                    time.sleep(POLL_INTERVAL)
-                    # Use our retry wrapper for GET
-                    std_get_resp = request_with_retries(
-                        "GET",
-                        std_get_url,
-                        headers=headers,
-                        request_timeout=REQUEST_TIMEOUT,
-                        log=log
-                    )
-                    # If the resource doesn't exist yet, keep polling
-                    if std_get_resp.status_code == 404:
-                        continue
-
-                    # Break on any other success code
-                    std_get_resp.raise_for_status()
-                    log.info(f"[STANDARDIZE COMPLETE] docId={document_id}, stdId={std_id}")
-                    break
-
+                future = poller.watch_document(task.document_id)
             except Exception as e:
-                msg = f"[STANDARDIZE FAIL] {file_path.name}, docId={document_id}: {str(e)}"
-                log.error(msg, exc_info=True)
-                raise RuntimeError(msg) from e
-
-        return True  # Return success to the caller
-
-    # 3) Run all files in parallel
-    log.info(f"Beginning parallel processing of {total_files} files. max_workers={max_workers}")
-
-    files_completed = 0
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {
-            executor.submit(_upload_and_standardize_file, f): f for f in allowed_files
-        }
-
-        for future in as_completed(future_to_file):
-            file_path = future_to_file[future]
+                # E.g. the poller is shutting down: the doc gives its pending slot back like any failure
+                _end_phase(task, "processing")
+                finish_pending(task, e)
+                return
+            future.add_done_callback(lambda f: on_document_done(task, f))
+
+        def on_document_done(task: _UploadTask, future):
+            file_path, document_id = task.file_path, task.document_id
+            _end_phase(task, "processing")
             try:
-                future.result()  # Raises if any error occurred
-                files_completed += 1
+                future.result()
+            except Exception as e:
+                msg = f"[DOC POLL FAIL] {file_path.name}: {str(e)}"
+                log.error(msg, **log_fields(file_path, document_id))
+                finish_pending(task, _file_error(e, msg))
+                return
+            log.info(f"[DOC COMPLETED] {file_path.name}, docId={document_id}", **log_fields(file_path, document_id))
+            if not schema_id:
+                finish_pending(task, None)
+                return
+            journal_record(task, STATUS_PROCESSED)
+            request_standardization(task)
+
+        def request_standardization(task: _UploadTask):
+            log.info(f"[STANDARDIZE START] {task.file_path.name}, docId={task.document_id}, schema={schema_id}",
+                     **log_fields(task.file_path, task.document_id))
+            _begin_phase(task, "standardization")
+            try:
+                future = batcher.submit(task.document_id)
+            except Exception as e:
+                _end_phase(task, "standardization")
+                finish_pending(task, e)
+                return
+            future.add_done_callback(lambda f: on_standardize_requested(task, f))
 
-                log.info(f"[FILE DONE] {file_path.name} ({files_completed}/{total_files})")
-                if progress_callback:
-                    progress_callback(files_completed, total_files)
+        def on_standardize_requested(task: _UploadTask, future):
+            try:
+                task.standardization_id = future.result()
+            except Exception as e:
+                msg = f"[STANDARDIZE FAIL] {task.file_path.name}, docId={task.document_id}: {str(e)}"
+                _end_phase(task, "standardization")
+                finish_pending(task, _file_error(e, msg))
+                return
+            journal_record(task, STATUS_STANDARDIZING)
+            watch_standardization(task)
+
+        def watch_standardization(task: _UploadTask):
+            try:
+                future = poller.watch_standardization(task.standardization_id)
+            except Exception as e:
+                _end_phase(task, "standardization")
+                finish_pending(task, e)
+                return
+            future.add_done_callback(lambda f: on_standardization_done(task, f))
 
+        def on_standardization_done(task: _UploadTask, future):
+            _end_phase(task, "standardization")
+            try:
+                future.result()
+            except Exception as e:
+                msg = f"[STANDARDIZE FAIL] {task.file_path.name}, docId={task.document_id}: {str(e)}"
+                log.error(msg, **log_fields(task.file_path, task.document_id))
+                finish_pending(task, _file_error(e, msg))
+                return
+            log.info(f"[STANDARDIZE COMPLETE] docId={task.document_id}, stdId={task.standardization_id}",
+                     **log_fields(task.file_path, task.document_id, standardizationId=task.standardization_id))
+            finish_pending(task, None)
+
+        def resume(task: _UploadTask, entry: JournalEntry):
+            """Pick a file up at the state the journal recorded for it."""
+            task.document_id, task.standardization_id = entry.documentId, entry.standardizationId
+            log.info(f"[RESUME] {task.file_path.name}, status={entry.status}, docId={task.document_id}",
+                     **log_fields(task.file_path, task.document_id))
+            pending_slots.acquire()
+            if entry.status == STATUS_UPLOADED:
+                watch_processing(task)
+            elif entry.status == STATUS_PROCESSED:
+                request_standardization(task)
+            else:
+                _begin_phase(task, "standardization")
+                watch_standardization(task)
+
+        def _transcode_file(task: _UploadTask) -> _UploadTask:
+            task.upload_path = transcoder.transcode(task.file_path)
+            return task
+
+        stages = [Stage("hash", _instrumented("hash", _hash_file), workers=hash_workers,
+                        queue_size=STAGE_QUEUE_SIZE)] if deduplicate else []
+        if transcoder:
+            stages.append(Stage("transcode", _instrumented("transcode", _transcode_file),
+                                workers=transcode_workers, queue_size=STAGE_QUEUE_SIZE))
+        pipeline = Pipeline(
+            stages + [
+                Stage("read", _instrumented("read", _read_file), workers=read_workers, queue_size=STAGE_QUEUE_SIZE),
+                Stage("post", _instrumented("post", _post_file), workers=max_workers, queue_size=STAGE_QUEUE_SIZE),
+            ],
+            on_output=on_uploaded,
+            on_error=failed_in_pipeline,
+            log=log
+        )
+
+        files_found = [0]  # mutable reference for closure
+        scan_done = threading.Event()
+
+        def feed():
+            try:
+                for scanned in scan_files(folder_path, recursive=recursive, follow_symlinks=follow_symlinks):
+                    f = scanned.path
+                    files_found[0] += 1
+                    task = _UploadTask(file_path=f)
+                    entry = journaled.get(str(f))
+                    if entry is None or entry.status == STATUS_FAILED:
+                        pipeline.put(task)
+                        continue
+                    if (scanned.size, scanned.mtime) != (entry.size, entry.mtime):
+                        # Changed since it was journaled: upload the new contents
+                        pipeline.put(task)
+                        continue
+                    task.size, task.mtime = entry.size, entry.mtime
+                    if entry.status == STATUS_DONE:
+                        outcomes.put((f, None))
+                    elif entry.status == STATUS_PROCESSED and not schema_id:
+                        finish(task, None)
+                    else:
+                        resume(task, entry)
             except Exception as e:
-                # Already logged, but let UI know if possible
-                if error_callback:
-                    error_callback(file_path, str(e))
+                log.error(f"Scanning {folder_path} failed: {e}", exc_info=True)
+            finally:
+                log.info(f"Scan finished: {files_found[0]} supported files found.")
+                scan_done.set()
+                pipeline.close()
+                outcomes.put((None, None))  # wakes the loop below so it can see the scan is done
+
+        feeder = threading.Thread(target=feed, name="dp-upload-feed", daemon=True)
+        feeder.start()
+
+        def stage_depths() -> Dict[str, int]:
+            depths = pipeline.queue_depths()
+            depths["poll"] = poller.pending()
+            depths["standardize"] = batcher.pending() if batcher else 0
+            return depths
+
+        reported_dedup = [DedupStats()]
+
+        def report_dedup():
+            with dedup_lock:
+                current = dataclasses.replace(dedup_stats)
+            if current == reported_dedup[0]:
+                return
+            reported_dedup[0] = current
+            log.info(f"[DEDUP] {current}")
+            if dedup_callback:
+                dedup_callback(current)
+
+        reported_transcode = [TranscodeStats()]
+
+        def report_transcode():
+            if not transcoder:
+                return
+            current = transcoder.stats()
+            if current == reported_transcode[0]:
+                return
+            reported_transcode[0] = current
+            log.info(f"[TRANSCODE] {current}, bytes_saved={current.bytes_saved}")
+            if transcode_callback:
+                transcode_callback(current)
+
+        files_completed = 0
+        files_done = 0
+        files_degraded = 0
+        last_stats_at = time.monotonic()
+        reported_found = 0
+        while not (scan_done.is_set() and files_done >= files_found[0]):
+            try:
+                file_path, error = outcomes.get(timeout=STATS_INTERVAL)
+            except queue.Empty:
+                file_path, error = None, None
+            if file_path is not None:
+                files_done += 1
+                outcome = "done" if error is None else (
+                    "degraded" if isinstance(error, ServiceDegradedError) else "failed")
+                metrics.inc("dp_items_total", operation="upload", outcome=outcome)
+                if error is None:
+                    files_completed += 1
+
+                    log.info(f"[FILE DONE] {file_path.name} ({files_completed}/{files_found[0]})",
+                             **log_fields(file_path))
+                    if progress_callback:
+                        reported_found = files_found[0]
+                        progress_callback(files_completed, reported_found)
                 else:
-                    log.error(f"[FILE ERROR] {file_path.name}: {e}")
-
-    log.info(f"All tasks completed. Processed={files_completed}, Skipped={total_files - files_completed}.")
+                    if isinstance(error, ServiceDegradedError):
+                        files_degraded += 1
+                    # Already logged, but let UI know if possible
+                    if error_callback:
+                        error_callback(file_path, str(error))
+                    else:
+                        log.error(f"[FILE ERROR] {file_path.name}: {error}", **log_fields(file_path))
+
+            if progress_callback and files_found[0] != reported_found:
+                # Keep the total moving while the scan is still finding files
+                reported_found = files_found[0]
+                progress_callback(files_completed, reported_found)
+
+            if time.monotonic() - last_stats_at >= STATS_INTERVAL:
+                last_stats_at = time.monotonic()
+                depths = stage_depths()
+                log.info(f"[STAGE DEPTHS] {depths}")
+                if stats_callback:
+                    stats_callback(depths)
+                report_dedup()
+                report_transcode()
+
+        feeder.join()
+        report_dedup()
+        report_transcode()
+        if files_degraded:
+            log.error(f"{files_degraded} files failed because the service was unavailable; "
+                      f"upload the folder again to retry them.")
+
+    if journal:
+        journal.mark_finished()
+        journal.close()
+    if files_found[0] == 0:
+        log.info("No valid files to process.")
+        return
+    log.info(f"All tasks completed. Processed={files_completed}, Skipped={files_found[0] - files_completed}.")
+    for line in run_metrics.summary_lines():
+        log.info(f"[METRICS] {line}")
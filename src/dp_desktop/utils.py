@@ -4,13 +4,42 @@ from typing import Optional
 
 import requests
 
-from dp_desktop.const import Params
+from dp_desktop.breaker import FAILURE_STATUSES, ServiceDegradedError, breaker_for
+from dp_desktop import metrics
+from dp_desktop.concurrency import AdaptiveLimiter, host_class, limiter_for
+from dp_desktop.ratelimit import backoff_delay, parse_retry_after, pause_all, wait_for_slot
+from dp_desktop.transport import get_session
 
 
-def get_files(folder_path):
-    all_files = list(folder_path.rglob('*.*'))
-    files = [f for f in all_files if f.suffix.lower() in Params.allowed_suffix]
-    return all_files, files
+def _send(method: str, url: str, limiter: AdaptiveLimiter, take_slot: bool, request_timeout: int, **kwargs):
+    # One attempt: wait out an open circuit breaker and the rate limit, then send while
+    # holding a concurrency slot, reporting the outcome to the limiter, the breaker and metrics
+    breaker = breaker_for(url)
+    probe = breaker.before_request()
+    failed = True
+    try:
+        wait_for_slot(method, url)
+        if take_slot:
+            limiter.acquire()
+        started = time.monotonic()
+        status = "error"
+        try:
+            with metrics.tracking("dp_http_in_flight", host=host_class(url)):
+                response = get_session(url).request(method, url, **kwargs, timeout=request_timeout)
+            status = response.status_code
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            limiter.observe(method, time.monotonic() - started, error=True)
+            raise
+        finally:
+            if take_slot:
+                limiter.release()
+            metrics.observe("dp_http_request_seconds", time.monotonic() - started,
+                            method=method, endpoint=metrics.endpoint_label(url), status=status)
+        limiter.observe(method, time.monotonic() - started, status_code=response.status_code)
+        failed = response.status_code in FAILURE_STATUSES
+        return response
+    finally:
+        breaker.record(failed, probe=probe)
 
 
 def request_with_retries(
@@ -22,32 +51,57 @@ def request_with_retries(
         request_timeout: int = 40,
         statuses_to_retry: Optional[set] = None,
         log: Optional[logging.Logger] = None,
+        held_limiter: Optional[AdaptiveLimiter] = None,
         **kwargs
 ):
+    """
+    Send a request through the shared session for its host, retrying failures.
+
+    Responses with a status in `statuses_to_retry` (by default 408, 429, 500,
+    502, 503 and 504), connection errors and timeouts are retried. Any other
+    error status (e.g. 400 or 404) raises requests.HTTPError at once, without
+    retrying.
+
+    Every attempt runs inside a slot of the adaptive concurrency limiter for
+    the host class (see dp_desktop.concurrency). A caller that already holds a
+    slot for the whole transfer, e.g. while streaming a body, passes it as
+    `held_limiter` so outcomes are reported to it without taking a second slot.
+
+    API requests also wait for a token of their endpoint class (see
+    dp_desktop.ratelimit). Retries back off exponentially with jitter, and a
+    Retry-After header on a throttled response pauses all API callers.
+
+    Failures feed a process-wide circuit breaker (see dp_desktop.breaker):
+    while the service is down, attempts wait for it to recover instead of
+    each thread retrying on its own, and retries draw from a shared budget.
+
+    Each attempt's latency, status and retry reason are recorded in dp_desktop.metrics.
+    """
     if statuses_to_retry is None:
         statuses_to_retry = {408, 429, 500, 502, 503, 504}
 
     logger = log if log else logging.getLogger(__name__)
 
     attempt = 0
-    total_sleep_time = 0
-    circuit_breaker_limit = max_backoff * 2
 
     while attempt < max_retries:
         attempt += 1
+        if attempt > 1 and not breaker_for(url).allow_retry():
+            logger.error(f"Shared retry budget exhausted; not retrying {method} {url}.")
+            raise ServiceDegradedError(f"Too many failing requests; gave up on {method} {url}")
         try:
-            response = requests.request(method, url, **kwargs, timeout=request_timeout)
+            response = _send(method, url, held_limiter or limiter_for(url), held_limiter is None,
+                             request_timeout, **kwargs)
             if response.status_code in statuses_to_retry:
                 logger.warning(f"Request {method} {url} attempt={attempt} failed with "
                                f"status={response.status_code}. Will retry...")
+                metrics.inc("dp_http_retries_total", method=method, endpoint=metrics.endpoint_label(url),
+                            reason=response.status_code)
+                retry_after = parse_retry_after(response)
+                if retry_after:
+                    pause_all(url, retry_after)
                 if attempt < max_retries:
-                    sleep_time = min(backoff_factor * (2 ** (attempt - 1)), max_backoff)
-                    if total_sleep_time + sleep_time > circuit_breaker_limit:
-                        logger.error(f"Circuit breaker triggered: total sleep time {total_sleep_time + sleep_time} "
-                                     f"would exceed limit of {circuit_breaker_limit} seconds.")
-                        response.raise_for_status()
-                    time.sleep(sleep_time)
-                    total_sleep_time += sleep_time
+                    time.sleep(backoff_delay(attempt, backoff_factor, max_backoff))
                 else:
                     logger.error(f"Exhausted retries for {method} {url}. Failing permanently.")
                     response.raise_for_status()
@@ -56,16 +110,16 @@ def request_with_retries(
                 return response
 
         except (requests.exceptions.RequestException, ConnectionError, TimeoutError) as exc:
+            if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None \
+                    and exc.response.status_code not in statuses_to_retry:
+                # Raised by raise_for_status() above for a status we do not retry (e.g. 404)
+                raise
             logger.warning(f"Request {method} {url} attempt={attempt} threw exception: {exc}. Will retry...")
+            metrics.inc("dp_http_retries_total", method=method, endpoint=metrics.endpoint_label(url),
+                        reason=type(exc).__name__)
             if attempt == max_retries:
                 logger.error(f"Exhausted retries for {method} {url}, last error: {exc}. Failing permanently.")
                 raise
-            sleep_time = min(backoff_factor * (2 ** (attempt - 1)), max_backoff)
-            if total_sleep_time + sleep_time > circuit_breaker_limit:
-                logger.error(f"Circuit breaker triggered: total sleep time {total_sleep_time + sleep_time} "
-                             f"would exceed limit of {circuit_breaker_limit} seconds.")
-                raise Exception(f"Circuit breaker limit exceeded for {method} {url}") from exc
-            time.sleep(sleep_time)
-            total_sleep_time += sleep_time
+            time.sleep(backoff_delay(attempt, backoff_factor, max_backoff))
 
     raise RuntimeError(f"Request {method} {url} failed after {max_retries} retries with unknown cause.")
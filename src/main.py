@@ -1,57 +1,46 @@
-import json
+import time
+
+STARTUP_STARTED = time.perf_counter()  # Reference point for the startup timing report
+
 import logging
+import multiprocessing
 import os
-import platform
 import sys
 import threading
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Tuple
 
 import flet as ft
 
-from dp_desktop.download import download_dataset
-from dp_desktop.list_objects import list_schemas, list_dataset_names
-from dp_desktop.upload import upload_files
-from dp_desktop.utils import get_files
+# Only light modules are imported up front. The transfer modules (and requests with them)
+# are imported where they are first used, after the first frame is on screen.
+from dp_desktop.breaker import add_listener as add_service_listener
+from dp_desktop.breaker import remove_listener as remove_service_listener
+from dp_desktop.config import (APP_NAME, CONFIG_DIR, HASH_CACHE_FILE, JOURNALS_DIR, LISTINGS_DIR, LOG_FORMAT_ENV,
+                               LOGS_DIR, METRICS_PORT_ENV, RATE_LIMITS_ENV, load_api_key, save_api_key)
+from dp_desktop.logs import setup_app_logging
+from dp_desktop.progress import ProgressAggregator, ProgressSnapshot
 
-APP_NAME = "DocuPanda"
+IMPORTS_DONE = time.perf_counter()
 
 
 ###############################################################################
 # 1. SET UP A NEW LOGFILE EACH RUN, CAPTURE PRINTS AND UNCAUGHT EXCEPTIONS
 ###############################################################################
 
-def get_config_dir(app_name: str):
-    system = platform.system()
-    if system == "Darwin":  # macOS
-        return Path.home() / "Library" / "Application Support" / app_name
-    elif system == "Windows":
-        return Path(os.getenv("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / app_name
-    else:  # Linux or others
-        return Path.home() / f".{app_name.lower()}"
-
+# Image optimization (see dp_desktop.transcode) runs in spawned worker processes, which import this
+# module again: only the app process itself writes a log file and opens the window
+multiprocessing.freeze_support()  # In a frozen build, runs the worker instead of the app
+IS_APP_PROCESS = multiprocessing.parent_process() is None
 
-CONFIG_DIR = get_config_dir(APP_NAME)
 CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
-# Create a dedicated logs folder
-LOGS_DIR = CONFIG_DIR / "logs"
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
-
-# Generate a new logfile name each run
-timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_file = LOGS_DIR / f"{APP_NAME.lower()}_{timestamp_str}.log"
-
-# Configure logging to both file and console
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler(log_file, mode='w', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout),
-    ],
-)
+# A new log file each run, in the logs folder. Records are written by a background thread
+# (see dp_desktop.logs), so logging never blocks the UI or the transfer threads.
+log_file = setup_app_logging(
+    LOGS_DIR, APP_NAME, json_lines=os.getenv(LOG_FORMAT_ENV, "").lower() == "json"
+) if IS_APP_PROCESS else None
 
 
 # Ensure uncaught exceptions get logged at CRITICAL level
@@ -64,52 +53,133 @@ def handle_exception(exc_type, exc_value, exc_traceback):
 
 sys.excepthook = handle_exception
 
+logging.info(f"[STARTUP] Modules imported in {(IMPORTS_DONE - STARTUP_STARTED) * 1000:.0f} ms")
 
-# Optionally, redirect all print statements to logging as well
-class PrintToLogger(object):
-    def __init__(self, level=logging.INFO):
-        self._level = level
 
-    def write(self, message):
-        if message.strip():
-            logging.log(self._level, message.strip())
+###############################################################################
+# 2. STANDARD APP CODE
+###############################################################################
 
-    def flush(self):
-        pass
+# Errors listed in the window; older ones are counted and remain in the log file
+MAX_VISIBLE_ERRORS = 100
+COUNT_UPDATE_INTERVAL = 0.5  # Seconds between updates of the file count while a folder is scanned
 
 
-sys.stdout = PrintToLogger(logging.INFO)
-sys.stderr = PrintToLogger(logging.ERROR)
+def get_latest_api_key():
+    key = load_api_key()
+    return key.strip() if key else ""
 
-###############################################################################
-# 2. STANDARD APP CODE
-###############################################################################
 
-CONFIG_FILE = CONFIG_DIR / "config.json"
+def log_startup_timing(phase: str):
+    logging.info(f"[STARTUP] {phase} after {(time.perf_counter() - STARTUP_STARTED) * 1000:.0f} ms")
 
 
-def load_api_key():
-    """Load the API key from our standard config file."""
-    if CONFIG_FILE.exists():
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-                return config.get("api_key", "")
-        except Exception as e:
-            print("Error loading config:", e)  # Goes to logs
-    return ""
+_metrics_sinks = []  # Started with the first transfer, kept for the life of the app
+_metrics_lock = threading.Lock()
 
 
-def save_api_key(api_key):
-    """Save the API key to our standard config file."""
-    config = {"api_key": api_key}
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f)
+def start_metrics_export():
+    """
+    Keep a JSON snapshot of transfer metrics next to the logs and, if DOCUPANDA_METRICS_PORT
+    is set, serve them for Prometheus. Called by every transfer; only the first starts anything.
+    """
+    from dp_desktop.metrics import JsonSnapshotSink, PrometheusExporter
 
+    with _metrics_lock:
+        if _metrics_sinks:
+            return
+        _metrics_sinks.append(JsonSnapshotSink(LOGS_DIR / "metrics.json"))
+        port = os.getenv(METRICS_PORT_ENV)
+        if port:
+            try:
+                _metrics_sinks.append(PrometheusExporter(int(port)))
+            except (ValueError, OSError) as e:
+                logging.error(f"Cannot serve metrics on port {port}: {e}")
 
-def get_latest_api_key():
-    key = load_api_key()
-    return key.strip() if key else ""
+
+_rate_limits_applied = [False]  # Set by the first transfer
+_rate_limits_lock = threading.Lock()
+
+
+def apply_rate_limits():
+    """Apply $DOCUPANDA_RATE_LIMITS, if set, before the first transfer. Called by every transfer."""
+    from dp_desktop.ratelimit import configure_rate_limits, parse_rate_limits
+
+    with _rate_limits_lock:
+        if _rate_limits_applied[0]:
+            return
+        _rate_limits_applied[0] = True
+        text = os.getenv(RATE_LIMITS_ENV)
+        if text:
+            try:
+                configure_rate_limits(parse_rate_limits(text))
+                logging.info(f"Rate limits set from ${RATE_LIMITS_ENV}: {text}")
+            except ValueError as e:
+                logging.error(f"Ignoring ${RATE_LIMITS_ENV}: {e}")
+
+
+def _fetch_dataset_names(api_key: str):
+    from dp_desktop.listing_cache import get_listing_cache
+    return get_listing_cache(LISTINGS_DIR, api_key).dataset_names()
+
+
+def _fetch_schemas(api_key: str):
+    from dp_desktop.listing_cache import get_listing_cache
+    return get_listing_cache(LISTINGS_DIR, api_key).schemas()
+
+
+class ListingPrefetcher(object):
+    """
+    Fetches the dataset and schema lists in the background as soon as an API key is
+    known, so the upload and download dialogs usually open already populated.
+
+    `get` returns the prefetched list (waiting if it is still in flight, refetching
+    if it failed or belongs to another key) and starts a new prefetch, so the next
+    time the dialog opens it is both instant and fresh.
+    """
+
+    FETCHERS = {"datasets": _fetch_dataset_names, "schemas": _fetch_schemas}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.FETCHERS), thread_name_prefix="prefetch")
+        self._futures: Dict[str, Tuple[str, Future]] = {}
+
+    def prefetch(self, api_key: str):
+        if not api_key:
+            return
+        with self._lock:
+            for name in self.FETCHERS:
+                self._submit(name, api_key)
+
+    def _submit(self, name: str, api_key: str) -> Future:
+        started = time.perf_counter()
+        future = self._executor.submit(self.FETCHERS[name], api_key)
+        future.add_done_callback(lambda f: logging.info(
+            f"[STARTUP] Prefetched {name} in {(time.perf_counter() - started) * 1000:.0f} ms"
+            if f.exception() is None else f"Prefetching {name} failed: {f.exception()}"
+        ))
+        self._futures[name] = (api_key, future)
+        return future
+
+    def ready(self, name: str, api_key: str) -> bool:
+        """True if `get` would return immediately with a result."""
+        with self._lock:
+            key, future = self._futures.get(name, (None, None))
+        return key == api_key and future.done() and future.exception() is None
+
+    def get(self, name: str, api_key: str):
+        with self._lock:
+            key, future = self._futures.get(name, (None, None))
+            if key != api_key or (future.done() and future.exception() is not None):
+                future = self._submit(name, api_key)
+        result = future.result()
+        with self._lock:
+            self._submit(name, api_key)
+        return result
+
+
+listing_prefetcher = ListingPrefetcher()
 
 
 def main(page: ft.Page):
@@ -139,6 +209,9 @@ def main(page: ft.Page):
     def clear_progress_text():
         progress_text.value = ""
         logs_link.visible = False
+        error_header.visible = False
+        error_list.controls.clear()
+        error_list.visible = False
         page.update()
 
     # This link becomes visible only on error and opens the local log file
@@ -148,6 +221,36 @@ def main(page: ft.Page):
         on_click=lambda e: page.launch_url(f"file://{log_file}")
     )
 
+    # Errors go into a list that only keeps the latest MAX_VISIBLE_ERRORS entries,
+    # so a run with thousands of failures never re-sends a growing block of text.
+    error_header = ft.Text("", color=ft.Colors.RED_700, visible=False)
+    error_list = ft.ListView(height=150, spacing=2, auto_scroll=True, visible=False)
+
+    # --------------------------------------------------------------------
+    #  SERVICE STATUS: one banner while DocuPanda is failing, instead of an error per file
+    # --------------------------------------------------------------------
+    service_banner = ft.Text("", color=ft.Colors.ORANGE_700, visible=False)
+
+    def on_service_state(host_class, degraded, message):
+        service_banner.value = f"Service degraded: {message}" if degraded else ""
+        service_banner.visible = degraded
+        page.update()
+        if not degraded:
+            show_snackbar(message)
+
+    def listen_for_service_state(e=None):
+        remove_service_listener(on_service_state)  # Registered at most once per page
+        add_service_listener(on_service_state)
+
+    def stop_listening_for_service_state(e=None):
+        remove_service_listener(on_service_state)
+
+    # The listeners are process-wide; a page that is gone must not keep receiving (and pinning) events
+    listen_for_service_state()
+    page.on_connect = listen_for_service_state
+    page.on_disconnect = stop_listening_for_service_state
+    page.on_close = stop_listening_for_service_state
+
     # --------------------------------------------------------------------
     #  Spinner + Progress Bar
     # --------------------------------------------------------------------
@@ -165,44 +268,51 @@ def main(page: ft.Page):
         page.update()
 
     # --------------------------------------------------------------------
-    #  UPLOAD finishing/progress/error
+    #  PROGRESS: worker threads report into a ProgressAggregator, which
+    #  renders to the page at a fixed rate from a single thread
     # --------------------------------------------------------------------
-    def finish_upload():
-        progress_text.value += "\nUpload complete!"
-        hide_progress_ui()
+    def render_progress(action: str, unit: str, snapshot: ProgressSnapshot):
+        if snapshot.total:
+            progress_bar.value = snapshot.completed / snapshot.total
+            progress_text.value = f"{action} {snapshot.completed} of {snapshot.total} {unit}...{snapshot.note}"
+        if snapshot.new_errors:
+            error_list.controls.extend(ft.Text(message, selectable=True, size=12) for message in snapshot.new_errors)
+            del error_list.controls[:-MAX_VISIBLE_ERRORS]
+            error_header.value = (f"{snapshot.error_count} errors (showing the latest {len(error_list.controls)}). "
+                                  f"Check logs here: {log_file}\nPlease share logs with DocuPanda support if needed.")
+            error_header.visible = True
+            error_list.visible = True
+            logs_link.visible = True
         page.update()
 
-    def progress_callback_upload(files_processed, total_files):
-        progress_bar.value = files_processed / total_files
-        progress_text.value = f"Uploading {files_processed} of {total_files} files..."
+    def start_progress(action: str, unit: str) -> ProgressAggregator:
         show_progress_ui()
-        page.update()
-
-    def handle_upload_error(file_path, error_msg):
-        progress_text.value += f"\nError uploading {file_path.name}: {error_msg}"
-        progress_text.value += f"\nCheck logs here: {log_file}\nPlease share logs with DocuPanda support if needed."
-        logs_link.visible = True
-        page.update()
+        return ProgressAggregator(lambda snapshot: render_progress(action, unit, snapshot))
 
-    # --------------------------------------------------------------------
-    #  DOWNLOAD finishing/progress/error
-    # --------------------------------------------------------------------
-    def finish_download():
-        progress_text.value += "\nDownload complete!"
+    def finish_progress(progress: ProgressAggregator, action: str):
+        progress.close()
+        if progress.error_count:
+            # Includes items that failed during an outage, which the service banner only announces once
+            progress_text.value += f"\n{action} finished with {progress.error_count} errors; see the list below."
+        else:
+            progress_text.value += f"\n{action} complete!"
         hide_progress_ui()
         page.update()
 
-    def progress_callback_download(files_processed, total_files):
-        progress_bar.value = files_processed / total_files
-        progress_text.value = f"Downloading {files_processed} of {total_files} documents..."
-        show_progress_ui()
-        page.update()
+    def dedup_note(stats) -> str:
+        skipped = stats.duplicates_in_folder + stats.duplicates_uploaded
+        if not skipped:
+            return ""
+        return f"\nSkipped {skipped} duplicate files ({stats.bytes_skipped / 1e6:.1f} MB not uploaded)."
 
-    def handle_download_error(doc_id_or_path, error_msg):
-        progress_text.value += f"\nError downloading {doc_id_or_path}: {error_msg}"
-        progress_text.value += f"\nCheck logs here: {log_file}\nPlease share logs with DocuPanda support if needed."
-        logs_link.visible = True
-        page.update()
+    def transcode_available() -> bool:
+        from dp_desktop.transcode import is_available
+        return is_available()
+
+    def transcode_note(stats) -> str:
+        if not stats.files_transcoded:
+            return ""
+        return f"\nOptimized {stats.files_transcoded} images ({stats.bytes_saved / 1e6:.1f} MB less to upload)."
 
     # --------------------------------------------------------------------
     #  config_view: For entering/saving the API key
@@ -213,6 +323,7 @@ def main(page: ft.Page):
         api_key = api_key_input.value.strip()
         if api_key:
             save_api_key(api_key)
+            listing_prefetcher.prefetch(api_key)
             show_snackbar("API key saved!")
             show_main_view()
         else:
@@ -267,78 +378,143 @@ def main(page: ft.Page):
         options=[],
         width=300,
     )
+    # Kept between uploads; only shown when Pillow is installed
+    optimize_images_checkbox = ft.Checkbox(label="Optimize large images before upload (smaller, faster uploads)")
 
     def handle_cancel(dialog, e):
         page.close(dialog)
 
-    def handle_confirm(dialog, e, folder_path, file_count):
-        chosen_name = dataset_name_field.value.strip()
-        chosen_schema = schema_dropdown.value or None
-        page.close(dialog)
+    def refresh_dataset_listing():
+        # The upload may have created a dataset, so don't let the download dialog show a stale list
+        from dp_desktop.listing_cache import get_listing_cache
+
+        api_key = get_latest_api_key()
+        try:
+            get_listing_cache(LISTINGS_DIR, api_key).refresh("datasets")
+        except Exception as e:
+            logging.warning(f"Could not refresh dataset names: {e}")
+        listing_prefetcher.prefetch(api_key)
 
+    def start_upload(folder_path, dataset_name, schema_id, optimize_images=False):
         def do_upload():
-            show_progress_ui()
+            from dp_desktop.transcode import TranscodeSettings
+            from dp_desktop.upload import upload_files
+
+            start_metrics_export()
+            apply_rate_limits()
             progress_text.value += "\nStarting upload..."
-            page.update()
+            progress = start_progress("Uploading", "files")
+            notes = {"dedup": "", "transcode": ""}  # Shown together below the progress
+
+            def note(kind: str, text: str):
+                notes[kind] = text
+                progress.note("".join(notes.values()))
 
             upload_files(
                 folder_path,
                 load_api_key(),
-                chosen_name,
-                chosen_schema,
-                progress_callback=progress_callback_upload,
-                error_callback=handle_upload_error,
+                dataset_name,
+                schema_id,
+                progress_callback=progress.progress,
+                error_callback=lambda file_path, error_msg: progress.error(
+                    f"Error uploading {file_path.name}: {error_msg}"),
+                journal_dir=JOURNALS_DIR,
+                hash_cache_path=HASH_CACHE_FILE,
+                dedup_callback=lambda stats: note("dedup", dedup_note(stats)),
+                transcode=TranscodeSettings() if optimize_images else None,
+                transcode_callback=lambda stats: note("transcode", transcode_note(stats)),
             )
-            finish_upload()
+            finish_progress(progress, "Upload")
+            refresh_resume_buttons()
+            refresh_dataset_listing()
 
         threading.Thread(target=do_upload, daemon=True).start()
 
-    def open_folder_dialog(folder_path, allowed_count, total_file_count):
+    def handle_confirm(dialog, e, folder_path):
+        chosen_name = dataset_name_field.value.strip()
+        chosen_schema = schema_dropdown.value or None
+        page.close(dialog)
+        start_upload(folder_path, chosen_name, chosen_schema, optimize_images=bool(optimize_images_checkbox.value))
+
+    def scan_text(folder_path, total_file_count, allowed_count, finished):
+        counting = "" if finished else " so far (still scanning)"
+        return (f"Folder selected: {folder_path}\nDetected {total_file_count} files of which {allowed_count} "
+                f"are supported file types{counting}.")
+
+    def open_folder_dialog(folder_path):
         dataset_name_field.value = ""
         schema_dropdown.value = ""
         schema_dropdown.options = []
         schema_dropdown.visible = False
+        optimize_images_checkbox.visible = transcode_available()
         page.update()
 
+        spinner = ft.ProgressRing(visible=True)  # indicates we are fetching schemas
+        # Counted in the background so a huge folder doesn't hold up the dialog
+        count_text = ft.Text(scan_text(folder_path, 0, 0, finished=False))
+        stop_counting = threading.Event()
         dlg = ft.AlertDialog(
             modal=True,
             title=ft.Text("Upload Settings"),
             content=ft.Column(
                 controls=[
-                    ft.Text(
-                        f"Folder selected: {folder_path}\nDetected {total_file_count} files of which {allowed_count} are supported "
-                        f"file types."),
+                    count_text,
                     ft.Text("Please provide a dataset name (required):"),
                     dataset_name_field,
                     ft.Text("Optionally, standardize each document with a schema below:"),
                     schema_dropdown,
-                    ft.ProgressRing(visible=True),  # indicates we are fetching schemas
+                    optimize_images_checkbox,
+                    spinner,
                 ],
                 spacing=10,
             ),
             actions_alignment=ft.MainAxisAlignment.END,
             actions=[
-                ft.TextButton("Cancel", on_click=lambda e: handle_cancel(dlg, e)),
+                ft.TextButton("Cancel", on_click=lambda e: (stop_counting.set(), handle_cancel(dlg, e))),
                 ft.ElevatedButton(
                     "Confirm Upload",
-                    on_click=lambda e: handle_confirm(dlg, e, folder_path, allowed_count)
+                    on_click=lambda e: (stop_counting.set(), handle_confirm(dlg, e, folder_path))
                 ),
             ],
         )
-        page.open(dlg)
+
+        def count_files_in_folder():
+            from dp_desktop.scan import count_files
+
+            last_update = [0.0]  # mutable reference for closure
+
+            def show_count(total_file_count, allowed_count):
+                if time.monotonic() - last_update[0] >= COUNT_UPDATE_INTERVAL:
+                    last_update[0] = time.monotonic()
+                    count_text.value = scan_text(folder_path, total_file_count, allowed_count, finished=False)
+                    page.update()
+
+            total_file_count, allowed_count = count_files(folder_path, progress=show_count,
+                                                          should_stop=stop_counting.is_set)
+            if not stop_counting.is_set():
+                count_text.value = scan_text(folder_path, total_file_count, allowed_count, finished=True)
+                page.update()
 
         def fetch_schemas():
-            latest_key = get_latest_api_key()
-            schemas_fetched = list_schemas(latest_key)
+            schemas_fetched = listing_prefetcher.get("schemas", latest_key)
             schema_dropdown.options = [
                 ft.dropdown.Option(key=s.schemaId, text=s.schemaName)
                 for s in schemas_fetched
             ]
             schema_dropdown.visible = True
-            dlg.content.controls.pop()  # remove spinner
+            if spinner in dlg.content.controls:
+                dlg.content.controls.remove(spinner)
             page.update()
 
-        threading.Thread(target=fetch_schemas, daemon=True).start()
+        # Usually prefetched already, so the dialog opens with the schemas in place
+        latest_key = get_latest_api_key()
+        if listing_prefetcher.ready("schemas", latest_key):
+            fetch_schemas()
+            page.open(dlg)
+        else:
+            page.open(dlg)
+            threading.Thread(target=fetch_schemas, daemon=True).start()
+        threading.Thread(target=count_files_in_folder, daemon=True).start()
 
     def pick_folder_result(e: ft.FilePickerResultEvent):
         if e.path:
@@ -347,9 +523,7 @@ def main(page: ft.Page):
 
             folder_path = Path(e.path)
 
-            all_files, allowed_files = get_files(folder_path)
-
-            open_folder_dialog(folder_path, len(allowed_files), len(all_files))
+            open_folder_dialog(folder_path)
         else:
             show_snackbar("No folder selected.")
 
@@ -358,6 +532,33 @@ def main(page: ft.Page):
         on_click=lambda e: file_picker.get_directory_path()
     )
 
+    # --------------------------------------------------------------------
+    #  RESUME uploads that were interrupted (app closed or crashed mid-upload)
+    # --------------------------------------------------------------------
+    resume_column = ft.Column(controls=[], visible=False)
+
+    def resume_upload(unfinished):
+        clear_progress_text()
+        resume_column.visible = False
+        page.update()
+        start_upload(unfinished.folder_path, unfinished.dataset_name, unfinished.schema_id,
+                     optimize_images=bool(optimize_images_checkbox.value))
+
+    def refresh_resume_buttons():
+        from dp_desktop.journal import find_unfinished_uploads
+
+        unfinished_uploads = [u for u in find_unfinished_uploads(JOURNALS_DIR) if u.folder_path.exists()]
+        resume_column.controls = [
+            ft.TextButton(
+                text=f"Resume interrupted upload of {u.folder_path} to '{u.dataset_name}'",
+                icon=ft.Icons.RESTART_ALT,
+                on_click=lambda e, u=u: resume_upload(u),
+            )
+            for u in unfinished_uploads
+        ]
+        resume_column.visible = bool(unfinished_uploads)
+        page.update()
+
     # --------------------------------------------------------------------
     #  DOWNLOAD flow
     # --------------------------------------------------------------------
@@ -393,18 +594,22 @@ def main(page: ft.Page):
         page.close(dialog)
 
         def do_download():
-            show_progress_ui()
+            from dp_desktop.download import download_dataset
+
+            start_metrics_export()
+            apply_rate_limits()
             progress_text.value += "\nStarting download..."
-            page.update()
+            progress = start_progress("Downloading", "documents")
 
             download_dataset(
                 api_key=get_latest_api_key(),
                 dataset_name=selected_dataset,
                 output_dir=chosen_folder_path,
-                progress_callback=progress_callback_download,
-                error_callback=handle_download_error
+                progress_callback=progress.progress,
+                error_callback=lambda doc_label, error_msg: progress.error(
+                    f"Error downloading {doc_label}: {error_msg}")
             )
-            finish_download()
+            finish_progress(progress, "Download")
 
         threading.Thread(target=do_download, daemon=True).start()
 
@@ -453,16 +658,21 @@ def main(page: ft.Page):
             ],
         )
 
-        page.open(dlg)
-
         def fetch_dataset_names():
-            names = list_dataset_names(get_latest_api_key())
+            names = listing_prefetcher.get("datasets", latest_key)
             dataset_dropdown.options = [ft.dropdown.Option(name, name) for name in names]
             if loading_row in dialog_column.controls:
                 dialog_column.controls.remove(loading_row)
             page.update()
 
-        threading.Thread(target=fetch_dataset_names, daemon=True).start()
+        # Usually prefetched already, so the dialog opens with the dataset names in place
+        latest_key = get_latest_api_key()
+        if listing_prefetcher.ready("datasets", latest_key):
+            fetch_dataset_names()
+            page.open(dlg)
+        else:
+            page.open(dlg)
+            threading.Thread(target=fetch_dataset_names, daemon=True).start()
 
     download_button = ft.ElevatedButton(
         text="Download Dataset Results",
@@ -484,9 +694,13 @@ def main(page: ft.Page):
         controls=[
             header,
             buttons_row,
+            resume_column,
+            service_banner,
             loading_indicator,
             progress_bar,
             progress_container,  # The scrollable progress area
+            error_header,
+            error_list,  # Latest errors only; the full list is in the log file
             logs_link,  # Button to open local log file (shown on error)
         ],
         spacing=40,
@@ -513,9 +727,19 @@ def main(page: ft.Page):
         config_view.visible = True
 
     page.add(config_view, main_view)
+    log_startup_timing("First frame")
+
+    # Warm up the dialogs' lists while the user looks at the first screen
+    listing_prefetcher.prefetch(get_latest_api_key())
+    refresh_resume_buttons()
+    log_startup_timing("Startup complete")
 
 
 # IMPORTANT: Provide both assets_dir and icon to ensure the icon is visible.
-ft.app(
-    target=main,
-)
+if IS_APP_PROCESS:
+    ft.app(
+        target=main,
+    )
+    # The window is closed: close the pooled HTTP connections before the interpreter exits
+    from dp_desktop.transport import close_sessions
+    close_sessions()
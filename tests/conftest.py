@@ -0,0 +1,97 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Tuple
+
+import pytest
+
+from dp_desktop import breaker
+
+Reply = Tuple[int, dict, bytes]  # status, headers, body
+
+
+class ScriptedServer(object):
+    """
+    Local HTTP server for tests. Every request is passed to `handler(method, path, headers)`,
+    which returns the (status, headers, body) to send; requests are recorded in `requests`.
+    """
+
+    def __init__(self, handler: Callable[[str, str, dict], Reply]):
+        self.handler = handler
+        self.requests: List[Tuple[str, str, dict]] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                headers = dict(self.headers)
+                server.requests.append((self.command, self.path, headers))
+                status, reply_headers, body = server.handler(self.command, self.path, headers)
+                self.send_response(status)
+                for name, value in reply_headers.items():
+                    self.send_header(name, value)
+                if "Content-Length" not in reply_headers:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            do_GET = do_POST = do_HEAD = _reply
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def scripted_server():
+    """Factory for ScriptedServer instances that are shut down after the test."""
+    servers: List[ScriptedServer] = []
+
+    def start(handler: Callable[[str, str, dict], Reply]) -> ScriptedServer:
+        server = ScriptedServer(handler)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def replies(*sequence: Reply, default: Optional[Reply] = None) -> Callable[[str, str, dict], Reply]:
+    """A handler that sends `sequence` in order, then `default` (or the last reply) forever."""
+    remaining = list(sequence)
+    lock = threading.Lock()
+
+    def handler(method: str, path: str, headers: dict) -> Reply:
+        with lock:
+            if len(remaining) > 1 or (remaining and default is not None):
+                return remaining.pop(0)
+            return remaining[0] if remaining else default
+    return handler
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    # The breakers are process-wide; give every test its own, so failures do not leak between tests
+    for name in list(breaker._breakers):
+        monkeypatch.setitem(breaker._breakers, name, breaker.CircuitBreaker(name))
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Retry without sleeping."""
+    from dp_desktop import utils
+    monkeypatch.setattr(utils, "backoff_delay", lambda *args, **kwargs: 0)
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import os
+import re
+
+import pytest
+
+from dp_desktop import blob
+from dp_desktop.blob import IncompleteDownloadError, _fetch_part, _PartWriter, download_to_file
+
+BLOB = os.urandom(4500)
+LOG = logging.getLogger(__name__)
+
+
+def storage(data: bytes = BLOB, content_range=None, ignore_range: bool = False):
+    """Serves `data`, honouring Range headers unless told to ignore them or to lie about the range."""
+    def handler(method, path, headers):
+        match = re.match(r"bytes=(\d+)-(\d+)", headers.get("Range", ""))
+        if not match or ignore_range:
+            return 200, {}, data
+        start = int(match.group(1))
+        if start >= len(data):
+            return 416, {"Content-Range": f"bytes */{len(data)}"}, b""
+        end = min(int(match.group(2)), len(data) - 1)
+        header = content_range or f"bytes {start}-{end}/{len(data)}"
+        return 206, {"Content-Range": header}, data[start:end + 1]
+    return handler
+
+
+@pytest.fixture
+def part_file(tmp_path):
+    with open(tmp_path / "doc.pdf", "w+b") as f:
+        f.truncate(len(BLOB))
+        yield f
+
+
+def test_fetch_part_writes_the_requested_range(scripted_server, part_file):
+    server = scripted_server(storage())
+    _fetch_part(f"{server.url}/blob", _PartWriter(part_file), 1000, 1999, len(BLOB), "doc.pdf", LOG)
+    part_file.seek(1000)
+    assert part_file.read(1000) == BLOB[1000:2000]
+    assert server.requests[0][2]["Range"] == "bytes=1000-1999"
+
+
+@pytest.mark.parametrize("server_reply", [
+    storage(ignore_range=True),  # 200 with the whole object
+    storage(content_range=f"bytes 0-999/{len(BLOB)}"),  # 206 for another range
+    storage(content_range="bytes 1000-1999/9999"),  # 206 for an object of another size
+])
+def test_fetch_part_rejects_a_response_for_other_bytes(scripted_server, part_file, server_reply):
+    server = scripted_server(server_reply)
+    with pytest.raises(IncompleteDownloadError):
+        _fetch_part(f"{server.url}/blob", _PartWriter(part_file), 1000, 1999, len(BLOB), "doc.pdf", LOG)
+    assert len(server.requests) == blob.DOWNLOAD_ATTEMPTS
+    part_file.seek(1000)
+    assert part_file.read(1000) == bytes(1000)
+
+
+@pytest.mark.parametrize("server_reply, requests_sent", [
+    (storage(), 5),  # 1000-byte parts
+    (storage(ignore_range=True), 1),  # streamed as a whole
+])
+def test_download_to_file(scripted_server, monkeypatch, tmp_path, server_reply, requests_sent):
+    monkeypatch.setattr(blob, "RANGE_PART_SIZE", 1000)
+    server = scripted_server(server_reply)
+    output_path = tmp_path / "doc.pdf"
+    assert download_to_file(f"{server.url}/blob", output_path) == (len(BLOB), hashlib.sha256(BLOB).hexdigest())
+    assert output_path.read_bytes() == BLOB
+    assert len(server.requests) == requests_sent
+
+
+def test_empty_object_is_downloaded_without_a_range(scripted_server, tmp_path):
+    server = scripted_server(storage(data=b""))
+    output_path = tmp_path / "empty.pdf"
+    assert download_to_file(f"{server.url}/blob", output_path) == (0, hashlib.sha256(b"").hexdigest())
+    assert output_path.read_bytes() == b""
+    assert "Range" not in server.requests[-1][2]
@@ -0,0 +1,84 @@
+import pytest
+
+from conftest import replies
+from dp_desktop import breaker
+from dp_desktop.breaker import CircuitBreaker, ServiceDegradedError
+from dp_desktop.utils import request_with_retries
+
+
+@pytest.fixture
+def events():
+    received = []
+
+    def listener(name, degraded, message):
+        received.append((name, degraded))
+    breaker.add_listener(listener)
+    yield received
+    breaker.remove_listener(listener)
+
+
+def fail(circuit_breaker: CircuitBreaker, failures: int, successes: int = 0):
+    for _ in range(successes):
+        circuit_breaker.record(False)
+    for _ in range(failures):
+        circuit_breaker.record(True)
+
+
+def test_opens_once_enough_recent_requests_failed(events):
+    circuit_breaker = CircuitBreaker("api")
+    fail(circuit_breaker, breaker.MIN_OUTCOMES - 1)
+    assert circuit_breaker.state == breaker.STATE_CLOSED
+    fail(circuit_breaker, 1)
+    assert circuit_breaker.state == breaker.STATE_OPEN
+    assert events == [("api", True)]
+
+
+def test_stays_closed_below_the_failure_threshold(events):
+    circuit_breaker = CircuitBreaker("api")
+    fail(circuit_breaker, failures=breaker.MIN_OUTCOMES // 2 - 1, successes=breaker.MIN_OUTCOMES // 2 + 1)
+    assert circuit_breaker.state == breaker.STATE_CLOSED
+    assert events == []
+
+
+def test_probe_closes_or_reopens_the_breaker(monkeypatch, events):
+    monkeypatch.setattr(breaker, "PROBE_INTERVAL", 0)
+    circuit_breaker = CircuitBreaker("api")
+    fail(circuit_breaker, breaker.MIN_OUTCOMES)
+
+    assert circuit_breaker.before_request() is True
+    assert circuit_breaker.state == breaker.STATE_HALF_OPEN
+    circuit_breaker.record(True, probe=True)
+    assert circuit_breaker.state == breaker.STATE_OPEN
+
+    monkeypatch.setattr(circuit_breaker, "_probe_at", 0)
+    assert circuit_breaker.before_request() is True
+    circuit_breaker.record(False, probe=True)
+    assert circuit_breaker.state == breaker.STATE_CLOSED
+    assert circuit_breaker.before_request() is False
+    assert events == [("api", True), ("api", False)]
+
+
+def test_requests_fail_fast_after_a_long_outage(monkeypatch):
+    monkeypatch.setattr(breaker, "MAX_OUTAGE", 0)
+    circuit_breaker = CircuitBreaker("api")
+    fail(circuit_breaker, breaker.MIN_OUTCOMES)
+    with pytest.raises(ServiceDegradedError):
+        circuit_breaker.before_request()
+
+
+def test_retry_budget_runs_out(monkeypatch):
+    monkeypatch.setattr(breaker, "RETRY_BUDGET_PER_SECOND", 0)
+    circuit_breaker = CircuitBreaker("api")
+    assert all(circuit_breaker.allow_retry() for _ in range(breaker.RETRY_BUDGET_MAX))
+    assert not circuit_breaker.allow_retry()
+    circuit_breaker.record(False)
+    assert not circuit_breaker.allow_retry()  # One request earns only a fraction of a retry
+
+
+def test_request_gives_up_when_the_retry_budget_is_used_up(scripted_server, no_backoff, monkeypatch):
+    server = scripted_server(replies((503, {}, b"{}")))
+    monkeypatch.setattr(breaker.breaker_for(server.url), "_budget", 0.0)
+    monkeypatch.setattr(breaker, "RETRY_BUDGET_PER_SECOND", 0)
+    with pytest.raises(ServiceDegradedError):
+        request_with_retries("GET", f"{server.url}/document/d1", max_retries=5)
+    assert len(server.requests) == 1
@@ -0,0 +1,73 @@
+import json
+from typing import Tuple
+
+import pytest
+
+from dp_desktop import cli, logs, metrics, ratelimit, upload
+
+
+@pytest.fixture(autouse=True)
+def no_log_setup(monkeypatch):
+    # main() routes the root logger through a background thread; pytest's capture is enough here
+    monkeypatch.setattr(logs, "QueueLogging", lambda *args, **kwargs: None)
+
+
+def run_upload(monkeypatch, tmp_path, capsys, fake_upload, *options) -> Tuple[int, dict]:
+    monkeypatch.setattr(upload, "upload_files", fake_upload)
+    code = cli.main(["--api-key", "key", "--progress-interval", "0.01", *options,
+                     "upload", str(tmp_path), "--dataset", "ds"])
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return code, events[-1]
+
+
+def test_complete_run_exits_ok(monkeypatch, tmp_path, capsys):
+    def fake_upload(*args, progress_callback, **kwargs):
+        progress_callback(3, 3)
+
+    code, done = run_upload(monkeypatch, tmp_path, capsys, fake_upload)
+    assert code == cli.EXIT_OK
+    assert (done["event"], done["completed"], done["total"], done["errors"]) == ("done", 3, 3, 0)
+
+
+def test_failed_items_exit_with_failures(monkeypatch, tmp_path, capsys):
+    def fake_upload(*args, progress_callback, error_callback, **kwargs):
+        progress_callback(2, 3)
+        error_callback(tmp_path / "c.pdf", "boom")
+
+    code, done = run_upload(monkeypatch, tmp_path, capsys, fake_upload)
+    assert code == cli.EXIT_FAILURES
+    assert done["errors"] == 1
+
+
+def test_degraded_items_exit_with_failures(monkeypatch, tmp_path, capsys):
+    def fake_upload(*args, progress_callback, **kwargs):
+        metrics.inc("dp_items_total", operation="upload", outcome="degraded")
+        progress_callback(3, 3)
+
+    code, done = run_upload(monkeypatch, tmp_path, capsys, fake_upload)
+    assert code == cli.EXIT_FAILURES
+    assert done["degraded"] == 1
+
+
+def test_unfinished_run_exits_with_failures(monkeypatch, tmp_path, capsys):
+    def fake_upload(*args, progress_callback, **kwargs):
+        progress_callback(2, 3)
+
+    code, done = run_upload(monkeypatch, tmp_path, capsys, fake_upload)
+    assert code == cli.EXIT_FAILURES
+    assert (done["completed"], done["total"], done["errors"]) == (2, 3, 0)
+
+
+def test_rate_limits_option_replaces_the_buckets(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(ratelimit, "_buckets", dict(ratelimit._buckets))
+    code, _ = run_upload(monkeypatch, tmp_path, capsys, lambda *args, progress_callback, **kwargs: None,
+                         "--rate-limits", "upload=5:10")
+    assert code == cli.EXIT_OK
+    assert (ratelimit._buckets["upload"].rate, ratelimit._buckets["upload"].burst) == (5.0, 10)
+    assert ratelimit._buckets["poll"].rate == ratelimit.RATE_LIMITS["poll"][0]
+
+
+def test_invalid_rate_limits_are_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(["--rate-limits", "uploads=5", "list-datasets"])
+    assert exit_info.value.code == cli.EXIT_USAGE
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from dp_desktop import concurrency
+from dp_desktop.concurrency import AdaptiveLimiter, host_class
+from dp_desktop.config import API_URL
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    # Every decrease takes effect, instead of one per DECREASE_COOLDOWN
+    monkeypatch.setattr(concurrency, "DECREASE_COOLDOWN", 0)
+    monkeypatch.setattr(concurrency, "HOLD_AFTER_SIGNAL", 0)
+    return AdaptiveLimiter("test", initial=10, minimum=2, maximum=12)
+
+
+def test_successes_raise_the_limit_by_about_one_per_round(limiter):
+    for _ in range(11):
+        limiter.observe("GET", 0.01, status_code=200)
+    assert limiter.limit == 11
+    for _ in range(100):
+        limiter.observe("GET", 0.01, status_code=200)
+    assert limiter.limit == 12  # maximum
+
+
+@pytest.mark.parametrize("outcome, expected", [
+    ({"status_code": 429}, 5),
+    ({"status_code": 503}, 5),
+    ({"error": True}, 8),
+])
+def test_throttling_and_errors_cut_the_limit(limiter, outcome, expected):
+    limiter.observe("GET", 0.01, **outcome)
+    assert limiter.limit == expected
+
+
+def test_limit_never_drops_below_the_minimum(limiter):
+    for _ in range(10):
+        limiter.observe("GET", 0.01, status_code=429)
+    assert limiter.limit == 2
+
+
+def test_a_burst_of_throttling_halves_the_limit_once():
+    limiter = AdaptiveLimiter("test", initial=16, minimum=2, maximum=64)
+    for _ in range(5):
+        limiter.observe("GET", 0.01, status_code=429)
+    assert limiter.limit == 8
+
+
+def test_growth_waits_until_throttling_has_stopped():
+    limiter = AdaptiveLimiter("test", initial=16, minimum=2, maximum=64)
+    limiter.observe("GET", 0.01, status_code=429)
+    for _ in range(20):
+        limiter.observe("GET", 0.01, status_code=200)
+    assert limiter.limit == 8
+
+
+def test_rising_latency_counts_as_congestion(limiter):
+    for _ in range(concurrency.LATENCY_CHECK_EVERY):
+        limiter.observe("GET", 0.01, status_code=200)
+    grown = limiter.limit
+    for _ in range(concurrency.LATENCY_CHECK_EVERY):
+        limiter.observe("GET", 1.0, status_code=200)
+    assert limiter.limit < grown
+
+
+def test_latency_is_tracked_per_request_kind(limiter):
+    for _ in range(concurrency.LATENCY_CHECK_EVERY):
+        limiter.observe("GET", 0.01, status_code=200)
+    grown = limiter.limit
+    for _ in range(concurrency.LATENCY_CHECK_EVERY):
+        limiter.observe("POST", 1.0, status_code=200)
+    assert limiter.limit >= grown
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AdaptiveLimiter("test", initial=2, minimum=1, maximum=2)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1)
+    waiter.join()
+    assert limiter.in_flight == 2
+
+
+def test_api_and_storage_hosts_are_told_apart():
+    assert host_class(f"{API_URL}/documents") == "api"
+    assert host_class("https://storage.example.com/doc.pdf") == "storage"
@@ -0,0 +1,126 @@
+import functools
+import json
+import sqlite3
+
+import pytest
+
+from dp_desktop import poller, standardize, upload
+from dp_desktop.dedup import DuplicateTracker, HashCache, hash_file
+
+
+def test_schema_is_part_of_the_key(tmp_path):
+    with HashCache(tmp_path / "hashes.sqlite3") as cache:
+        cache.put("ds", "h1", "d-plain")
+        cache.put("ds", "h2", "d-std", "schema")
+        assert cache.get("ds", "h1") == "d-plain"
+        assert cache.get("ds", "h1", "schema") is None
+        assert cache.get("ds", "h2") == "d-std"
+        assert cache.get("ds", "h2", "schema") == "d-std"
+        assert cache.get("ds", "h2", "other") is None
+        assert cache.get("other", "h1") is None
+
+
+def test_entries_of_caches_without_schemas_are_kept_as_plain_uploads(tmp_path):
+    path = tmp_path / "hashes.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE hashes (dataset TEXT NOT NULL, content_hash TEXT NOT NULL, document_id TEXT NOT NULL, "
+                 "created_at REAL NOT NULL, PRIMARY KEY (dataset, content_hash))")
+    conn.execute("INSERT INTO hashes VALUES ('ds', 'h1', 'd1', 0)")
+    conn.commit()
+    conn.close()
+    with HashCache(path) as cache:
+        assert cache.get("ds", "h1") == "d1"
+        assert cache.get("ds", "h1", "schema") is None
+
+
+def api(method, path, headers):
+    """Uploads, processing and standardization that complete at once."""
+    if method == "POST" and path == "/document":
+        return 200, {}, b'{"documentId": "new"}'
+    if method == "POST" and path == "/v2/standardize/batch":
+        return 200, {}, b'{"standardizationIds": ["s-new"]}'
+    if path.startswith("/document/"):
+        return 200, {}, b'{"status": "completed"}'
+    return 200, {}, json.dumps({"standardizationId": path.rsplit("/", 1)[-1]}).encode()
+
+
+@pytest.fixture
+def server(scripted_server, monkeypatch):
+    server = scripted_server(api)
+    for module in (upload, poller):
+        monkeypatch.setattr(module, "API_URL", server.url)
+    monkeypatch.setattr(standardize, "STANDARDIZE_URL", server.url)
+    monkeypatch.setattr(upload, "StandardizationBatcher",
+                        functools.partial(standardize.StandardizationBatcher, max_wait=0.01))
+    monkeypatch.setattr(upload, "POLL_INTERVAL", 0.01)
+    return server
+
+
+def run_upload(folder, cache_path, schema_id=None):
+    stats = []
+    errors = []
+    upload.upload_files(folder, "key", "ds", schema_id=schema_id, hash_cache_path=cache_path,
+                        error_callback=lambda path, error: errors.append(error),
+                        dedup_callback=stats.append)
+    assert errors == []
+    return stats[-1]
+
+
+def test_identical_files_are_uploaded_once_and_skipped_next_time(server, tmp_path):
+    folder, cache_path = tmp_path / "scans", tmp_path / "hashes.sqlite3"
+    folder.mkdir()
+    for name in ("a.pdf", "a-copy.pdf"):
+        (folder / name).write_bytes(b"same bytes")
+    (folder / "b.pdf").write_bytes(b"other bytes")
+
+    stats = run_upload(folder, cache_path)
+    assert [path for method, path, _ in server.requests if method == "POST"] == ["/document"] * 2
+    assert (stats.duplicates_in_folder, stats.duplicates_uploaded) == (1, 0)
+
+    server.requests.clear()
+    stats = run_upload(folder, cache_path)
+    assert server.requests == []
+    assert (stats.duplicates_uploaded, stats.bytes_skipped) == (3, len(b"same bytes") * 2 + len(b"other bytes"))
+
+
+def test_files_uploaded_without_a_schema_are_standardized_when_a_schema_is_given(server, tmp_path):
+    folder, cache_path = tmp_path / "scans", tmp_path / "hashes.sqlite3"
+    folder.mkdir()
+    (folder / "a.pdf").write_bytes(b"same bytes")
+    (folder / "a-copy.pdf").write_bytes(b"same bytes")
+    run_upload(folder, cache_path)
+
+    server.requests.clear()
+    stats = run_upload(folder, cache_path, schema_id="schema")
+    sent = [(method, path) for method, path, _ in server.requests]
+    assert ("POST", "/document") not in sent
+    assert sent.count(("POST", "/v2/standardize/batch")) == 1
+    assert stats.duplicates_uploaded == 1 and stats.duplicates_in_folder == 1
+    with HashCache(cache_path) as cache:
+        assert cache.get("ds", upload.hash_file(folder / "a.pdf"), "schema") == "new"
+
+    server.requests.clear()
+    run_upload(folder, cache_path, schema_id="schema")
+    assert server.requests == []
+
+
+def test_hash_depends_on_contents_only(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"x" * 3_000_000)
+    (tmp_path / "b.pdf").write_bytes(b"x" * 3_000_000)
+    (tmp_path / "c.pdf").write_bytes(b"x" * 2_999_999 + b"y")
+    assert hash_file(tmp_path / "a.pdf") == hash_file(tmp_path / "b.pdf") != hash_file(tmp_path / "c.pdf")
+
+
+def test_duplicates_follow_their_primary():
+    tracker = DuplicateTracker()
+    assert tracker.claim("h", "a") == (True, None)
+    assert tracker.claim("h", "b") == (False, None)
+    assert tracker.resolve("h", "d1") == ["b"]
+    assert tracker.claim("h", "c") == (False, "d1")
+
+
+def test_a_duplicate_of_a_failed_primary_is_tried_again():
+    tracker = DuplicateTracker()
+    tracker.claim("h", "a")
+    assert tracker.resolve("h", None) == []
+    assert tracker.claim("h", "b") == (True, None)
@@ -0,0 +1,139 @@
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+from dp_desktop import download
+from dp_desktop.download import StandardizationIndex
+from dp_desktop.manifest import open_manifest
+
+# Newest first per document, as the API lists them; one still processing has no data
+STANDARDIZATIONS = [
+    {"documentId": "d2", "standardizationId": "s2-processing", "data": None},
+    {"documentId": "d1", "standardizationId": "s1-new", "data": {"v": "new"}},
+    {"documentId": "d2", "standardizationId": "s2", "data": {"v": 2}},
+    {"documentId": "d1", "standardizationId": "s1-old", "data": {"v": "old"}},
+]
+DOCUMENTS = [{"documentId": f"d{i}", "filename": f"doc{i}", "fileExtension": "pdf"} for i in (1, 2, 3)]
+
+
+def listing(first_page_sent=None, status=200):
+    def handler(method, path, headers):
+        query = parse_qs(urlsplit(path).query)
+        offset, limit = int(query["offset"][0]), int(query["limit"][0])
+        assert query["exclude_payload"] == ["false"]
+        if offset and first_page_sent:
+            first_page_sent.wait(5)
+        page = STANDARDIZATIONS[offset:offset + limit]
+        return status, {"Content-Type": "application/json"}, json.dumps(page).encode()
+    return handler
+
+
+def build(monkeypatch, server, tmp_path, wanted=lambda document_id, std_id: True) -> StandardizationIndex:
+    monkeypatch.setattr(download, "API_URL", server.url)
+    index = StandardizationIndex("key", "ds", tmp_path, wanted=wanted, page_size=2)
+    index.start()
+    return index
+
+
+def test_index_keeps_the_newest_completed_standardization_per_document(scripted_server, monkeypatch, tmp_path):
+    index = build(monkeypatch, scripted_server(listing()), tmp_path)
+    index.wait()
+    assert index.lookup("d1") == (True, "s1-new")
+    assert index.lookup("d2") == (True, "s2")
+    assert index.lookup("d3") == (True, None)
+    assert index.take("d1")["data"] == {"v": "new"}
+    assert index.take("d1") is None
+    index.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_index_only_keeps_the_payloads_it_is_asked_for(scripted_server, monkeypatch, tmp_path):
+    index = build(monkeypatch, scripted_server(listing()), tmp_path, wanted=lambda document_id, std_id: std_id == "s2")
+    index.wait()
+    assert index.lookup("d1") == (True, "s1-new")
+    assert index.take("d1") is None
+    assert index.take("d2")["standardizationId"] == "s2"
+    index.close()
+
+
+def test_lookup_does_not_wait_for_the_index(scripted_server, monkeypatch, tmp_path):
+    first_page_sent = threading.Event()
+    index = build(monkeypatch, scripted_server(listing(first_page_sent=first_page_sent)), tmp_path)
+    assert index.lookup("d1") == (False, None)
+    first_page_sent.set()
+    index.wait()
+    assert index.lookup("d1") == (True, "s1-new")
+    index.close()
+
+
+def test_failed_index_reports_documents_as_not_found(scripted_server, monkeypatch, tmp_path, no_backoff):
+    index = build(monkeypatch, scripted_server(listing(status=403)), tmp_path)
+    index.wait()
+    assert index.lookup("d1") == (False, None)
+    index.close()
+
+
+def dataset(listing_released=None):
+    """API and storage of a dataset: d1 is standardized, d2 has a newer standardization processing, d3 has none."""
+    blobs_sent = []
+
+    def handler(method, path, headers):
+        url = urlsplit(path)
+        if url.path == "/documents":
+            offset = int(parse_qs(url.query)["offset"][0])
+            return 200, {}, json.dumps(DOCUMENTS[offset:]).encode()
+        if url.path.endswith("/download/ocr-url"):
+            return 200, {}, json.dumps({"url": f"http://{headers['Host']}/blob/{url.path.split('/')[2]}"}).encode()
+        if url.path.startswith("/blob/"):
+            blobs_sent.append(url.path)
+            if listing_released and len(blobs_sent) == len(DOCUMENTS):
+                listing_released.set()
+            return 200, {}, b"%PDF-1.7"
+        if url.path == "/standardizations":
+            if listing_released:
+                listing_released.wait(5)
+            return listing()(method, path, headers)
+        return 404, {}, b"{}"
+    return handler
+
+
+def run_download(server, monkeypatch, output_dir, **kwargs):
+    monkeypatch.setattr(download, "API_URL", server.url)
+    errors = []
+    download.download_dataset("key", "ds", output_dir, error_callback=lambda doc, error: errors.append(error),
+                              max_workers=4, **kwargs)
+    return errors
+
+
+def test_standardizations_come_from_the_listing_without_a_request_per_document(scripted_server, monkeypatch,
+                                                                               tmp_path):
+    server = scripted_server(dataset())
+    assert run_download(server, monkeypatch, tmp_path) == []
+
+    sent = [path for _, path, _ in server.requests]
+    assert not any(path.startswith("/standardization/") or "document_id=" in path for path in sent)
+    assert json.loads((tmp_path / "doc1.json").read_text()) == {"v": "new"}
+    assert json.loads((tmp_path / "doc2.json").read_text()) == {"v": 2}
+    assert not (tmp_path / "doc3.json").exists()
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".docupanda-standardizations")] == []
+
+    server.requests.clear()
+    assert run_download(server, monkeypatch, tmp_path) == []
+    assert not any(path.startswith("/blob/") or "ocr-url" in path for _, path, _ in server.requests)
+
+
+def test_documents_downloaded_before_the_index_lists_them_get_their_json_afterwards(scripted_server, monkeypatch,
+                                                                                    tmp_path):
+    listing_released = threading.Event()
+    server = scripted_server(dataset(listing_released))
+    assert run_download(server, monkeypatch, tmp_path) == []
+
+    # The listing only answered once every PDF was downloaded, so no worker waited for it
+    assert listing_released.is_set()
+    assert json.loads((tmp_path / "doc1.json").read_text()) == {"v": "new"}
+    manifest = open_manifest(tmp_path)
+    entries = manifest.load()
+    manifest.close()
+    assert {doc_id: entry.standardizationId for doc_id, entry in entries.items()} == {
+        "d1": "s1-new", "d2": "s2", "d3": None
+    }
@@ -0,0 +1,62 @@
+import base64
+import json
+import os
+import threading
+
+import pytest
+
+from dp_desktop.encoding import Base64JsonBody, BufferBudget, encode_body
+
+
+# Sizes around the chunk size, so the last chunk is full, one byte short, or one byte over
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5, 299, 300, 301, 1000])
+def test_length_matches_the_bytes_produced(tmp_path, size):
+    file_path = tmp_path / "scan.pdf"
+    contents = os.urandom(size)
+    file_path.write_bytes(contents)
+    body = Base64JsonBody(file_path, "ds", chunk_size=300)
+
+    encoded = encode_body(body)
+    assert len(body) == len(encoded)
+    assert json.loads(encoded) == {
+        "dataset": "ds",
+        "document": {"file": {"filename": "scan.pdf", "contents": base64.b64encode(contents).decode()}},
+    }
+
+
+def test_filename_override_and_escaping(tmp_path):
+    file_path = tmp_path / "copy.jpg"
+    file_path.write_bytes(b"image")
+    body = Base64JsonBody(file_path, 'data "set" ü', filename='scan "1" ü.jpg')
+
+    encoded = encode_body(body)
+    assert len(body) == len(encoded)
+    document = json.loads(encoded)
+    assert document["dataset"] == 'data "set" ü'
+    assert document["document"]["file"]["filename"] == 'scan "1" ü.jpg'
+
+
+def test_body_can_be_sent_again(tmp_path):
+    file_path = tmp_path / "scan.pdf"
+    file_path.write_bytes(os.urandom(1000))
+    body = Base64JsonBody(file_path, "ds", chunk_size=300)
+    assert encode_body(body) == encode_body(body)
+
+
+def test_chunk_size_must_keep_base64_aligned(tmp_path):
+    with pytest.raises(ValueError):
+        Base64JsonBody(tmp_path / "scan.pdf", "ds", chunk_size=100)
+
+
+def test_buffer_budget_blocks_until_bytes_are_released():
+    budget = BufferBudget(10)
+    budget.reserve(6)
+    reserved = threading.Event()
+    waiter = threading.Thread(target=lambda: (budget.reserve(6), reserved.set()))
+    waiter.start()
+    assert not reserved.wait(0.1)
+    budget.release(6)
+    assert reserved.wait(5)
+    waiter.join()
+    with pytest.raises(ValueError):
+        budget.reserve(11)
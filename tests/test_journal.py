@@ -0,0 +1,97 @@
+import functools
+import json
+
+import pytest
+
+from dp_desktop import poller, standardize, upload
+from dp_desktop.journal import (
+    STATUS_DONE, STATUS_FAILED, STATUS_PROCESSED, STATUS_STANDARDIZING, STATUS_UPLOADED, UnfinishedUpload,
+    UploadJournal, find_unfinished_uploads, journal_path_for
+)
+
+
+def test_records_the_latest_state_of_each_file(tmp_path):
+    with UploadJournal(tmp_path / "journal.sqlite3", tmp_path, "ds", None) as journal:
+        journal.record(tmp_path / "a.pdf", STATUS_UPLOADED, 10, 1.5, document_id="d1")
+        journal.record(tmp_path / "a.pdf", STATUS_DONE, 10, 1.5, document_id="d1", standardization_id="s1")
+        journal.record(tmp_path / "b.pdf", STATUS_FAILED, 20, 2.5, error="boom")
+        entries = journal.load()
+    a, b = entries[str(tmp_path / "a.pdf")], entries[str(tmp_path / "b.pdf")]
+    assert (a.status, a.documentId, a.standardizationId) == (STATUS_DONE, "d1", "s1")
+    assert (b.status, b.size, b.mtime, b.error) == (STATUS_FAILED, 20, 2.5, "boom")
+
+
+def test_only_unfinished_runs_are_offered_for_resuming(tmp_path):
+    journal_dir = tmp_path / "journals"
+    UploadJournal(journal_path_for(journal_dir, tmp_path, "ds", "schema"), tmp_path, "ds", "schema").close()
+    with UploadJournal(journal_path_for(journal_dir, tmp_path, "other", None), tmp_path, "other", None) as journal:
+        journal.mark_finished()
+    (journal_dir / "upload_broken.sqlite3").write_text("not a database")
+
+    assert find_unfinished_uploads(journal_dir) == [UnfinishedUpload(
+        journal_path=journal_path_for(journal_dir, tmp_path, "ds", "schema"),
+        folder_path=tmp_path, dataset_name="ds", schema_id="schema"
+    )]
+
+
+def api(method, path, headers):
+    """Uploads, processing and standardization that complete at once."""
+    if method == "POST" and path == "/document":
+        return 200, {}, b'{"documentId": "new"}'
+    if method == "POST" and path == "/v2/standardize/batch":
+        return 200, {}, b'{"standardizationIds": ["s-new"]}'
+    if path.startswith("/document/"):
+        return 200, {}, b'{"status": "completed"}'
+    return 200, {}, json.dumps({"standardizationId": path.rsplit("/", 1)[-1]}).encode()
+
+
+@pytest.fixture
+def server(scripted_server, monkeypatch):
+    server = scripted_server(api)
+    for module in (upload, poller):
+        monkeypatch.setattr(module, "API_URL", server.url)
+    monkeypatch.setattr(standardize, "STANDARDIZE_URL", server.url)
+    # One document per batch, since the server cannot see which ids a batch holds
+    monkeypatch.setattr(upload, "StandardizationBatcher",
+                        functools.partial(standardize.StandardizationBatcher, max_batch_size=1, max_wait=0.01))
+    monkeypatch.setattr(upload, "POLL_INTERVAL", 0.01)
+    return server
+
+
+def test_resumes_each_file_at_its_journaled_state(server, tmp_path):
+    folder, journal_dir = tmp_path / "scans", tmp_path / "journals"
+    folder.mkdir()
+    states = {
+        "done.pdf": (STATUS_DONE, "d-done", "s-done"),
+        "uploaded.pdf": (STATUS_UPLOADED, "d-uploaded", None),
+        "processed.pdf": (STATUS_PROCESSED, "d-processed", None),
+        "standardizing.pdf": (STATUS_STANDARDIZING, "d-standardizing", "s-standardizing"),
+        "failed.pdf": (STATUS_FAILED, None, None),
+        "changed.pdf": (STATUS_DONE, "d-changed", "s-changed"),
+        "new.pdf": None,
+    }
+    with UploadJournal(journal_path_for(journal_dir, folder, "ds", "schema"), folder, "ds", "schema") as journal:
+        for name, state in states.items():
+            file_path = folder / name
+            file_path.write_bytes(name.encode())
+            if state:
+                stat = file_path.stat()
+                status, document_id, standardization_id = state
+                journal.record(file_path, status, stat.st_size, stat.st_mtime, document_id, standardization_id)
+    (folder / "changed.pdf").write_bytes(b"new contents")
+
+    progress = []
+    upload.upload_files(folder, "key", "ds", schema_id="schema", journal_dir=journal_dir, deduplicate=False,
+                        progress_callback=lambda done, total: progress.append((done, total)))
+
+    sent = [(method, path) for method, path, _ in server.requests]
+    assert sent.count(("POST", "/document")) == 3  # failed, changed and new
+    assert ("GET", "/document/d-uploaded") in sent
+    assert ("GET", "/document/d-processed") not in sent
+    assert sent.count(("POST", "/v2/standardize/batch")) == 5  # all but done and standardizing
+    assert ("GET", "/standardization/s-standardizing") in sent
+    assert not any("d-done" in path or "s-done" in path for _, path in sent)
+    assert progress[-1] == (7, 7)
+    assert find_unfinished_uploads(journal_dir) == []
+    with UploadJournal(journal_path_for(journal_dir, folder, "ds", "schema"), folder, "ds", "schema") as journal:
+        assert {entry.status for entry in journal.load().values()} == {STATUS_DONE}
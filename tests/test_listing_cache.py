@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from dp_desktop import listing_cache
+from dp_desktop.listing_cache import ListingCache
+
+
+class Fetches(list):
+    """The API keys of every fetch; `refreshed` is set by the second one."""
+
+    def __init__(self):
+        super().__init__()
+        self.refreshed = threading.Event()
+
+
+@pytest.fixture
+def fetches(monkeypatch) -> Fetches:
+    """Dataset listings served by a fake API: each fetch returns a new name."""
+    calls = Fetches()
+
+    def fetch(api_key):
+        calls.append(api_key)
+        if len(calls) > 1:
+            calls.refreshed.set()
+        return [f"ds{len(calls)}"]
+    monkeypatch.setattr(listing_cache, "_fetch_dataset_names", fetch)
+    return calls
+
+
+def test_fresh_listing_is_served_from_the_cache(tmp_path, fetches):
+    assert ListingCache(tmp_path, "key").dataset_names() == ["ds1"]
+    assert ListingCache(tmp_path, "key").dataset_names() == ["ds1"]
+    assert len(fetches) == 1
+
+
+def test_stale_listing_is_served_while_it_is_refreshed(tmp_path, fetches):
+    ListingCache(tmp_path, "key").dataset_names()
+    cache = ListingCache(tmp_path, "key", ttl=0)
+    time.sleep(0.01)
+    assert cache.dataset_names() == ["ds1"]
+    assert fetches.refreshed.wait(1)
+    for _ in range(100):
+        if cache.dataset_names() == ["ds2"]:
+            break
+        time.sleep(0.01)
+    assert ListingCache(tmp_path, "key").dataset_names() == ["ds2"]
+
+
+def test_listing_too_old_to_show_is_fetched_again(tmp_path, fetches, monkeypatch):
+    ListingCache(tmp_path, "key").dataset_names()
+    monkeypatch.setattr(listing_cache, "MAX_STALE", -1)
+    assert ListingCache(tmp_path, "key").dataset_names() == ["ds2"]
+
+
+def test_failed_refresh_keeps_the_cached_copy(tmp_path, fetches, monkeypatch):
+    ListingCache(tmp_path, "key").dataset_names()
+    failed = threading.Event()
+
+    def fail(api_key):
+        failed.set()
+        raise ConnectionError("offline")
+    monkeypatch.setattr(listing_cache, "_fetch_dataset_names", fail)
+    cache = ListingCache(tmp_path, "key", ttl=0)
+    time.sleep(0.01)
+    assert cache.dataset_names() == ["ds1"]
+    assert failed.wait(1)
+    assert ListingCache(tmp_path, "key").dataset_names() == ["ds1"]
+
+
+def test_cache_file_is_per_key_and_does_not_contain_it(tmp_path, fetches):
+    ListingCache(tmp_path, "secret-key").dataset_names()
+    assert not ListingCache(tmp_path, "other-key").is_cached("datasets")
+    (cache_file,) = tmp_path.iterdir()
+    assert "secret-key" not in cache_file.name and "secret-key" not in cache_file.read_text()
+
+
+def test_unreadable_cache_file_is_ignored(tmp_path, fetches):
+    cache = ListingCache(tmp_path, "key")
+    cache.path.write_text("{not json")
+    assert ListingCache(tmp_path, "key").dataset_names() == ["ds1"]
@@ -0,0 +1,48 @@
+import json
+import logging
+import os
+import time
+
+from dp_desktop.logs import JsonLinesFormatter, RotatingLogFileHandler, log_fields, prune_logs
+
+
+def record(message: str, **extra) -> logging.LogRecord:
+    logger = logging.getLogger("test")
+    return logger.makeRecord("test", logging.INFO, __file__, 1, message, None, None, extra=extra)
+
+
+def test_structured_fields_become_json_keys(tmp_path):
+    entry = json.loads(JsonLinesFormatter().format(record("uploaded", **log_fields(tmp_path / "a.pdf", "d1")["extra"])))
+    assert (entry["message"], entry["file"], entry["documentId"]) == ("uploaded", str(tmp_path / "a.pdf"), "d1")
+    assert "standardizationId" not in entry
+
+
+def test_log_fields_skips_missing_values():
+    assert log_fields() == {"extra": {}}
+    assert log_fields(document_id="d1", standardizationId=None) == {"extra": {"documentId": "d1"}}
+
+
+def test_log_file_rolls_over_after_its_interval(tmp_path):
+    handler = RotatingLogFileHandler(tmp_path / "app.log", interval=3600)
+    handler.emit(record("first"))
+    handler.rollover_at = time.time()
+    handler.emit(record("second"))
+    handler.close()
+    assert (tmp_path / "app.log.1").read_text().strip().endswith("first")
+    assert (tmp_path / "app.log").read_text().strip().endswith("second")
+
+
+def test_old_and_surplus_logs_are_pruned(tmp_path):
+    now = time.time()
+    for n in range(5):
+        path = tmp_path / f"app_{n}.log"
+        path.write_text("log")
+        os.utime(path, (now - n, now - n))
+    old = tmp_path / "app_old.jsonl"
+    old.write_text("log")
+    os.utime(old, (now - 30 * 24 * 3600, now - 30 * 24 * 3600))
+    (tmp_path / "other_1.log").write_text("not ours")
+
+    prune_logs(tmp_path, "app", retention_days=14, max_files=3, keep=tmp_path / "app_4.log")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["app_0.log", "app_1.log", "app_2.log", "app_4.log",
+                                                          "other_1.log"]
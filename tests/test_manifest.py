@@ -0,0 +1,34 @@
+import pytest
+
+from dp_desktop.manifest import DownloadManifest, ManifestEntry
+
+
+@pytest.fixture
+def synced(tmp_path):
+    (tmp_path / "invoice.pdf").write_bytes(b"%PDF" * 10)
+    (tmp_path / "invoice.json").write_text("{}")
+    entry = ManifestEntry(documentId="d1", filename="invoice", pdfSize=40, pdfSha256="aa",
+                          standardizationId="s1", jsonSha256="bb")
+    with DownloadManifest(tmp_path) as manifest:
+        manifest.record(entry)
+        yield manifest, manifest.load()["d1"]
+
+
+def test_recorded_files_are_current(synced, tmp_path):
+    manifest, entry = synced
+    assert manifest.is_current(entry, tmp_path, "invoice")
+    assert manifest.is_current(entry, tmp_path, "invoice", standardization_id="s1")
+
+
+def test_newer_standardization_is_not_current(synced, tmp_path):
+    manifest, entry = synced
+    assert not manifest.is_current(entry, tmp_path, "invoice", standardization_id="s2")
+
+
+def test_changed_files_are_not_current(synced, tmp_path):
+    manifest, entry = synced
+    assert not manifest.is_current(entry, tmp_path, "renamed")
+    (tmp_path / "invoice.json").unlink()
+    assert not manifest.is_current(entry, tmp_path, "invoice")
+    (tmp_path / "invoice.pdf").write_bytes(b"%PDF")
+    assert not manifest.is_current(entry, tmp_path, "invoice")
@@ -0,0 +1,72 @@
+import json
+import urllib.request
+
+import pytest
+
+from dp_desktop.config import API_URL
+from dp_desktop.metrics import Histogram, JsonSnapshotSink, MetricsRegistry, PrometheusExporter, endpoint_label
+
+
+@pytest.mark.parametrize("url, expected", [
+    (f"{API_URL}/document/abc123", "/document/{id}"),
+    (f"{API_URL}/document/abc123/download/ocr-url?hours=6", "/document/{id}/download/ocr-url"),
+    (f"{API_URL}/documents?dataset=ds1", "/documents"),
+    ("https://storage.example.com/bucket/abc123.pdf", "storage"),
+])
+def test_endpoint_labels_hide_ids(url, expected):
+    assert endpoint_label(url) == expected
+
+
+def test_histogram_quantiles_are_interpolated_within_buckets():
+    histogram = Histogram(buckets=(1.0, 2.0))
+    for value in (0.5, 1.5, 1.5, 1.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.25) == 1.0
+    assert 1.0 < histogram.quantile(0.5) < 2.0
+    assert Histogram().quantile(0.5) is None
+
+
+def test_run_summary_only_counts_what_happened_since_it_began():
+    registry = MetricsRegistry()
+    registry.inc("dp_items_total", operation="upload", outcome="done")
+    run = registry.begin_run()
+    registry.inc("dp_items_total", operation="upload", outcome="done")
+    registry.inc("dp_items_total", operation="upload", outcome="failed")
+    registry.inc("dp_bytes_total", 1000, operation="upload", direction="sent")
+    with registry.timer("dp_stage_seconds", operation="upload", stage="post"):
+        pass
+    summary = run.summary()
+    assert summary["items"] == {"upload/done": 1, "upload/failed": 1}
+    assert summary["bytes"] == {"upload/sent": 1000}
+    assert summary["stages"]["upload/post"]["count"] == 1
+
+
+def test_tracking_counts_blocks_in_flight_even_when_they_raise():
+    registry = MetricsRegistry()
+    with pytest.raises(ValueError):
+        with registry.tracking("dp_stage_in_flight", stage="post"):
+            assert registry.snapshot()["gauges"][0]["value"] == 1
+            raise ValueError
+    assert registry.snapshot()["gauges"][0]["value"] == 0
+
+
+def test_prometheus_text_has_help_types_and_cumulative_buckets():
+    registry = MetricsRegistry()
+    registry.inc("dp_items_total", operation="upload", outcome="done")
+    registry.observe("dp_http_request_seconds", 0.02, method="GET", endpoint="/documents", status=200)
+    text = registry.prometheus_text()
+    assert "# TYPE dp_items_total counter" in text
+    assert 'dp_items_total{operation="upload",outcome="done"} 1' in text
+    assert 'dp_http_request_seconds_bucket{endpoint="/documents",method="GET",status="200",le="0.01"} 0' in text
+    assert 'dp_http_request_seconds_bucket{endpoint="/documents",method="GET",status="200",le="+Inf"} 1' in text
+
+
+def test_sinks_publish_the_registry(tmp_path):
+    registry = MetricsRegistry()
+    registry.inc("dp_items_total", operation="download", outcome="done")
+    with JsonSnapshotSink(tmp_path / "metrics.json", interval=60, source=registry):
+        pass
+    assert json.loads((tmp_path / "metrics.json").read_text())["counters"][0]["value"] == 1
+    with PrometheusExporter(0, source=registry) as exporter:
+        with urllib.request.urlopen(exporter.url) as response:
+            assert b'outcome="done"' in response.read()
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from dp_desktop.pipeline import Pipeline, Stage
+
+
+def collect(stages, items):
+    outputs, errors = [], []
+    lock = threading.Lock()
+
+    def on_output(item):
+        with lock:
+            outputs.append(item)
+
+    def on_error(item, exc):
+        with lock:
+            errors.append((item, str(exc)))
+
+    with Pipeline(stages, on_output=on_output, on_error=on_error) as pipeline:
+        for item in items:
+            pipeline.put(item)
+    return sorted(outputs), sorted(errors)
+
+
+def test_items_pass_through_every_stage():
+    outputs, errors = collect([Stage("double", lambda x: x * 2, workers=3), Stage("inc", lambda x: x + 1)], range(20))
+    assert outputs == [x * 2 + 1 for x in range(20)]
+    assert errors == []
+
+
+def test_none_drops_an_item_and_errors_stop_it():
+    def check(x):
+        if x == 3:
+            raise ValueError("three")
+        return None if x % 2 else x
+
+    outputs, errors = collect([Stage("check", check), Stage("last", lambda x: x)], range(6))
+    assert outputs == [0, 2, 4]
+    assert errors == [(3, "three")]
+
+
+def test_a_failing_output_callback_is_reported_as_an_error():
+    errors = []
+
+    def on_output(item):
+        raise RuntimeError("sink failed")
+
+    with Pipeline([Stage("only", lambda x: x)], on_output=on_output,
+                  on_error=lambda item, exc: errors.append(item)) as pipeline:
+        pipeline.put(1)
+    assert errors == [1]
+
+
+def test_a_slow_stage_pushes_back_on_put():
+    release = threading.Event()
+    pipeline = Pipeline([Stage("slow", lambda x: release.wait(5) and x, queue_size=1)])
+    pipeline.put(1)  # taken by the worker
+    pipeline.put(2)  # fills the queue
+    blocked = threading.Thread(target=pipeline.put, args=(3,))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(1)
+    pipeline.close()
+    assert not blocked.is_alive()
+
+
+def test_closed_pipeline_refuses_items():
+    pipeline = Pipeline([Stage("only", lambda x: x)])
+    pipeline.close()
+    with pytest.raises(RuntimeError):
+        pipeline.put(1)
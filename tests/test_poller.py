@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from conftest import replies
+from dp_desktop import poller
+from dp_desktop.poller import StatusPoller
+
+
+def status(value: str):
+    return 200, {"Content-Type": "application/json"}, json.dumps({"status": value}).encode()
+
+
+@pytest.fixture
+def polling(scripted_server, monkeypatch, no_backoff):
+    """Start a fast StatusPoller against a server sending `handler`'s replies."""
+    pollers = []
+
+    def start(handler, **kwargs):
+        server = scripted_server(handler)
+        monkeypatch.setattr(poller, "API_URL", server.url)
+        kwargs.setdefault("min_interval", 0.01)
+        kwargs.setdefault("max_interval", 0.01)
+        pollers.append(StatusPoller("key", **kwargs))
+        return server, pollers[-1]
+
+    yield start
+    for status_poller in pollers:
+        status_poller.close()
+
+
+def test_document_resolves_once_processing_completed(polling):
+    server, status_poller = polling(replies(status("processing"), status("processing"), status("completed")))
+    assert status_poller.watch_document("d1").result(5) == {"status": "completed"}
+    assert [path for _, path, _ in server.requests] == ["/document/d1"] * 3
+    assert status_poller.pending() == 0
+
+
+def test_failed_document_fails_its_future(polling):
+    _, status_poller = polling(replies(status("failed")))
+    with pytest.raises(RuntimeError, match="failed during processing"):
+        status_poller.watch_document("d1").result(5)
+
+
+def test_standardization_resolves_once_it_stops_being_404(polling):
+    body = json.dumps({"standardizationId": "s1"}).encode()
+    server, status_poller = polling(replies((404, {}, b"{}"), (404, {}, b"{}"), (200, {}, body)))
+    assert status_poller.watch_standardization("s1").result(5) == {"standardizationId": "s1"}
+    assert len(server.requests) == 3
+
+
+def test_other_client_errors_fail_at_once(polling):
+    server, status_poller = polling(replies((403, {}, b"{}")))
+    with pytest.raises(Exception) as raised:
+        status_poller.watch_document("d1").result(5)
+    assert raised.value.response.status_code == 403
+    assert len(server.requests) == 1
+
+
+def test_ids_pending_too_long_time_out(polling):
+    _, status_poller = polling(replies(status("processing")), timeout=0.05)
+    with pytest.raises(RuntimeError, match="Timeout"):
+        status_poller.watch_document("d1").result(5)
+
+
+def test_close_fails_the_ids_still_pending(polling):
+    _, status_poller = polling(replies(status("processing")), min_interval=60)
+    future = status_poller.watch_document("d1")
+    assert status_poller.pending() == 1
+    status_poller.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        future.result(5)
+    with pytest.raises(RuntimeError):
+        status_poller.watch_document("d2")
+
+
+def test_checks_back_off_with_the_age_of_the_id(polling, monkeypatch):
+    _, status_poller = polling(replies(status("completed")), min_interval=5, max_interval=60)
+    monkeypatch.setattr(poller.time, "monotonic", lambda: 1000.0)
+    item = poller._Pending("document", "d1", "", None, None, started_at=1000.0)
+    assert status_poller._next_interval(item) == 5
+    item.started_at = 1000.0 - 300
+    assert status_poller._next_interval(item) == 30
+    item.started_at = 1000.0 - 3600
+    assert status_poller._next_interval(item) == 60
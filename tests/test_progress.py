@@ -0,0 +1,51 @@
+import threading
+
+from dp_desktop.progress import ProgressAggregator
+
+
+def test_events_are_coalesced_into_few_renders():
+    renders = []
+    with ProgressAggregator(renders.append, interval=60) as progress:
+        for done in range(1, 1001):
+            progress.progress(done, 1000)
+        progress.error("first")
+        progress.note("note")
+    assert len(renders) == 1
+    assert (renders[0].completed, renders[0].total, renders[0].error_count) == (1000, 1000, 1)
+    assert renders[0].new_errors == ["first"]
+    assert renders[0].note == "note"
+
+
+def test_each_render_gets_only_new_errors_but_the_total_count():
+    renders = []
+    progress = ProgressAggregator(renders.append, interval=60, max_errors=2)
+    for n in range(3):
+        progress.error(f"e{n}")
+    progress.flush()
+    progress.error("e3")
+    progress.close()
+    assert [r.new_errors for r in renders] == [["e1", "e2"], ["e3"]]
+    assert [r.error_count for r in renders] == [3, 4]
+    assert progress.recent_errors() == ["e2", "e3"]
+    assert progress.error_count == 4
+
+
+def test_renders_come_from_the_background_thread_while_running():
+    rendered = threading.Event()
+    threads = []
+
+    def render(snapshot):
+        threads.append(threading.current_thread())
+        rendered.set()
+
+    with ProgressAggregator(render, interval=0.01) as progress:
+        progress.progress(1, 2)
+        assert rendered.wait(1)
+    assert threads[0] is not threading.current_thread()
+
+
+def test_nothing_is_rendered_without_changes():
+    renders = []
+    with ProgressAggregator(renders.append, interval=0.01):
+        pass
+    assert renders == []
@@ -0,0 +1,85 @@
+import email.utils
+import time
+
+import pytest
+import requests
+
+from dp_desktop import ratelimit
+from dp_desktop.config import API_URL
+from dp_desktop.ratelimit import TokenBucket, backoff_delay, endpoint_class, parse_retry_after
+
+
+def test_bucket_allows_a_burst_then_paces_at_its_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started >= 5 / 50
+
+
+def test_pause_holds_every_caller_until_it_ends():
+    bucket = TokenBucket(rate=1000, burst=10)
+    bucket.pause(0.2)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.2
+
+
+@pytest.mark.parametrize("method, path, expected", [
+    ("GET", "/documents?dataset=ds", "listing"),
+    ("GET", "/standardizations?document_id=d1", "listing"),
+    ("GET", "/document/d1", "poll"),
+    ("GET", "/standardization/s1", "poll"),
+    ("GET", "/document/d1/download/ocr-url?hours=6", "download_url"),
+    ("POST", "/document", "upload"),
+])
+def test_api_requests_are_classed_by_endpoint(method, path, expected):
+    assert endpoint_class(method, f"{API_URL}{path}") == expected
+
+
+def test_storage_requests_are_not_rate_limited():
+    assert endpoint_class("GET", "https://storage.example.com/bucket/doc.pdf?signature=x") is None
+
+
+def response_with(retry_after: str) -> requests.Response:
+    response = requests.Response()
+    response.headers["Retry-After"] = retry_after
+    return response
+
+
+def test_retry_after_in_seconds_or_as_a_date():
+    assert parse_retry_after(response_with("7")) == 7
+    assert 25 <= parse_retry_after(response_with(email.utils.formatdate(time.time() + 30, usegmt=True))) <= 30
+    assert parse_retry_after(response_with("soon")) is None
+    assert parse_retry_after(requests.Response()) is None
+
+
+def test_retry_after_is_capped():
+    assert parse_retry_after(response_with("100000")) == ratelimit.MAX_RETRY_AFTER
+
+
+def test_pause_all_only_applies_to_the_api(monkeypatch):
+    paused = []
+    monkeypatch.setattr(TokenBucket, "pause", lambda bucket, seconds: paused.append(seconds))
+    ratelimit.pause_all("https://storage.example.com/doc.pdf", 5)
+    assert paused == []
+    ratelimit.pause_all(f"{API_URL}/document", 5)
+    assert paused == [5] * len(ratelimit.RATE_LIMITS)
+
+
+@pytest.mark.parametrize("attempt, expected", [(1, 2), (3, 8), (10, 60)])
+def test_backoff_is_exponential_with_equal_jitter(attempt, expected):
+    delays = [backoff_delay(attempt, backoff_factor=2, max_backoff=60) for _ in range(50)]
+    assert all(expected / 2 <= delay <= expected for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_rate_limits_are_parsed_per_endpoint_class():
+    assert ratelimit.parse_rate_limits("upload=5:10, poll=2.5") == {"upload": (5.0, 10), "poll": (2.5, 5)}
+    assert ratelimit.parse_rate_limits("") == {}
+    for text in ("uploads=5", "upload", "upload=fast", "upload=5:0", "poll=-1"):
+        with pytest.raises(ValueError):
+            ratelimit.parse_rate_limits(text)
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from dp_desktop.scan import count_files, scan_files, walk_files
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in ("a.pdf", "b.csv", "sub/c.PDF", "sub/deeper/d.png", "sub/notes.docx.bak"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(name.encode())
+    return tmp_path
+
+
+def names(scanned, root):
+    return [str(f.path.relative_to(root)).replace(os.sep, "/") for f in scanned]
+
+
+def test_walks_every_file_below_the_folder_with_its_size(folder):
+    scanned = list(walk_files(folder))
+    assert sorted(names(scanned, folder)) == ["a.pdf", "b.csv", "sub/c.PDF", "sub/deeper/d.png", "sub/notes.docx.bak"]
+    assert all(f.size == len(str(f.path.relative_to(folder)).replace(os.sep, "/")) for f in scanned)
+
+
+def test_scan_keeps_supported_files_only(folder):
+    assert sorted(names(scan_files(folder), folder)) == ["a.pdf", "sub/c.PDF", "sub/deeper/d.png"]
+
+
+def test_non_recursive_scan_stays_in_the_folder(folder):
+    assert names(scan_files(folder, recursive=False), folder) == ["a.pdf"]
+
+
+def test_count_matches_the_scan(folder):
+    assert count_files(folder) == (5, 3)
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symlinks")
+def test_symlink_loops_are_visited_once(folder):
+    try:
+        os.symlink(folder, folder / "sub" / "loop", target_is_directory=True)
+    except OSError:
+        pytest.skip("symlinks not permitted")
+    assert len(list(scan_files(folder))) == 3
+    assert len(list(scan_files(folder, follow_symlinks=True))) == 3
+
+
+def test_unreadable_folders_are_reported_and_skipped(tmp_path):
+    errors = []
+    assert list(walk_files(tmp_path / "missing", on_error=lambda path, error: errors.append(path))) == []
+    assert errors == [tmp_path / "missing"]
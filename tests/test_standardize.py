@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from dp_desktop import standardize
+from dp_desktop.standardize import StandardizationBatcher
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """The documentIds of every batch POST. Each document gets standardization "s-<id>", except "short",
+    which is left out of the reply."""
+    sent = []
+    lock = threading.Lock()
+
+    def post(method, url, **kwargs):
+        document_ids = kwargs["json"]["documentIds"]
+        with lock:
+            sent.append(document_ids)
+        response = requests.Response()
+        response.status_code = 200
+        ids = [f"s-{document_id}" for document_id in document_ids if document_id != "short"]
+        response._content = json.dumps({"standardizationIds": ids}).encode()
+        return response
+    monkeypatch.setattr(standardize, "request_with_retries", post)
+    return sent
+
+
+def test_full_batch_is_sent_without_waiting(batches):
+    with StandardizationBatcher("key", "schema", max_batch_size=3, max_wait=60) as batcher:
+        futures = [batcher.submit(f"d{n}") for n in range(3)]
+        assert [future.result(5) for future in futures] == ["s-d0", "s-d1", "s-d2"]
+    assert batches == [["d0", "d1", "d2"]]
+
+
+def test_partial_batch_is_sent_after_max_wait(batches):
+    with StandardizationBatcher("key", "schema", max_batch_size=100, max_wait=0.05) as batcher:
+        started = time.monotonic()
+        future = batcher.submit("d1")
+        assert future.result(5) == "s-d1"
+        assert time.monotonic() - started >= 0.05
+        assert batcher.pending() == 0
+    assert batches == [["d1"]]
+
+
+def test_close_flushes_what_is_queued(batches):
+    batcher = StandardizationBatcher("key", "schema", max_batch_size=100, max_wait=60)
+    futures = [batcher.submit(f"d{n}") for n in range(5)]
+    batcher.close()
+    assert [future.result(0) for future in futures] == [f"s-d{n}" for n in range(5)]
+    with pytest.raises(RuntimeError):
+        batcher.submit("d6")
+
+
+def test_more_ids_than_a_batch_are_split(batches):
+    with StandardizationBatcher("key", "schema", max_batch_size=2, max_wait=60) as batcher:
+        futures = [batcher.submit(f"d{n}") for n in range(5)]
+    assert [future.result(0) for future in futures] == [f"s-d{n}" for n in range(5)]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_a_reply_with_the_wrong_number_of_ids_fails_the_whole_batch(batches):
+    with StandardizationBatcher("key", "schema", max_batch_size=2, max_wait=60) as batcher:
+        futures = [batcher.submit("d1"), batcher.submit("short")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="Expected 2"):
+            future.result(0)
@@ -0,0 +1,45 @@
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from dp_desktop.transcode import ImageTranscoder, TranscodeSettings  # noqa: E402
+
+
+@pytest.fixture
+def transcoder():
+    with ImageTranscoder(TranscodeSettings(dpi=200, quality=80), workers=1) as transcoder:
+        yield transcoder
+
+
+def scan(path, size=(3000, 3000), dpi=600):
+    """A noisy grayscale page scanned at `dpi`, saved with little compression."""
+    Image.effect_noise(size, 40).save(path, format="JPEG", quality=95, dpi=(dpi, dpi))
+    return path
+
+
+def test_large_scan_is_downscaled_to_the_target_dpi(transcoder, tmp_path):
+    original = scan(tmp_path / "page.jpg")
+    copy = transcoder.transcode(original)
+    assert copy is not None and copy.stat().st_size < original.stat().st_size
+    with Image.open(copy) as image:
+        assert image.size == (1000, 1000)
+        assert tuple(round(v) for v in image.info["dpi"]) == (200, 200)
+    stats = transcoder.stats()
+    assert (stats.files_transcoded, stats.bytes_before) == (1, original.stat().st_size)
+    transcoder.discard(copy)
+    assert not copy.exists()
+
+
+def test_small_and_unreadable_images_are_uploaded_as_they_are(transcoder, tmp_path):
+    small = scan(tmp_path / "small.jpg", size=(100, 100))
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image" * 50_000)
+    assert transcoder.transcode(small) is None
+    assert transcoder.transcode(broken) is None
+    assert transcoder.stats().files_kept == 1  # the small one is not even considered
+
+
+def test_copies_are_removed_on_close(tmp_path):
+    with ImageTranscoder(TranscodeSettings(), workers=1) as transcoder:
+        copy = transcoder.transcode(scan(tmp_path / "page.jpg"))
+    assert copy is not None and not copy.exists()
@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import replies
+from dp_desktop import transport
+
+
+@pytest.fixture(autouse=True)
+def fresh_transport(monkeypatch):
+    monkeypatch.setattr(transport, "_pool_size", transport.DEFAULT_POOL_SIZE)
+    monkeypatch.setattr(transport, "_sessions", {})
+    monkeypatch.setattr(transport, "_retired", [])
+
+
+def pools(session) -> int:
+    return len(session.get_adapter("http://").poolmanager.pools)
+
+
+def test_sessions_are_shared_per_host(scripted_server):
+    server = scripted_server(replies((200, {}, b"{}")))
+    assert transport.get_session(f"{server.url}/a") is transport.get_session(f"{server.url}/b")
+    assert transport.get_session(f"{server.url}/a") is not transport.get_session("http://other.example.com/")
+
+
+def test_sessions_replaced_by_larger_pools_drain_until_closed(scripted_server):
+    server = scripted_server(replies((200, {}, b"{}")))
+    old = transport.get_session(server.url)
+    old.get(server.url)
+
+    transport.configure_transport(transport.DEFAULT_POOL_SIZE * 2)
+    new = transport.get_session(server.url)
+    assert new is not old
+    assert new.get_adapter("http://")._pool_maxsize == transport.DEFAULT_POOL_SIZE * 2
+    # A transfer still running on the old session keeps its connections
+    assert old.get(server.url).status_code == 200
+    assert pools(old) == 1
+    new.get(server.url)
+
+    transport.close_sessions()
+    assert pools(old) == 0 and pools(new) == 0
+
+
+def test_pools_are_never_shrunk():
+    transport.configure_transport(transport.DEFAULT_POOL_SIZE * 2)
+    transport.configure_transport(transport.DEFAULT_POOL_SIZE)
+    assert transport._pool_size == transport.DEFAULT_POOL_SIZE * 2
@@ -0,0 +1,98 @@
+import shutil
+
+import pytest
+import requests
+
+from dp_desktop import metrics, poller, upload
+from dp_desktop.breaker import ServiceDegradedError
+from dp_desktop.transcode import TranscodeSettings, TranscodeStats
+
+
+def degraded(*args, **kwargs):
+    raise ServiceDegradedError("api is unavailable")
+
+
+def posted(*args, **kwargs):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"documentId": "d1"}'
+    return response
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        (tmp_path / name).write_bytes(name.encode() * 100)
+    return tmp_path
+
+
+def run_upload(folder, **kwargs):
+    # Degraded files reach error_callback too, so the UI does not report a clean run
+    errors = []
+    run = metrics.begin_run()
+    upload.upload_files(folder, "key", "ds", error_callback=lambda path, error: errors.append(error), **kwargs)
+    return errors, run.summary()["items"]
+
+
+def test_failed_post_during_outage_counts_as_degraded(folder, monkeypatch):
+    monkeypatch.setattr(upload, "request_with_retries", degraded)
+    errors, items = run_upload(folder)
+    assert len(errors) == 3
+    assert items == {"upload/degraded": 3}
+
+
+def test_duplicates_of_a_degraded_upload_are_degraded(folder, monkeypatch):
+    (folder / "a-copy.pdf").write_bytes((folder / "a.pdf").read_bytes())
+    monkeypatch.setattr(upload, "request_with_retries", degraded)
+    errors, items = run_upload(folder)
+    assert len(errors) == 4
+    assert items == {"upload/degraded": 4}
+
+
+def test_failed_status_poll_during_outage_counts_as_degraded(folder, monkeypatch):
+    monkeypatch.setattr(upload, "request_with_retries", posted)
+    monkeypatch.setattr(poller, "request_with_retries", degraded)
+    monkeypatch.setattr(upload, "POLL_INTERVAL", 0.01)
+    errors, items = run_upload(folder, deduplicate=False)
+    assert len(errors) == 3
+    assert items == {"upload/degraded": 3}
+
+
+class CopyingTranscoder(object):
+    """Stands in for ImageTranscoder without Pillow: every file gets a same-size copy in `folder`."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.copies = []
+
+    def transcode(self, file_path):
+        copy = self.folder / f"{len(self.copies)}{file_path.suffix}"
+        shutil.copyfile(file_path, copy)
+        self.copies.append(copy)
+        return copy
+
+    def discard(self, copy):
+        copy.unlink()
+
+    def stats(self):
+        return TranscodeStats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass  # Unlike ImageTranscoder, leaves undiscarded copies behind
+
+
+def test_copies_of_files_that_fail_before_their_post_are_deleted(folder, tmp_path_factory, monkeypatch):
+    def unreadable(body):
+        raise OSError("disk error")
+
+    transcoder = CopyingTranscoder(tmp_path_factory.mktemp("copies"))
+    monkeypatch.setattr(upload, "is_available", lambda: True)
+    monkeypatch.setattr(upload, "ImageTranscoder", lambda settings, **kwargs: transcoder)
+    monkeypatch.setattr(upload, "encode_body", unreadable)
+    errors, _ = run_upload(folder, transcode=TranscodeSettings(), deduplicate=False)
+    assert len(errors) == 3
+    assert len(transcoder.copies) == 3
+    assert list(transcoder.folder.iterdir()) == []
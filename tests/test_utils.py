@@ -0,0 +1,46 @@
+import pytest
+import requests
+
+from conftest import replies
+from dp_desktop.utils import request_with_retries
+
+OK = (200, {"Content-Type": "application/json"}, b'{"ok": true}')
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 409, 422])
+def test_client_errors_are_raised_without_retrying(scripted_server, no_backoff, status):
+    server = scripted_server(replies((status, {}, b"{}")))
+    with pytest.raises(requests.exceptions.HTTPError) as raised:
+        request_with_retries("GET", f"{server.url}/document/d1", max_retries=5)
+    assert raised.value.response.status_code == status
+    assert len(server.requests) == 1
+
+
+@pytest.mark.parametrize("status", [408, 429, 500, 502, 503, 504])
+def test_retryable_statuses_are_retried_until_success(scripted_server, no_backoff, status):
+    server = scripted_server(replies((status, {}, b"{}"), (status, {}, b"{}"), OK))
+    response = request_with_retries("GET", f"{server.url}/document/d1", max_retries=5)
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+
+
+def test_retryable_status_fails_once_retries_are_exhausted(scripted_server, no_backoff):
+    server = scripted_server(replies((503, {}, b"{}")))
+    with pytest.raises(requests.exceptions.HTTPError) as raised:
+        request_with_retries("GET", f"{server.url}/document/d1", max_retries=3)
+    assert raised.value.response.status_code == 503
+    assert len(server.requests) == 3
+
+
+def test_custom_statuses_to_retry(scripted_server, no_backoff):
+    server = scripted_server(replies((404, {}, b"{}"), OK))
+    response = request_with_retries("GET", f"{server.url}/document/d1", statuses_to_retry={404})
+    assert response.status_code == 200
+    assert len(server.requests) == 2
+
+
+def test_retries_are_only_limited_by_max_retries_and_the_shared_budget(scripted_server):
+    server = scripted_server(replies((503, {}, b"{}"), (503, {}, b"{}"), (503, {}, b"{}"), (503, {}, b"{}"), OK))
+    response = request_with_retries("GET", f"{server.url}/document/d1", max_retries=5, max_backoff=0.01)
+    assert response.status_code == 200
+    assert len(server.requests) == 5